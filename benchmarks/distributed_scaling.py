@@ -0,0 +1,216 @@
+"""Benchmark how building and querying a forest of index trees (chunked
+coordinates) scale with the number of workers, chunks and points on a
+:class:`dask.distributed.LocalCluster`.
+
+For each configuration, the build (``set_index`` with persisted trees) and the
+query (``_query``, i.e., the graph used by ``sel``) are run on a new cluster and
+the following metrics are recorded for each stage:
+
+- wall time (and, for the query, the time spent to construct the graph)
+- number of tasks (graph size and tasks executed by the scheduler)
+- bytes sent by the workers (to other workers or to the client) and number of
+  transfers between workers
+- memory of each worker (process memory and data held in memory)
+- data locality of the query tasks (see ``index_locality``)
+
+Results are written to a JSON report, which can be compared across commits.
+
+Usage::
+
+    $ python benchmarks/distributed_scaling.py [--workers 1 2 4] [--chunks 4 16 64]
+          [--points 1000000] [--output distributed_scaling.json]
+
+"""
+import argparse
+import itertools
+import json
+import platform
+import time
+
+import dask
+import dask.array as da
+import numpy as np
+import xarray as xr
+from distributed import Client, LocalCluster, futures_of, wait
+from distributed.diagnostics.plugin import SchedulerPlugin
+
+import xoak
+
+COORDS = ['x', 'y', 'z']
+
+
+class TaskCounter(SchedulerPlugin):
+    """Counts the tasks computed by the scheduler."""
+
+    name = 'xoak-task-counter'
+
+    def __init__(self):
+        self.count = 0
+
+    def transition(self, key, start, finish, *args, **kwargs):
+        if start == 'processing' and finish == 'memory':
+            self.count += 1
+
+
+def _task_count(dask_scheduler):
+    return dask_scheduler.plugins[TaskCounter.name].count
+
+
+def _worker_stats(dask_worker):
+    return {
+        'bytes_sent': dask_worker.transfer_outgoing_bytes_total,
+        'transfers': dask_worker.state.transfer_incoming_count_total,
+        'process_memory': dask_worker.monitor.get_process_memory(),
+        'managed_memory': sum(
+            ts.nbytes or 0 for ts in dask_worker.state.tasks.values() if ts.state == 'memory'
+        ),
+    }
+
+
+class Recorder:
+    """Records the metrics of a benchmark stage (differences between two
+    snapshots of the cluster counters).
+
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.metrics = {}
+
+    def snapshot(self):
+        return {
+            'time': time.perf_counter(),
+            'tasks': self.client.run_on_scheduler(_task_count),
+            'workers': self.client.run(_worker_stats),
+        }
+
+    def __enter__(self):
+        self.start = self.snapshot()
+        return self
+
+    def __exit__(self, *args):
+        end = self.snapshot()
+        start_workers = self.start['workers']
+
+        self.metrics.update(
+            {
+                'wall_time': end['time'] - self.start['time'],
+                'tasks_executed': end['tasks'] - self.start['tasks'],
+                'bytes_transferred': sum(
+                    w['bytes_sent'] - start_workers[addr]['bytes_sent']
+                    for addr, w in end['workers'].items()
+                ),
+                'transfers': sum(
+                    w['transfers'] - start_workers[addr]['transfers']
+                    for addr, w in end['workers'].items()
+                ),
+                'worker_memory': {
+                    addr: {k: w[k] for k in ['process_memory', 'managed_memory']}
+                    for addr, w in end['workers'].items()
+                },
+            }
+        )
+
+
+def make_points(npoints, nchunks, seed):
+    rng = da.random.default_rng(seed)
+    chunks = -(-npoints // nchunks)
+    return xr.Dataset(
+        coords={c: ('i', rng.uniform(0, 10, size=npoints, chunks=chunks)) for c in COORDS}
+    )
+
+
+def run_config(n_workers, n_chunks, n_points, args):
+    config = {
+        'workers': n_workers,
+        'threads_per_worker': args.threads_per_worker,
+        'chunks': n_chunks,
+        'points': n_points,
+        'query_points': args.query_points,
+        'query_chunks': args.query_chunks,
+        'index_type': args.index_type,
+        'fuse_trees': args.fuse_trees,
+    }
+
+    with LocalCluster(
+        n_workers=n_workers,
+        threads_per_worker=args.threads_per_worker,
+        processes=True,
+        dashboard_address=None,
+    ) as cluster, Client(cluster) as client:
+        client.register_plugin(TaskCounter())
+
+        ds = make_points(n_points, n_chunks, args.seed)
+        indexer = make_points(args.query_points, args.query_chunks, args.seed + 1)
+
+        with Recorder(client) as build:
+            ds.xoak.set_index(COORDS, args.index_type, persist=True, fuse_trees=args.fuse_trees)
+            wait([f for idx in ds.xoak._index for f in futures_of(idx)])
+
+        with Recorder(client) as query:
+            t0 = time.perf_counter()
+            indices = ds.xoak._query({c: indexer[c] for c in COORDS})
+            graph_time = time.perf_counter() - t0
+
+            graph_size = len(indices.__dask_graph__())
+            ds.xoak._compute_indices(indices)
+
+        query.metrics.update(
+            {
+                'graph_time': graph_time,
+                'graph_size': graph_size,
+                'locality': ds.xoak.index_locality,
+            }
+        )
+
+    return {'config': config, 'build': build.metrics, 'query': query.metrics}
+
+
+def main(args):
+    report = {
+        'versions': {
+            'xoak': getattr(xoak, '__version__', None),
+            'dask': dask.__version__,
+            'numpy': np.__version__,
+            'python': platform.python_version(),
+        },
+        'results': [],
+    }
+
+    header = (
+        f"{'workers':>8} {'chunks':>7} {'points':>10} {'build (s)':>10} {'query (s)':>10} "
+        f"{'tasks':>7} {'transferred (MB)':>17}"
+    )
+    print(header)
+    print('-' * len(header))
+
+    for n_workers, n_chunks, n_points in itertools.product(args.workers, args.chunks, args.points):
+        result = run_config(n_workers, n_chunks, n_points, args)
+        report['results'].append(result)
+
+        build, query = result['build'], result['query']
+        print(
+            f'{n_workers:>8} {n_chunks:>7} {n_points:>10} {build["wall_time"]:10.3f} '
+            f'{query["wall_time"]:10.3f} {query["tasks_executed"]:>7} '
+            f'{query["bytes_transferred"] / 1e6:17.2f}'
+        )
+
+        # write after each configuration (partial results of long runs)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--chunks', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--points', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--query-points', type=int, default=1_000_000)
+    parser.add_argument('--query-chunks', type=int, default=16)
+    parser.add_argument('--index-type', default='scipy_kdtree')
+    parser.add_argument('--fuse-trees', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='distributed_scaling.json')
+
+    main(parser.parse_args())
@@ -38,7 +38,13 @@ setup(
     packages=find_packages(where='src'),
     package_dir={'': 'src'},
     include_package_data=True,
-    install_requires=['xarray', 'numpy', 'dask', 'scipy'],
+    install_requires=[
+        'xarray',
+        'numpy',
+        'dask',
+        'scipy',
+        'importlib_metadata; python_version<"3.8"',
+    ],
     extras_require={
         'dev': ['scikit-learn', 'pytest', 'pytest-cov', 'pre-commit'],
     },
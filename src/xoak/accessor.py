@@ -1,15 +1,48 @@
-from typing import Any, Hashable, Iterable, List, Mapping, Tuple, Type, Union
+import asyncio
+import inspect
+import itertools
+import os
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 import numpy as np
 import xarray as xr
 from xarray.core.utils import either_dict_or_kwargs
 
-from .index.base import Index, IndexAdapter, XoakIndexWrapper
-
-try:
+from .batching import QueryBatcher
+from .binning import bin_reduce_array
+from .index.base import (
+    BRUTE_FORCE_THRESHOLD,
+    Index,
+    IndexAdapter,
+    XoakIndexWrapper,
+    _box_overlaps,
+    supports_box_query,
+    supports_knn_query,
+)
+from .index.shared import check_shareable, share_index
+from .index.spherical import point_caps, select_coverings, spherical_covering
+from .interp import apply_weights, idw_weights
+from .mesh import face_node_array, locate_cells
+from .plan import SelectionPlan
+
+if TYPE_CHECKING:
     from dask.delayed import Delayed
-except ImportError:  # pragma: no cover
-    Delayed = Type[None]
 
 
 def coords_to_point_array(coords: List[Any]) -> np.ndarray:
@@ -34,9 +67,398 @@ def coords_to_point_array(coords: List[Any]) -> np.ndarray:
     return X
 
 
-IndexAttr = Union[XoakIndexWrapper, Iterable[XoakIndexWrapper], Iterable[Delayed]]
+def _query_index_batch(points: np.ndarray, *indexes: XoakIndexWrapper) -> np.ndarray:
+    """Query a batch of indexes and return the nearest neighbor found among
+    all of them, as a structured array of shape (n_points, 1).
+
+    Used to fuse the query and min-reduction stages into a single task.
+
+    """
+    results = np.concatenate([idx.query(points) for idx in indexes], axis=1)
+    return _reduce_nearest(results)
+
+
+def _reduce_nearest(results: np.ndarray) -> np.ndarray:
+    """Returns the nearest neighbor found among all query results (structured array
+    of shape (n_points, n_results)), as a structured array of shape (n_points, 1).
+
+    """
+    icol = np.argmin(results['distances'], axis=1)
+    return np.take_along_axis(results, icol[:, None], axis=1)
+
+
+def _merge_knn(
+    results: List[Tuple[np.ndarray, np.ndarray]], k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge the k nearest neighbors (distances, indices) found in each tree of a
+    forest.
+
+    """
+    distances = np.concatenate([r[0] for r in results], axis=1)
+    indices = np.concatenate([r[1] for r in results], axis=1)
+    icols = np.argsort(distances, axis=1, kind='stable')[:, :k]
+
+    return (
+        np.take_along_axis(distances, icols, axis=1),
+        np.take_along_axis(indices, icols, axis=1),
+    )
+
+
+def _select_trees(X, coverings: List[np.ndarray]) -> List[np.ndarray]:
+    """Select the trees of a geographic forest (given their spherical coverings)
+    that may contain the nearest neighbors of the points of each query chunk.
+
+    Returns one boolean mask for each chunk of the query points ``X``.
+
+    """
+    if isinstance(X, np.ndarray):
+        return [select_coverings(point_caps(X), coverings)]
+
+    import dask
+
+    # (cheap) pass over the query points to get a covering of each chunk
+    query_coverings = dask.compute(
+        *[dask.delayed(spherical_covering)(c) for c in X.to_delayed().ravel()]
+    )
+
+    return [select_coverings(qcov, coverings) for qcov in query_coverings]
+
+
+def _tree_futures(indexes: List[Any]) -> Optional[Dict[Any, Any]]:
+    """Returns the futures of the trees of a forest persisted on a dask distributed
+    cluster (by tree key), or None.
+
+    """
+    try:
+        from distributed import futures_of
+    except ImportError:  # pragma: no cover
+        return None
+
+    futures = [futures_of(idx) for idx in indexes]
+    if not all(len(f) == 1 for f in futures):
+        return None
+
+    return {idx.key: f[0] for idx, f in zip(indexes, futures)}
+
+
+def _who_has(tree_futures: Dict[Any, Any]) -> Dict[Any, Tuple[str, ...]]:
+    """Returns the addresses of the workers holding each tree (by tree key)."""
+    client = next(iter(tree_futures.values())).client
+    who_has = client.who_has(list(tree_futures.values()))
+    return {key: tuple(who_has.get(f.key, ())) for key, f in tree_futures.items()}
+
+
+def _valid_points(X, coords: List[Any], skipna: bool, mask: Any) -> Any:
+    """Returns a 1-d boolean array of the valid points to index (or None if all
+    points are valid), with the same chunks than the array of points ``X``.
+
+    """
+    valid = None
+
+    if skipna:
+        valid = (X == X).all(axis=1)
+
+    if mask is not None:
+        if isinstance(mask, xr.DataArray):
+            mask = mask.transpose(*coords[0].dims).data
+        if np.shape(mask) != coords[0].shape:
+            raise ValueError('mask must have the same shape than the index coordinates')
+
+        if isinstance(X, np.ndarray):
+            mask = np.ravel(np.asarray(mask, dtype=bool))
+        else:
+            import dask.array as da
+
+            mask = da.ravel(da.asarray(mask).astype(bool)).rechunk((X.chunks[0],))
+
+        valid = mask if valid is None else valid & mask
+
+    return valid
+
+
+def _mask_chunks(X, valid) -> List[Any]:
+    if valid is None:
+        return [None] * X.numblocks[0]
+    return list(valid.to_delayed().ravel())
+
+
+def _shared_path(shared: Union[bool, str]) -> Optional[str]:
+    return None if shared is True else shared
+
+
+def _batch_slices(indexer: Any, dim: Hashable, batch_size: Optional[int]) -> List[slice]:
+    """Split the batch dimension of the indexers in slices of equal size (except
+    the last one), by default given by the 1st chunk of the indexer (if chunked).
+
+    """
+    size = indexer.sizes[dim]
+
+    if batch_size is None:
+        if indexer.chunks is not None:
+            batch_size = indexer.chunks[indexer.dims.index(dim)][0]
+        else:
+            batch_size = size
+
+    batch_size = max(int(batch_size), 1)
+
+    return [slice(start, min(start + batch_size, size)) for start in range(0, size, batch_size)]
+
+
+def _zarr_template(result: xr.Dataset, dim: Hashable, size: int, batch_size: int) -> xr.Dataset:
+    """Returns a lazy dataset with the structure of the full selection
+    (``result`` is the selection of the 1st batch), chunked like the batches
+    along ``dim`` and like ``result`` along the other dimensions.
+
+    Variables without ``dim`` are loaded, so that they are written with the
+    metadata of the store.
+
+    """
+    import dask.array as da
+
+    variables = {}
+
+    for name, var in result.variables.items():
+        if dim in var.dims:
+            shape = tuple(size if d == dim else n for d, n in var.sizes.items())
+            chunks = tuple(
+                batch_size if d == dim else -1 if var.chunks is None else var.chunks[i][0]
+                for i, d in enumerate(var.dims)
+            )
+            data = da.zeros(shape, dtype=var.dtype, chunks=chunks)
+            variables[name] = xr.Variable(var.dims, data, attrs=var.attrs)
+        else:
+            variables[name] = xr.Variable(var.dims, var.values, attrs=var.attrs)
+
+    return xr.Dataset(
+        data_vars={k: v for k, v in variables.items() if k in result.data_vars},
+        coords={k: v for k, v in variables.items() if k in result.coords},
+        attrs=result.attrs,
+    )
+
+
+IndexAttr = Union[XoakIndexWrapper, Iterable[XoakIndexWrapper], Iterable['Delayed']]
 IndexType = Union[str, Type[IndexAdapter]]
 
+# query types for which an index may be used ('knn' queries use 'nearest' indexes)
+QUERY_TYPES = ('nearest', 'range')
+
+# order in which the indexes are set (the most recent one is used by default)
+_entry_serial = itertools.count()
+
+
+def _coord_token(coord: Union[xr.DataArray, xr.Variable]) -> str:
+    """Returns a token for coordinate data (content hash for in-memory arrays,
+    graph name for dask arrays).
+
+    """
+    from dask.base import tokenize
+
+    return tokenize(coord.data)
+
+
+def _coord_data_key(data: Any) -> Tuple[str, Hashable]:
+    """Returns the key of coordinate data in the registry of indexes (graph name
+    for dask arrays, object id otherwise).
+
+    """
+    try:
+        import dask.array as da
+    except ImportError:  # pragma: no cover
+        da = None
+
+    if da is not None and isinstance(data, da.Array):
+        return ('dask', data.name)
+    return ('id', id(data))
+
+
+class _IndexEntry:
+    """Holds an index built with :meth:`XoakAccessor.set_index` and the
+    information required to (re)use it with any xarray object that has the
+    same index coordinates.
+
+    """
+
+    def __init__(
+        self,
+        index: IndexAttr,
+        index_type: IndexType,
+        coords: Tuple[str, ...],
+        coords_dims: Tuple[Hashable, ...],
+        coords_shape: Tuple[int, ...],
+        coords_data: List[Any],
+        fuse_trees: Union[bool, int] = False,
+        bounds: Optional[List[np.ndarray]] = None,
+        coverings: Optional[List[Optional[np.ndarray]]] = None,
+        selection: Optional[Dict[str, Any]] = None,
+        tree_chunks: Optional[Tuple[int, ...]] = None,
+        groupby_dim: Optional[Hashable] = None,
+        name: Hashable = None,
+        use_for: Optional[Iterable[str]] = None,
+    ):
+        if use_for is None:
+            use_for = QUERY_TYPES
+        elif isinstance(use_for, str):
+            use_for = (use_for,)
+        invalid = set(use_for) - set(QUERY_TYPES)
+        if invalid:
+            raise ValueError(f'Invalid query type(s) {sorted(invalid)}, must be in {QUERY_TYPES}')
+
+        self.index = index
+        self.index_type = index_type
+        self.coords = coords
+        self.coords_dims = coords_dims
+        self.coords_shape = coords_shape
+        self.fuse_trees = fuse_trees
+        self.bounds = bounds
+        self.coverings = coverings
+        self.selection = selection
+        self.tree_chunks = tree_chunks
+        self.groupby_dim = groupby_dim
+        self.name = name
+        self.use_for = tuple(use_for)
+        self.serial = next(_entry_serial)
+
+        # data locality of the last query of a forest persisted on a distributed cluster
+        # (measured when the query is computed, see `XoakAccessor._compute_indices`)
+        self.locality: Optional[Dict[str, int]] = None
+        self.pending_locality: Optional[Tuple[str, Dict[str, int], Dict[Any, Any], Set]] = None
+
+        # query batchers used by `asel` (per event loop, one for each batch window and
+        # max batch size, so that concurrent requests don't change each other's settings)
+        self.batchers: 'weakref.WeakKeyDictionary[Any, Dict[Any, QueryBatcher]]'
+        self.batchers = weakref.WeakKeyDictionary()
+
+        # keys of the coordinate data for which this index is available
+        # (the data itself is not referenced, see `_register_index_entry`)
+        self.data_keys: Set[Tuple[Tuple[str, Hashable], ...]] = {
+            tuple(_coord_data_key(data) for data in coords_data)
+        }
+
+    def supports(self, query_type: str, keys: Iterable[Hashable]) -> bool:
+        """Returns True if the index can run a query of the given type
+        ('nearest', 'knn' or 'range') with indexers for the given coordinates.
+
+        """
+        keys = set(keys)
+        coords = set(self.coords)
+
+        if query_type == 'range':
+            return (
+                'range' in self.use_for
+                and self.groupby_dim is None
+                and keys <= coords
+                and supports_box_query(self.index_type)
+            )
+
+        if 'nearest' not in self.use_for or not coords <= keys:
+            return False
+        if query_type == 'knn':
+            return self.groupby_dim is None and supports_knn_query(self.index_type)
+
+        return True
+
+    def is_compatible(self, xarray_obj: Union[xr.Dataset, xr.DataArray]) -> bool:
+        """Returns True if the index coordinates in ``xarray_obj`` have the same
+        dimensions and shape than the indexed coordinates.
+
+        """
+        for name in self.coords:
+            if name not in xarray_obj.coords:
+                return False
+            coord = xarray_obj.coords[name]
+            if coord.dims != self.coords_dims or coord.shape != self.coords_shape:
+                return False
+
+        return True
+
+    def matches(self, xarray_obj: Union[xr.Dataset, xr.DataArray]) -> bool:
+        """Returns True if the index can be reused for ``xarray_obj``, i.e., if
+        its index coordinates share the data of the indexed coordinates (shallow
+        copies, selection along other dimensions, etc.).
+
+        Objects with equal but distinct coordinate data (e.g., loaded from
+        different files) are not matched, see :meth:`XoakAccessor.use_index`.
+
+        """
+        if not self.is_compatible(xarray_obj):
+            return False
+
+        return _coords_data_keys(xarray_obj, self.coords) in self.data_keys
+
+
+def _coords_data_keys(
+    xarray_obj: Union[xr.Dataset, xr.DataArray], coords: Iterable[Hashable]
+) -> Tuple[Tuple[str, Hashable], ...]:
+    return tuple(_coord_data_key(xarray_obj.coords[name].variable._data) for name in coords)
+
+
+# Registry of the indexes built so far, by keys of their index coordinate data.
+# An index remains available as long as coordinate data for which it has been
+# built (or reused) is alive, even if the object that has built it is gone.
+_index_store: Dict[Tuple[Tuple[str, Hashable], ...], List[_IndexEntry]] = {}
+
+# ids of the (alive) coordinate data objects registered for each key
+_index_store_refs: Dict[Tuple[Tuple[str, Hashable], ...], Set[Tuple[int, ...]]] = {}
+
+
+def _release_coords_data(keys: Tuple[Tuple[str, Hashable], ...], ids: Tuple[int, ...]):
+    refs = _index_store_refs.get(keys)
+    if refs is None or ids not in refs:
+        return
+
+    refs.discard(ids)
+    if not refs:
+        del _index_store_refs[keys]
+        _index_store.pop(keys, None)
+
+
+def _register_index_entry(entry: _IndexEntry, xarray_obj: Union[xr.Dataset, xr.DataArray]):
+    """Make an index available for ``xarray_obj`` and for any object that shares
+    its index coordinate data (i.e., derived objects), until this data is garbage
+    collected.
+
+    """
+    coords_data = [xarray_obj.coords[name].variable._data for name in entry.coords]
+    keys = tuple(_coord_data_key(data) for data in coords_data)
+    entry.data_keys.add(keys)
+
+    entries = _index_store.setdefault(keys, [])
+    if entry not in entries:
+        entries.append(entry)
+
+    ids = tuple(id(data) for data in coords_data)
+    refs = _index_store_refs.setdefault(keys, set())
+    if ids not in refs:
+        refs.add(ids)
+        for data in coords_data:
+            weakref.finalize(data, _release_coords_data, keys, ids)
+
+
+def _lookup_index_entries(
+    xarray_obj: Union[xr.Dataset, xr.DataArray]
+) -> Dict[Hashable, _IndexEntry]:
+    """Returns the indexes that can be reused for ``xarray_obj`` (the most
+    recent one for each name).
+
+    """
+    candidates = {id(e): e for entries in _index_store.values() for e in entries}
+
+    entries = {}
+    for entry in sorted(candidates.values(), key=lambda e: e.serial):
+        if entry.matches(xarray_obj):
+            entries[entry.name] = entry
+            # e.g., dask arrays with the same graph name
+            _register_index_entry(entry, xarray_obj)
+    return entries
+
+
+def _entry_attr(name: str) -> property:
+    def getter(self):
+        entry = self._get_index_entry()
+        return getattr(entry, name) if entry is not None else None
+
+    return property(getter)
+
 
 @xr.register_dataarray_accessor('xoak')
 @xr.register_dataset_accessor('xoak')
@@ -46,40 +468,161 @@ class XoakAccessor:
 
     """
 
-    _index: IndexAttr
-    _index_type: IndexType
-    _index_coords: Tuple[str]
-    _index_coords_dims: Tuple[Hashable, ...]
-    _index_coords_shape: Tuple[int, ...]
+    _index_entries: Optional[Dict[Hashable, _IndexEntry]]
+    _index_entry: Optional[_IndexEntry]
+
+    _index = _entry_attr('index')
+    _index_type = _entry_attr('index_type')
+    _index_coords = _entry_attr('coords')
+    _index_coords_dims = _entry_attr('coords_dims')
+    _index_coords_shape = _entry_attr('coords_shape')
+    _index_fuse_trees = _entry_attr('fuse_trees')
+    _index_groupby_dim = _entry_attr('groupby_dim')
 
     def __init__(self, xarray_obj: Union[xr.Dataset, xr.DataArray]):
         self._xarray_obj = xarray_obj
+        self._index_entries = None
+        # set for accessors bound to one index (see `_for_query`)
+        self._index_entry = None
+
+    def _get_index_entries(self) -> Dict[Hashable, _IndexEntry]:
+        if self._index_entries is None:
+            # maybe reuse indexes already built for another object
+            # with the same index coordinates
+            self._index_entries = _lookup_index_entries(self._xarray_obj)
+        return self._index_entries
+
+    def _get_index_entry(self) -> Optional[_IndexEntry]:
+        if self._index_entry is not None:
+            return self._index_entry
+
+        entries = self._get_index_entries()
+        if not entries:
+            return None
+        return max(entries.values(), key=lambda e: e.serial)
+
+    def _add_index_entry(self, entry: _IndexEntry):
+        self._get_index_entries()[entry.name] = entry
+        _register_index_entry(entry, self._xarray_obj)
 
-    def _build_index_forest_delayed(self, X, persist=False, **kwargs) -> IndexAttr:
+    def _for_query(self, query_type: str, keys: Iterable[Hashable]) -> 'XoakAccessor':
+        """Returns an accessor bound to the index used for a query of the given
+        type ('nearest', 'knn' or 'range') with indexers for the given coordinates.
+
+        Among the indexes that support the query, those set on exactly these
+        coordinates are preferred, then the most recent one. Returns this
+        accessor if it is already bound or if no other index is found.
+
+        """
+        if self._index_entry is not None:
+            return self
+
+        keys = set(keys)
+        entries = self._get_index_entries().values()
+        candidates = [e for e in entries if e.supports(query_type, keys)]
+        if len(entries) <= 1 or not candidates:
+            return self
+
+        entry = max(candidates, key=lambda e: (set(e.coords) == keys, e.serial))
+        if entry is self._get_index_entry():
+            return self
+
+        accessor = XoakAccessor(self._xarray_obj)
+        accessor._index_entry = entry
+        return accessor
+
+    def _build_index_forest_delayed(
+        self, X, index_type, persist=False, shared=False, valid=None, offsets=True, **kwargs
+    ) -> IndexAttr:
         import dask
 
         indexes = []
         offset = 0
 
-        for i, chunk in enumerate(X.to_delayed().ravel()):
-            indexes.append(
-                dask.delayed(XoakIndexWrapper)(self._index_type, chunk, offset, **kwargs)
+        # spherical coverings are only used to skip the trees of a forest (not groups)
+        covering = offsets and X.numblocks[0] > 1
+
+        for i, (chunk, mask) in enumerate(zip(X.to_delayed().ravel(), _mask_chunks(X, valid))):
+            dlyd = dask.delayed(XoakIndexWrapper)(
+                index_type, chunk, offset, mask=mask, covering=covering, **kwargs
             )
-            offset += X.chunks[0][i]
+            if shared is not False:
+                dlyd = dask.delayed(share_index)(dlyd, _shared_path(shared))
+            indexes.append(dlyd)
+            if offsets:
+                offset += X.chunks[0][i]
 
         if persist:
             return dask.persist(*indexes)
         else:
             return tuple(indexes)
 
+    def _build_index_groups(
+        self, X, ngroups, index_type, persist=False, shared=False, valid=None, **kwargs
+    ) -> IndexAttr:
+        """Build one index per group of ``X.shape[0] // ngroups`` consecutive points
+        (i.e., per slice), in parallel.
+
+        """
+        size = X.shape[0] // ngroups
+
+        if not isinstance(X, np.ndarray):
+            # one chunk per slice
+            X = X.rechunk((size, X.shape[1]))
+            if valid is not None:
+                valid = valid.rechunk((size,))
+
+            return self._build_index_forest_delayed(
+                X, index_type, persist=persist, shared=shared, valid=valid, offsets=False, **kwargs
+            )
+
+        def build(i):
+            slc = slice(i * size, (i + 1) * size)
+            mask = None if valid is None else valid[slc]
+            index = XoakIndexWrapper(index_type, X[slc], 0, mask=mask, **kwargs)
+            if shared is not False:
+                index = share_index(index, _shared_path(shared))
+            return index
+
+        with ThreadPoolExecutor() as executor:
+            return tuple(executor.map(build, range(ngroups)))
+
     def set_index(
-        self, coords: Iterable[str], index_type: IndexType, persist: bool = True, **kwargs
+        self,
+        coords: Iterable[str],
+        index_type: IndexType,
+        persist: bool = True,
+        fuse_trees: Union[bool, int] = False,
+        forest_chunks: Union[None, int, str] = None,
+        store: Optional[str] = None,
+        shared: Union[bool, str] = False,
+        pickle_policy: str = 'tree',
+        skipna: bool = False,
+        mask: Any = None,
+        groupby_dim: Optional[Hashable] = None,
+        name: Hashable = None,
+        use_for: Optional[Iterable[str]] = None,
+        **kwargs,
     ):
         """Create an index tree from a subset of coordinates of the DataArray / Dataset.
 
         If the given coordinates are chunked (Dask arrays), this method will (lazily) create
         a forest of index trees (one tree per chunk of the flattened coordinate arrays).
 
+        The index is also available to any other DataArray / Dataset derived from
+        this one that shares its (unchanged) index coordinates, e.g., via ``isel``
+        (along other dimensions), shallow ``copy``, ``assign``, etc. Use
+        :meth:`~xarray.Dataset.xoak.use_index` for other objects with the same
+        index coordinates.
+
+        Several indexes may be set with different names, e.g., one index suited to
+        nearest neighbor lookup and another one suited to range search, possibly on
+        different coordinates. Each query then runs on the most suited index: one
+        that supports the query type and is used for it (see ``use_for``), set on
+        exactly the coordinates of the indexers if any, otherwise the most
+        recently set index. Setting an index with the name of an existing index
+        replaces it.
+
         Parameters
         ----------
         coords : iterable
@@ -87,17 +630,92 @@ class XoakAccessor:
             in the same order.
         index_type : str or :class:`~xoak.IndexAdapter` subclass
             Either a registered index adapter (see :class:`~xoak.IndexRegistry`) or a custom
-            :class:`~xoak.IndexAdapter` subclass.
+            :class:`~xoak.IndexAdapter` subclass. If ``'auto'``, the fastest index
+            adapter and options are selected by running a micro-benchmark on a
+            subsample of the points (for a forest, the points of the first chunk). In
+            this case, the ``**kwargs`` accepted by :func:`xoak.index.tuning.select_index`
+            (e.g., ``metric``, ``memory_budget``, ``query_volume``) are passed to it,
+            other ``**kwargs`` (e.g., ``brute_force_threshold``) are used with the
+            selected index, and the selection is available via
+            :attr:`~xarray.Dataset.xoak.index_selection`.
         persist: bool
             If True (default), this method will precompute and persist in memory the forest
             of index trees, if any.
+        fuse_trees : bool or int
+            Controls how the dask graph is built when querying a forest of index
+            trees. If False (default), one task is created for each query chunk and
+            each tree. If True, one fused task is created for each query chunk, which
+            searches all trees and reduces the results. If an integer is given,
+            one fused task is created for each query chunk and each batch of
+            ``fuse_trees`` trees. Fusing trees greatly reduces the size of the graph
+            for large forests and/or many query chunks.
+        forest_chunks : int or str, optional
+            Only used if the given coordinates are chunked. If None (default), one tree
+            is built for each chunk of the flattened coordinate arrays. If an integer
+            is given, the flattened coordinates are re-chunked so that each tree has
+            this number of points. If ``'auto'`` or a memory size given as a string
+            (e.g., ``'256MiB'``), the number of points per tree is estimated
+            from a memory budget per tree (default: dask's ``array.chunk-size``
+            configuration value) and from the build cost per point measured on a
+            sample (see :func:`xoak.index.tuning.estimate_tree_size`).
+        store : str, optional
+            Path to a directory. If given, the index is built out-of-core: each tree
+            is built from one chunk of the coordinates and is directly written to
+            this directory (same format than :meth:`~xarray.Dataset.xoak.save_index`)
+            instead of being kept in memory. The trees are then lazily loaded from disk
+            when querying the index (``persist`` is ignored). Use it with
+            coordinates chunked from an on-disk dataset (e.g., zarr or netCDF) larger
+            than memory.
+        shared : bool or str
+            If True, the data of each index tree (indexed points and tree arrays)
+            is moved to shared memory, so that the trees can be sent to other
+            processes on the same machine (e.g., local dask workers or a process
+            pool) as lightweight handles, which don't copy the data when they are
+            unpickled. If a path to a directory is given, the data is stored in
+            memory-mapped files in this directory instead. Not used with ``store``.
+            Requires Python >= 3.8. See :func:`xoak.index.shared.share_index`.
+        pickle_policy : {'tree', 'compressed', 'points', 'auto'}
+            How index trees are serialized, e.g., when they are sent to dask distributed
+            workers or saved to disk. If 'tree' (default), the whole index objects are
+            pickled. If 'compressed', they are also compressed. If 'points', only the
+            indexed points are pickled and the trees are lazily rebuilt after
+            unpickling. If 'auto', 'points' is chosen for each tree if rebuilding it
+            is expected to be faster than transferring it (based on its measured
+            build time), otherwise 'tree'.
+        skipna : bool
+            If True, points with NaN (missing) coordinate values are not indexed
+            (default: False). The index is built only from the valid points and
+            stores a compact array that maps them to their original positions (for
+            a forest, this is done independently for each tree).
+        mask : :class:`xarray.DataArray` or array-like, optional
+            A boolean array with the same dimensions than the coordinates (True for
+            the points to index). Can be combined with ``skipna``.
+        groupby_dim : hashable, optional
+            Name of one dimension of the coordinates (e.g., 'time' for swath or
+            moving mesh data). If given, one index is built for each slice along
+            this dimension (in parallel, using a thread pool or dask if the
+            coordinates are chunked). Point-wise selection then requires an
+            indexer for this dimension (labels or positions if there is no
+            coordinate), which is used to route each query point to the index of
+            its slice. Range selection, k-nearest neighbors queries and saving the
+            index are not supported. ``forest_chunks`` and ``store`` can't be used
+            with this option.
+        name : hashable, optional
+            Name of the index (default: None), which allows setting several
+            indexes on the same object.
+        use_for : str or iterable, optional
+            Query types for which this index may be used: 'nearest' (point-wise
+            selection, k-nearest neighbors queries) and/or 'range' (range
+            selection). Defaults to all query types supported by the index adapter.
         **kwargs
             Keyword arguments that will be passed to the underlying index constructor.
+            For a forest, the trees with a few points (i.e., less than
+            ``brute_force_threshold``, default: 32) are replaced by a faster
+            brute-force search if the index uses the euclidean distance (use
+            ``brute_force_threshold=0`` to disable it).
 
         """
-        self._index_type = index_type
-        self._index_coords = tuple(coords)
-
+        coords = tuple(coords)
         coord_objs = [self._xarray_obj.coords[cn] for cn in coords]
 
         if len(set([c.dims for c in coord_objs])) > 1:
@@ -105,162 +723,1528 @@ class XoakAccessor:
                 'Coordinates {coords} must all have the same dimensions in the same order'
             )
 
-        self._index_coords_dims = coord_objs[0].dims
-        self._index_coords_shape = coord_objs[0].shape
-
-        X = coords_to_point_array([self._xarray_obj[c] for c in coords])
-
-        if isinstance(X, np.ndarray):
-            self._index = XoakIndexWrapper(self._index_type, X, 0, **kwargs)
+        if not isinstance(fuse_trees, bool):
+            if not isinstance(fuse_trees, (int, np.integer)) or fuse_trees < 1:
+                raise ValueError(
+                    f'fuse_trees must be a bool or an integer >= 1, got {fuse_trees!r}'
+                )
+            fuse_trees = int(fuse_trees)
+
+        if shared is not False and store is None:
+            check_shareable()
+
+        if groupby_dim is not None:
+            if groupby_dim not in coord_objs[0].dims:
+                raise ValueError(f'{groupby_dim!r} is not a dimension of the coordinates {coords}')
+            if forest_chunks is not None or store is not None:
+                raise ValueError('forest_chunks and store are not supported with groupby_dim')
+            if mask is not None and not isinstance(mask, xr.DataArray):
+                mask = xr.DataArray(mask, dims=coord_objs[0].dims)
+
+            # the points of each slice are contiguous in the array of points
+            point_coords = [c.transpose(groupby_dim, ...) for c in coord_objs]
         else:
-            self._index = self._build_index_forest_delayed(X, persist=persist, **kwargs)
+            point_coords = coord_objs
 
-    @property
-    def index(self) -> Union[None, Index, Iterable[Index]]:
-        """Returns the underlying index object(s), or ``None`` if no index has
-        been set yet.
+        X = coords_to_point_array(point_coords)
 
-        May trigger computation of lazy indexes.
+        selection = None
 
-        """
-        if not getattr(self, '_index', False):
-            return None
-        elif isinstance(self._index, XoakIndexWrapper):
-            return self._index.index
+        if isinstance(index_type, str) and index_type == 'auto':
+            from .index.tuning import select_index
+
+            if isinstance(X, np.ndarray):
+                sample_points = X
+            else:
+                sample_points = X.blocks[0].compute()
+
+            sample_points = sample_points[np.isfinite(sample_points).all(axis=1)]
+
+            # other keyword arguments are options of the index wrapper
+            # (e.g., brute_force_threshold), kept for the selected adapter
+            select_params = inspect.signature(select_index).parameters
+            select_kwargs = {k: kwargs.pop(k) for k in list(kwargs) if k in select_params}
+
+            selection = select_index(sample_points, **select_kwargs)
+            index_type = selection['index_type']
+            kwargs = dict(selection['kwargs'], **kwargs)
+
+        if not isinstance(X, np.ndarray) and forest_chunks is not None:
+            X = self._rechunk_forest(X, index_type, forest_chunks, **kwargs)
+
+        kwargs = dict(kwargs, pickle_policy=pickle_policy)
+        if groupby_dim is not None or not isinstance(X, np.ndarray):
+            # small trees of a forest (or small slices) are replaced by a brute-force search
+            kwargs.setdefault('brute_force_threshold', BRUTE_FORCE_THRESHOLD)
+        valid = _valid_points(X, point_coords, skipna, mask)
+
+        if store is not None:
+            self._build_index_store(
+                X,
+                index_type,
+                store,
+                coords,
+                fuse_trees=fuse_trees,
+                selection=selection,
+                valid=valid,
+                name=name,
+                use_for=use_for,
+                **kwargs,
+            )
+            return
+
+        bounds = None
+        coverings = None
+        tree_chunks = None
+
+        if groupby_dim is not None:
+            index = self._build_index_groups(
+                X,
+                coord_objs[0].sizes[groupby_dim],
+                index_type,
+                persist=persist,
+                shared=shared,
+                valid=valid,
+                **kwargs,
+            )
+        elif isinstance(X, np.ndarray):
+            index = XoakIndexWrapper(index_type, X, 0, mask=valid, **kwargs)
+            if shared is not False:
+                index = share_index(index, _shared_path(shared))
+            bounds = [index.bounds]
         else:
             import dask
 
-            index_wrappers = dask.compute(*self._index)
-            return [wrp.index for wrp in index_wrappers]
+            index = self._build_index_forest_delayed(
+                X, index_type, persist=persist, shared=shared, valid=valid, **kwargs
+            )
+            tree_chunks = X.chunks[0]
+            if persist:
+                # cheap, used to skip trees in range queries
+                bounds_coverings = dask.compute(*[(idx.bounds, idx.covering) for idx in index])
+                bounds = [b for b, _ in bounds_coverings]
+                coverings = [c for _, c in bounds_coverings]
+
+        entry = _IndexEntry(
+            index,
+            index_type,
+            coords,
+            coord_objs[0].dims,
+            coord_objs[0].shape,
+            [c.variable._data for c in coord_objs],
+            fuse_trees=fuse_trees,
+            bounds=bounds,
+            coverings=coverings,
+            selection=selection,
+            tree_chunks=tree_chunks,
+            groupby_dim=groupby_dim,
+            name=name,
+            use_for=use_for,
+        )
+        self._add_index_entry(entry)
+
+    def _build_index_store(
+        self,
+        X,
+        index_type,
+        path,
+        coords,
+        fuse_trees,
+        selection,
+        valid=None,
+        name=None,
+        use_for=None,
+        **kwargs,
+    ):
+        import dask
 
-    def _query(self, indexers):
-        X = coords_to_point_array([indexers[c] for c in self._index_coords])
+        from .index import storage
 
-        if isinstance(X, np.ndarray) and isinstance(self._index, XoakIndexWrapper):
-            # directly call index wrapper's query method
-            res = self._index.query(X)
-            results = res['indices'][:, 0]
+        os.makedirs(path, exist_ok=True)
 
+        if isinstance(X, np.ndarray):
+            chunks = [X]
+            chunk_sizes: Tuple[int, ...] = (X.shape[0],)
+            masks = [valid]
         else:
-            # Two-stage lazy query with dask
-            import dask
-            import dask.array as da
+            chunks = list(X.to_delayed().ravel())
+            chunk_sizes = X.chunks[0]
+            masks = _mask_chunks(X, valid)
 
-            # coerce query array as a dask array and index(es) as an iterable
-            if isinstance(X, np.ndarray):
-                X = da.from_array(X, chunks=X.shape)
+        tasks = []
+        offset = 0
+        covering = len(chunks) > 1
+
+        # trees are released from memory as soon as they are written to disk
+        for i, (chunk, size, mask) in enumerate(zip(chunks, chunk_sizes, masks)):
+            tree_path = os.path.join(path, storage.tree_filename(i))
+            tasks.append(
+                dask.delayed(storage.build_and_dump_tree)(
+                    index_type, chunk, offset, tree_path, mask=mask, covering=covering, **kwargs
+                )
+            )
+            offset += size
 
-            if isinstance(self._index, XoakIndexWrapper):
-                indexes = [self._index]
-            else:
-                indexes = self._index
+        trees = list(dask.compute(*tasks))
 
-            # 1st "map" stage:
-            # - execute `IndexWrapperCls.query` for each query array chunk and each index instance
-            # - concatenate all distances/positions results in two dask arrays of shape (n_points, n_indexes)
+        self._write_index_metadata(path, trees, coords, index_type, fuse_trees, forest=True)
+        self.load_index(path, name=name, use_for=use_for)
+        self._get_index_entries()[name].selection = selection
 
-            res_chunk = []
+    def _write_index_metadata(self, path, trees, coords, index_type, fuse_trees, forest):
+        from .index import storage
 
-            for i, chunk in enumerate(X.to_delayed().ravel()):
-                res_chunk_idx = []
+        coord = self._xarray_obj.coords[coords[0]]
 
-                chunk_npoints = X.chunks[0][i]
-                shape = (chunk_npoints, 1)
+        metadata = {
+            'index_type': storage.index_type_to_str(index_type),
+            'coords': list(coords),
+            'dims': [str(d) for d in coord.dims],
+            'shape': list(coord.shape),
+            'tokens': [_coord_token(self._xarray_obj.coords[cn]) for cn in coords],
+            'fuse_trees': fuse_trees,
+            'forest': forest,
+        }
+        storage.write_metadata(path, metadata, trees)
 
-                for idx in indexes:
-                    dlyd = dask.delayed(idx.query)(chunk)
-                    res_chunk_idx.append(
-                        da.from_delayed(dlyd, shape, dtype=XoakIndexWrapper._query_result_dtype)
-                    )
+    def save_index(self, path: str, name: Hashable = None):
+        """Save the index to disk.
 
-                res_chunk.append(da.concatenate(res_chunk_idx, axis=1))
+        The index is saved in a directory, with one file per tree (pickled
+        objects) and a JSON file for the metadata. For a forest of indexes, each
+        tree is written to disk by a separate (dask) task.
+
+        Parameters
+        ----------
+        path : str
+            Path to the directory where to save the index (created if it
+            doesn't exist yet).
+        name : hashable, optional
+            Name of the index to save, if several indexes are set (default: the
+            most recently set index).
 
-            map_results = da.concatenate(res_chunk, axis=0)
-            distances = map_results['distances']
-            indices = map_results['indices']
+        """
+        if name is not None:
+            return self._named(name).save_index(path)
 
-            # 2nd "reduce" stage:
-            # - brute force lookup over the indexes dimension (columns)
-
-            indices_col = da.argmin(distances, axis=1)
-
-            results = da.blockwise(
-                lambda arr, icol: np.take_along_axis(arr, icol[:, None], 1).squeeze(),
-                'i',
-                indices,
-                'ik',
-                indices_col,
-                'i',
-                dtype=np.intp,
-                concatenate=True,
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
             )
 
-        return results
+        self._check_not_grouped('Saving the index')
 
-    def _get_pos_indexers(self, indices, indexers):
-        """Returns positional indexers based on the query results and the
-        original (label-based) indexers.
+        from .index import storage
 
-        1. Unravel the (flattened) indices returned from the query
-        2. Reshape the unraveled indices according to indexers shapes
-        3. Wrap the indices in xarray.Variable objects.
+        os.makedirs(path, exist_ok=True)
 
-        """
-        pos_indexers = {}
+        if isinstance(self._index, XoakIndexWrapper):
+            trees = [storage.dump_tree(self._index, os.path.join(path, storage.tree_filename(0)))]
+            forest = False
+        else:
+            import dask
 
-        indexer_dims = [idx.dims for idx in indexers.values()]
-        indexer_shapes = [idx.shape for idx in indexers.values()]
+            tasks = [
+                dask.delayed(storage.dump_tree)(idx, os.path.join(path, storage.tree_filename(i)))
+                for i, idx in enumerate(self._index)
+            ]
+            trees = list(dask.compute(*tasks))
+            forest = True
+
+        self._write_index_metadata(
+            path, trees, self._index_coords, self._index_type, self._index_fuse_trees, forest
+        )
+
+    def load_index(
+        self,
+        path: str,
+        persist: bool = False,
+        name: Hashable = None,
+        use_for: Optional[Iterable[str]] = None,
+        check_coords: bool = True,
+    ):
+        """Load an index saved with :meth:`~xarray.Dataset.xoak.save_index`
+        (or built out-of-core with :meth:`~xarray.Dataset.xoak.set_index`).
 
-        if len(set(indexer_dims)) > 1:
-            raise ValueError('All indexers must have the same dimensions.')
+        Parameters
+        ----------
+        path : str
+            Path to the directory where the index is saved.
+        persist : bool
+            Only relevant for a forest of indexes. If False (default), the trees are
+            lazily loaded from disk when querying the index. If True, all trees are
+            loaded and persisted in memory.
+        name : hashable, optional
+            Name of the loaded index (see :meth:`~xarray.Dataset.xoak.set_index`).
+        use_for : str or iterable, optional
+            Query types for which the loaded index may be used (see
+            :meth:`~xarray.Dataset.xoak.set_index`).
+        check_coords : bool
+            If True (default), check that the index coordinates are the same than
+            the coordinates for which the index has been saved, by comparing their
+            tokens (content hash for in-memory coordinates, graph name for dask
+            arrays). Set it to False to skip this check, e.g., if the coordinates
+            are loaded in a different way (in memory or chunked) than when the
+            index has been saved.
+
+        """
+        import dask
 
-        u_indices = list(np.unravel_index(indices.ravel(), self._index_coords_shape))
+        from .index import storage
+
+        metadata = storage.read_metadata(path)
+        coords = tuple(metadata['coords'])
+
+        coord_objs = []
+        for cname in coords:
+            coord = self._xarray_obj.coords.get(cname)
+            if coord is None or [str(d) for d in coord.dims] != metadata['dims']:
+                raise ValueError(
+                    f"Coordinate {cname!r} with dimensions {tuple(metadata['dims'])} not found"
+                )
+            if list(coord.shape) != metadata['shape']:
+                raise ValueError(
+                    f"Coordinate {cname!r} has shape {coord.shape}, "
+                    f"expected {tuple(metadata['shape'])} from the saved index"
+                )
+            coord_objs.append(coord)
+
+        # indexes saved by older versions have no tokens
+        tokens = metadata.get('tokens')
+        if check_coords and tokens is not None:
+            for cname, coord, token in zip(coords, coord_objs, tokens):
+                if _coord_token(coord) != token:
+                    raise ValueError(
+                        f'Coordinate {cname!r} differs from the coordinate of the saved index '
+                        '(use check_coords=False to skip this check)'
+                    )
 
-        for dim, ind in zip(self._index_coords_dims, u_indices):
-            pos_indexers[dim] = xr.Variable(
-                indexer_dims[0],
-                ind.reshape(indexer_shapes[0]),
+        files = [os.path.join(path, tree['file']) for tree in metadata['trees']]
+        bounds = [np.array(tree['bounds']) for tree in metadata['trees']]
+        coverings = [
+            None if tree.get('covering') is None else np.array(tree['covering']).reshape(-1, 4)
+            for tree in metadata['trees']
+        ]
+
+        if metadata['forest']:
+            index = tuple(dask.delayed(storage.load_tree, pure=True)(f) for f in files)
+            if persist:
+                index = dask.persist(*index)
+            tree_chunks = tuple(tree['npoints'] for tree in metadata['trees'])
+        else:
+            index = storage.load_tree(files[0])
+            tree_chunks = None
+
+        entry = _IndexEntry(
+            index,
+            metadata['index_type'],
+            coords,
+            coord_objs[0].dims,
+            coord_objs[0].shape,
+            [c.variable._data for c in coord_objs],
+            fuse_trees=metadata['fuse_trees'],
+            bounds=bounds,
+            coverings=coverings,
+            tree_chunks=tree_chunks,
+            name=name,
+            use_for=use_for,
+        )
+        self._add_index_entry(entry)
+
+    def _rechunk_forest(self, X, index_type, forest_chunks, **kwargs):
+        if isinstance(forest_chunks, str):
+            from .index.tuning import estimate_tree_size
+
+            memory_budget = None if forest_chunks == 'auto' else forest_chunks
+            sample = X[: min(10_000, X.shape[0])].compute()
+            sample = sample[np.isfinite(sample).all(axis=1)]
+            tree_size = estimate_tree_size(
+                sample, index_type, memory_budget=memory_budget, **kwargs
             )
+        else:
+            tree_size = forest_chunks
 
-        return pos_indexers
-
-    def sel(
-        self, indexers: Mapping[Hashable, Any] = None, **indexers_kwargs: Any
-    ) -> Union[xr.Dataset, xr.DataArray]:
-        """Selection based on a ball tree index.
+        return X.rechunk((tree_size, X.shape[1]))
 
-        The index must have been already built using `xoak.set_index()`.
+    def use_index(self, other: Union[xr.Dataset, xr.DataArray]):
+        """Reuse the index already built for another DataArray / Dataset.
 
-        It behaves mostly like :meth:`xarray.Dataset.sel` and
-        :meth:`xarray.DataArray.sel` methods, with some limitations:
+        This is useful when the index coordinates are known to be the same but
+        couldn't be detected as such, e.g., after re-chunking the coordinates or
+        when opening several files sharing the same grid (e.g., in the
+        ``preprocess`` function of :func:`xarray.open_mfdataset`).
 
-        - Orthogonal indexing is not supported
-        - For vectorized (point-wise) indexing, you need to supply xarray
-          objects
-        - Use it for nearest neighbor lookup only (it implicitly
-          assumes method="nearest")
+        All the (named) indexes of the other object are reused.
 
-        This triggers :func:`dask.compute` if the given indexers and/or the index
-        coordinates are chunked.
+        Parameters
+        ----------
+        other : :class:`xarray.Dataset` or :class:`xarray.DataArray`
+            Object for which an index has been set. Its index coordinates must also
+            be present in this object, with the same dimensions and shape (the
+            coordinate labels are assumed to be the same and are not checked).
 
         """
-        if not getattr(self, '_index', False):
+        entries = other.xoak._get_index_entries()
+
+        if not entries:
             raise ValueError(
                 'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
             )
+        for entry in entries.values():
+            if not entry.is_compatible(self._xarray_obj):
+                raise ValueError(
+                    f'Coordinates {entry.coords} with dimensions {entry.coords_dims} and '
+                    f'shape {entry.coords_shape} not found'
+                )
 
-        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.sel')
-        indices = self._query(indexers)
+        self._index_entries = dict(entries)
+        for entry in entries.values():
+            _register_index_entry(entry, self._xarray_obj)
 
-        if not isinstance(indices, np.ndarray):
-            # TODO: remove (see todo below)
-            indices = indices.compute()
+    @property
+    def index_names(self) -> List[Hashable]:
+        """Returns the names of the indexes set for this object (``None`` for an
+        unnamed index), from the least to the most recently set.
 
-        pos_indexers = self._get_pos_indexers(indices, indexers)
+        """
+        entries = sorted(self._get_index_entries().values(), key=lambda e: e.serial)
+        return [e.name for e in entries]
 
-        # TODO: issue in xarray. 1-dimensional xarray.Variables are always considered
-        # as OuterIndexer, while we want here VectorizedIndexer
-        # This would also allow lazy selection
-        result = self._xarray_obj.isel(indexers=pos_indexers)
+    def _named(self, name: Hashable) -> 'XoakAccessor':
+        """Returns an accessor bound to the index with the given name."""
+        entries = self._get_index_entries()
 
-        return result
+        if name not in entries:
+            raise KeyError(f'No index named {name!r}, available indexes: {self.index_names}')
+
+        accessor = XoakAccessor(self._xarray_obj)
+        accessor._index_entry = entries[name]
+        return accessor
+
+    @property
+    def index(self) -> Union[None, Index, Iterable[Index]]:
+        """Returns the underlying index object(s), or ``None`` if no index has
+        been set yet.
+
+        May trigger computation of lazy indexes.
+
+        """
+        if self._index is None:
+            return None
+        elif isinstance(self._index, XoakIndexWrapper):
+            return self._index.index
+        else:
+            import dask
+
+            index_wrappers = dask.compute(*self._index)
+            return [wrp.index for wrp in index_wrappers]
+
+    @property
+    def index_selection(self) -> Optional[Dict[str, Any]]:
+        """Returns the result of the automatic index selection (i.e., when
+        ``index_type='auto'`` is given to :meth:`~xarray.Dataset.xoak.set_index`),
+        or ``None``.
+
+        It contains the name (``index_type``) and options (``kwargs``) of the
+        selected index adapter, which can be reused to set the same index
+        explicitly, as well as the timings and memory estimates of all
+        candidates (``timings``).
+
+        """
+        entry = self._get_index_entry()
+        return None if entry is None else entry.selection
+
+    @property
+    def index_locality(self) -> Optional[Dict[str, int]]:
+        """Returns the data locality of the last computed point-wise selection
+        of a forest of index trees persisted on a dask distributed cluster, or
+        ``None``.
+
+        The query tasks are run preferably on the workers holding the trees, so
+        that the query points are transferred to the trees and not the other
+        way round. It contains:
+
+        - ``tasks``: the number of query tasks
+        - ``pinned``: the number of tasks assigned to a worker holding (most of)
+          their trees
+        - ``pinned_trees``: the number of trees queried by tasks assigned to a
+          worker holding them
+        - ``tree_transfers``: the number of copies of trees to other workers
+          during the computation (measured, i.e., new replicas of the trees)
+        - ``avoided_transfers``: the number of pinned trees that have not been
+          copied to other workers (measured)
+
+        The data locality is measured only for queries computed by xoak, e.g.,
+        :meth:`~xarray.Dataset.xoak.sel` or :meth:`~xarray.Dataset.xoak.asel`.
+
+        """
+        entry = self._get_index_entry()
+        return None if entry is None else entry.locality
+
+    def _compute_indices(self, indices: Any) -> np.ndarray:
+        """Compute the (lazy) results of a point-wise query.
+
+        Low-level task fusion drops the annotations of the query tasks (i.e., the
+        workers holding the trees), it is thus disabled for annotated graphs. For
+        a forest persisted on a distributed cluster, the tree transfers are
+        measured (see :attr:`index_locality`).
+
+        """
+        import dask
+
+        entry = self._get_index_entry()
+        pending = None if entry is None else entry.pending_locality
+        if pending is not None and pending[0] != indices.name:
+            pending = None
+        if pending is not None:
+            tree_workers = _who_has(pending[2])
+
+        if any(layer.annotations for layer in indices.__dask_graph__().layers.values()):
+            with dask.config.set({'optimization.fuse.active': False}):
+                result = indices.compute()
+        else:
+            result = indices.compute()
+
+        if pending is not None:
+            _, counts, tree_futures, pinned_trees = pending
+            new_replicas = {
+                key: len(set(workers) - set(tree_workers[key]))
+                for key, workers in _who_has(tree_futures).items()
+            }
+            entry.locality = dict(
+                counts,
+                pinned_trees=len(pinned_trees),
+                tree_transfers=sum(new_replicas.values()),
+                avoided_transfers=sum(1 for key in pinned_trees if not new_replicas[key]),
+            )
+            entry.pending_locality = None
+
+        return result
+
+    def _check_not_grouped(self, operation: str):
+        if self._index_groupby_dim is not None:
+            raise ValueError(
+                f'{operation} is not supported for an index set with groupby_dim '
+                f'{self._index_groupby_dim!r}'
+            )
+
+    def _query(self, indexers):
+        X = coords_to_point_array([indexers[c] for c in self._index_coords])
+
+        groupby_dim = self._index_groupby_dim
+        if groupby_dim is not None:
+            if groupby_dim not in indexers:
+                raise ValueError(
+                    f'An indexer for the {groupby_dim!r} dimension is required '
+                    '(index set with groupby_dim)'
+                )
+            return self._query_groups(X, self._group_positions(indexers[groupby_dim]))
+
+        return self._query_points(X)
+
+    def _group_positions(self, indexer) -> np.ndarray:
+        """Returns the positions along the groupby dimension (i.e., the index
+        of the slice) of each query point.
+
+        """
+        groupby_dim = self._index_groupby_dim
+        ngroups = self._index_coords_shape[self._index_coords_dims.index(groupby_dim)]
+        values = np.ravel(np.asarray(indexer))
+
+        if groupby_dim in self._xarray_obj.indexes:
+            positions = self._xarray_obj.indexes[groupby_dim].get_indexer(values)
+            missing = positions < 0
+            if missing.any():
+                raise KeyError(f'{values[missing]} not found in {groupby_dim!r}')
+        else:
+            positions = values.astype(np.intp)
+            if np.any((positions < 0) | (positions >= ngroups)):
+                raise IndexError(f'{groupby_dim!r} positions out of bounds (size {ngroups})')
+
+        return positions
+
+    def _query_groups(self, X, groups: np.ndarray) -> np.ndarray:
+        """Query the index of each slice with the points routed to that slice,
+        returns the (flattened) indices of the nearest index points.
+
+        The query points are sorted by slice, so that each index of a slice is
+        queried only once with all of its points.
+
+        """
+        if not isinstance(X, np.ndarray):
+            X = X.compute()
+
+        order = np.argsort(groups, kind='stable')
+        sorted_groups = groups[order]
+        ugroups, starts = np.unique(sorted_groups, return_index=True)
+        stops = np.append(starts[1:], sorted_groups.size)
+
+        indexes = list(self._index)
+        results = []
+
+        for group, start, stop in zip(ugroups, starts, stops):
+            idx = indexes[group]
+            points = X[order[start:stop]]
+            if isinstance(idx, XoakIndexWrapper):
+                results.append(idx.query(points))
+            else:
+                import dask
+
+                results.append(dask.delayed(idx.query)(points))
+
+        if any(hasattr(r, 'dask') for r in results):
+            import dask
+
+            results = list(dask.compute(*results))
+
+        positions = np.empty(groups.size, dtype=np.intp)
+        if results:
+            positions[order] = np.concatenate([r['indices'][:, 0] for r in results])
+
+        # positions in the slices -> (flattened) indices in the index coordinates
+        axis = self._index_coords_dims.index(self._index_groupby_dim)
+        shape = self._index_coords_shape
+        slice_shape = shape[:axis] + shape[axis + 1 :]
+
+        valid = positions >= 0
+        u_positions = list(np.unravel_index(positions[valid], slice_shape))
+        u_positions.insert(axis, groups[valid])
+
+        indices = np.full(groups.size, -1, dtype=np.intp)
+        indices[valid] = np.ravel_multi_index(u_positions, shape)
+
+        return indices
+
+    def _query_points(self, X):
+        """Query the index with an array of points of shape (n_points, n_coordinates),
+        returns the (flattened) indices of the nearest index points.
+
+        """
+        self._check_not_grouped('Querying without groupby dimension indexer')
+
+        if isinstance(X, np.ndarray) and isinstance(self._index, XoakIndexWrapper):
+            # directly call index wrapper's query method
+            res = self._index.query(X)
+            results = res['indices'][:, 0]
+
+        else:
+            # Two-stage lazy query with dask
+            import dask
+            import dask.array as da
+
+            if isinstance(self._index, XoakIndexWrapper):
+                indexes = [self._index]
+            else:
+                indexes = list(self._index)
+
+            # indexes that may contain the nearest neighbors of each query chunk
+            chunk_indexes = [indexes] * (1 if isinstance(X, np.ndarray) else X.numblocks[0])
+            coverings = self._get_index_entry().coverings
+            if coverings is not None and len(indexes) > 1 and all(c is not None for c in coverings):
+                chunk_indexes = [
+                    [idx for idx, keep in zip(indexes, selected) if keep]
+                    for selected in _select_trees(X, coverings)
+                ]
+
+            # coerce query array as a dask array
+            if isinstance(X, np.ndarray):
+                X = da.from_array(X, chunks=X.shape)
+
+            # trees persisted on a distributed cluster: run the query tasks on the
+            # workers holding the trees (moving the query chunks, not the trees)
+            tree_futures = (
+                None if isinstance(self._index, XoakIndexWrapper) else _tree_futures(indexes)
+            )
+            tree_workers = None if tree_futures is None else _who_has(tree_futures)
+            counts = {'tasks': 0, 'pinned': 0}
+            pinned_trees = set()
+
+            # 1st "map" stage:
+            # - execute `IndexWrapperCls.query` for each query array chunk and each index
+            #   instance (or for each batch of index instances, fused in a single task)
+            # - concatenate all distances/positions results in a dask array of shape
+            #   (n_points, n_indexes) or (n_points, n_batches) for each query chunk
+            # 2nd "reduce" stage:
+            # - brute force lookup over the indexes dimension (columns) for each query chunk
+
+            res_chunk = []
+
+            for i, (chunk, chunk_idx) in enumerate(zip(X.to_delayed().ravel(), chunk_indexes)):
+                if self._index_fuse_trees is True:
+                    batch_size = len(chunk_idx)
+                else:
+                    batch_size = int(self._index_fuse_trees) or 1
+
+                index_batches = [
+                    chunk_idx[j : j + batch_size] for j in range(0, len(chunk_idx), batch_size)
+                ]
+
+                res_chunk_idx = []
+
+                chunk_npoints = X.chunks[0][i]
+                shape = (chunk_npoints, 1)
+
+                for batch in index_batches:
+                    annotations = {}
+                    counts['tasks'] += 1
+
+                    if tree_workers is not None:
+                        holders = Counter(w for idx in batch for w in tree_workers[idx.key])
+                        if holders:
+                            worker, _ = holders.most_common(1)[0]
+                            annotations = {'workers': [worker], 'allow_other_workers': True}
+                            counts['pinned'] += 1
+                            pinned_trees.update(
+                                idx.key for idx in batch if worker in tree_workers[idx.key]
+                            )
+
+                    with dask.annotate(**annotations):
+                        if len(batch) == 1 and not self._index_fuse_trees:
+                            dlyd = dask.delayed(batch[0].query)(chunk)
+                        else:
+                            dlyd = dask.delayed(_query_index_batch)(chunk, *batch)
+
+                    res_chunk_idx.append(
+                        da.from_delayed(dlyd, shape, dtype=XoakIndexWrapper._query_result_dtype)
+                    )
+
+                if len(res_chunk_idx) == 1:
+                    # all indexes have been queried (and results reduced) in a single task
+                    res_chunk.append(res_chunk_idx[0])
+                else:
+                    res_chunk.append(
+                        da.concatenate(res_chunk_idx, axis=1)
+                        .rechunk({1: -1})
+                        .map_blocks(_reduce_nearest, chunks=shape, dtype=res_chunk_idx[0].dtype)
+                    )
+
+            results = da.concatenate(res_chunk, axis=0)['indices'][:, 0]
+
+            if tree_futures is not None:
+                self._get_index_entry().pending_locality = (
+                    results.name,
+                    counts,
+                    tree_futures,
+                    pinned_trees,
+                )
+
+        return results
+
+    def _get_box(self, indexers) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the lower and upper boundaries of the box defined by
+        slice indexers.
+
+        """
+        invalid = set(indexers) - set(self._index_coords)
+        if invalid:
+            raise ValueError(f'{sorted(invalid)} are not coordinates of the index')
+
+        lower = np.full(len(self._index_coords), -np.inf)
+        upper = np.full(len(self._index_coords), np.inf)
+
+        for i, name in enumerate(self._index_coords):
+            slc = indexers.get(name, slice(None))
+            if slc.step is not None:
+                raise ValueError('Slices with steps are not supported.')
+            if slc.start is not None:
+                lower[i] = slc.start
+            if slc.stop is not None:
+                upper[i] = slc.stop
+
+        return lower, upper
+
+    def _query_box(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """Returns the sorted (flattened) indices of all index points located
+        inside a box.
+
+        Index trees (forest) with a bounding box that doesn't overlap the box are skipped.
+
+        """
+        self._check_not_grouped('Range selection')
+
+        if isinstance(self._index, XoakIndexWrapper):
+            indexes = [self._index]
+        else:
+            indexes = list(self._index)
+
+        bounds = self._get_index_entry().bounds or [None] * len(indexes)
+
+        chunks: List[Any] = [None] * len(indexes)
+
+        if not supports_box_query(self._index_type):
+            # need to compare coordinate labels (for overlapping trees only)
+            X = coords_to_point_array([self._xarray_obj[c] for c in self._index_coords])
+            tree_chunks = self._get_index_entry().tree_chunks
+
+            if not isinstance(X, np.ndarray) and tree_chunks is not None:
+                X = X.rechunk((tree_chunks, X.shape[1]))
+
+            if isinstance(X, np.ndarray) and len(indexes) == 1:
+                chunks = [X]
+            elif not isinstance(X, np.ndarray) and X.numblocks[0] == len(indexes):
+                chunks = list(X.to_delayed().ravel())
+            else:
+                # index(es) and coordinates chunks don't match
+                inside = ((X >= lower) & (X <= upper)).all(axis=1)
+                if not isinstance(inside, np.ndarray):
+                    inside = inside.compute()
+                return np.flatnonzero(inside)
+
+        results = []
+
+        for idx, bbox, chunk in zip(indexes, bounds, chunks):
+            if bbox is not None and not _box_overlaps(bbox, lower, upper):
+                continue
+            if isinstance(idx, XoakIndexWrapper) and not hasattr(chunk, 'dask'):
+                results.append(idx.query_box(lower, upper, points=chunk))
+            else:
+                import dask
+
+                results.append(dask.delayed(idx.query_box)(lower, upper, points=chunk))
+
+        if any(hasattr(r, 'dask') for r in results):
+            import dask
+
+            results = list(dask.compute(*results))
+
+        if not results:
+            return np.empty(0, dtype=np.intp)
+
+        return np.concatenate(results)
+
+    def range_mask(
+        self, indexers: Mapping[Hashable, slice] = None, **indexers_kwargs: slice
+    ) -> xr.DataArray:
+        """Returns a boolean mask of the index points located inside a box
+        (orthogonal range search).
+
+        The index must have been already built using `xoak.set_index()`.
+
+        Parameters
+        ----------
+        indexers : dict, optional
+            A dict with keys matching index coordinates and slice values
+            (lower and upper boundaries, inclusive). Coordinates without indexer
+            are unbounded. One of ``indexers`` or ``indexers_kwargs`` must be
+            provided.
+        **indexers_kwargs : optional
+            The keyword arguments form of ``indexers``.
+
+        Returns
+        -------
+        mask : :class:`xarray.DataArray`
+            A boolean array with the same dimensions than the index coordinates.
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.range_mask')
+
+        accessor = self._for_query('range', indexers)
+        if accessor is not self:
+            return accessor.range_mask(indexers)
+
+        indices = self._query_box(*self._get_box(indexers))
+
+        mask = np.zeros(np.prod(self._index_coords_shape, dtype=int), dtype=bool)
+        mask[indices] = True
+
+        return xr.DataArray(
+            mask.reshape(self._index_coords_shape),
+            dims=self._index_coords_dims,
+            coords={c: self._xarray_obj.coords[c] for c in self._index_coords},
+        )
+
+    def _get_plan(self, indices, indexers) -> SelectionPlan:
+        """Returns a selection plan based on the query results and the
+        original (label-based) indexers.
+
+        """
+        indexer_dims = [idx.dims for idx in indexers.values()]
+        indexer_shapes = [idx.shape for idx in indexers.values()]
+
+        if len(set(indexer_dims)) > 1:
+            raise ValueError('All indexers must have the same dimensions.')
+
+        if indices.size and indices.min() < 0:
+            raise ValueError(
+                'No valid index point found for some query points: all the indexed points '
+                '(or all the points of their slice with groupby_dim) are missing or masked.'
+            )
+
+        return SelectionPlan(
+            indices,
+            self._index_coords_dims,
+            self._index_coords_shape,
+            indexer_dims[0],
+            indexer_shapes[0],
+        )
+
+    def _get_pos_indexers(self, indices, indexers):
+        """Returns positional indexers based on the query results and the
+        original (label-based) indexers.
+
+        1. Unravel the (flattened) indices returned from the query
+        2. Reshape the unraveled indices according to indexers shapes
+        3. Wrap the indices in xarray.Variable objects.
+
+        """
+        return self._get_plan(indices, indexers).pos_indexers()
+
+    def plan_sel(
+        self, indexers: Mapping[Hashable, Any] = None, **indexers_kwargs: Any
+    ) -> SelectionPlan:
+        """Compute a reusable selection plan based on the index.
+
+        This runs the same index query than :meth:`~xarray.Dataset.xoak.sel`
+        (point-wise or orthogonal selection), but returns a
+        :class:`~xoak.SelectionPlan` object holding the positional indices of the
+        selected points instead of the selected data. The plan can then be
+        applied (:meth:`~xoak.SelectionPlan.apply`) to any other DataArray /
+        Dataset with the same index dimensions (e.g., other variables or files on
+        the same grid) without querying the index again. Plans can also be saved
+        to disk and reused across runs.
+
+        Parameters
+        ----------
+        indexers : dict, optional
+            Same as for :meth:`~xarray.Dataset.xoak.sel`.
+        **indexers_kwargs : optional
+            The keyword arguments form of ``indexers``.
+
+        Returns
+        -------
+        plan : :class:`~xoak.SelectionPlan`
+            The selection plan.
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.plan_sel')
+
+        is_slice = [isinstance(idx, slice) for idx in indexers.values()]
+
+        accessor = self._for_query('range' if any(is_slice) else 'nearest', indexers)
+        if accessor is not self:
+            return accessor.plan_sel(indexers)
+
+        if any(is_slice):
+            if not all(is_slice):
+                raise ValueError('Cannot mix orthogonal (slices) and point-wise indexers.')
+            return self._plan_box(indexers)
+
+        indices = self._query(indexers)
+
+        if not isinstance(indices, np.ndarray):
+            # TODO: remove (see todo in `sel`)
+            indices = self._compute_indices(indices)
+
+        return self._get_plan(indices, indexers)
+
+    def _plan_box(self, indexers: Mapping[Hashable, slice]) -> SelectionPlan:
+        indices = self._query_box(*self._get_box(indexers))
+        stacked_dim = '_'.join(str(d) for d in self._index_coords_dims)
+
+        if len(self._index_coords_dims) == 1:
+            stacked_dim = self._index_coords_dims[0]
+
+        return SelectionPlan(
+            indices,
+            self._index_coords_dims,
+            self._index_coords_shape,
+            (stacked_dim,),
+            indices.shape,
+        )
+
+    def sel(
+        self, indexers: Mapping[Hashable, Any] = None, **indexers_kwargs: Any
+    ) -> Union[xr.Dataset, xr.DataArray]:
+        """Selection based on a ball tree index.
+
+        The index must have been already built using `xoak.set_index()`.
+
+        It behaves mostly like :meth:`xarray.Dataset.sel` and
+        :meth:`xarray.DataArray.sel` methods, with some limitations:
+
+        - For vectorized (point-wise) indexing, you need to supply xarray
+          objects. It implicitly assumes method="nearest" (nearest neighbor
+          lookup)
+        - For orthogonal indexing (range search), you need to supply slices
+          (lower and upper boundaries, inclusive). Coordinates without slice are
+          unbounded. The index points found inside the box are stacked along a
+          new dimension named after the index dimensions joined with "_" (or
+          along the index dimension if it is 1-dimensional). See also
+          :meth:`~xarray.Dataset.xoak.range_mask`
+        - Orthogonal and point-wise indexing can't be mixed
+
+        This triggers :func:`dask.compute` if the given indexers and/or the index
+        coordinates are chunked.
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.sel')
+        plan = self.plan_sel(indexers)
+
+        # TODO: issue in xarray. 1-dimensional xarray.Variables are always considered
+        # as OuterIndexer, while we want here VectorizedIndexer
+        # This would also allow lazy selection
+        result = self._xarray_obj.isel(indexers=plan.pos_indexers())
+
+        return result
+
+    def sel_to_zarr(
+        self,
+        store: Any,
+        indexers: Mapping[Hashable, Any] = None,
+        batch_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        **indexers_kwargs: Any,
+    ):
+        """Point-wise selection written to a Zarr store batch by batch.
+
+        The indexers are split in batches along their first dimension. For each
+        batch, the index is queried, the selected data is gathered and written to
+        its region of the store, so that memory usage is bounded by the size of a
+        few batches regardless of the total number of points. The store is
+        created (metadata only) from the selection of the first batch.
+
+        The index must have been already built using `xoak.set_index()`.
+
+        Parameters
+        ----------
+        store : MutableMapping or str
+            Zarr store or path to a new Zarr store (must not exist).
+        indexers : dict, optional
+            A dict with keys matching index coordinates and values given as
+            xarray objects with the same dimensions (only point-wise selection is
+            supported). One of ``indexers`` or ``indexers_kwargs`` must be
+            provided.
+        batch_size : int, optional
+            Number of points (along the 1st dimension of the indexers) per batch.
+            Also used as the chunk size of the store along this dimension.
+            Defaults to the size of the 1st chunk of the indexers if they are
+            chunked, or to all points otherwise.
+        max_workers : int, optional
+            If greater than 1, batches are processed in a pool of threads, which
+            overlaps the queries of some batches with the writes of others. At
+            most ``max_workers`` batches are held in memory at the same time.
+        **indexers_kwargs : optional
+            The keyword arguments form of ``indexers``.
+
+        Notes
+        -----
+        The selection of a :class:`xarray.DataArray` is written as a single
+        variable, named after the DataArray (if any). Use
+        :func:`xarray.open_zarr` to (lazily) read the result.
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.sel_to_zarr')
+
+        if any(isinstance(idx, slice) for idx in indexers.values()):
+            raise ValueError('sel_to_zarr only supports point-wise indexers (no slices).')
+
+        first = next(iter(indexers.values()))
+        if not first.ndim:
+            raise ValueError('sel_to_zarr requires indexers with at least one dimension')
+
+        dim = first.dims[0]
+        batches = _batch_slices(first, dim, batch_size)
+
+        def select(batch: slice) -> xr.Dataset:
+            result = self.sel({k: v.isel({dim: batch}) for k, v in indexers.items()})
+
+            if isinstance(result, xr.DataArray):
+                name = result.name if result.name is not None else '__xarray_dataarray_variable__'
+                result = result.to_dataset(name=name)
+
+            for var in result.variables.values():
+                var.encoding = {}
+
+            return result
+
+        def write(batch: slice, result: Optional[xr.Dataset] = None):
+            if result is None:
+                result = select(batch)
+
+            # variables without the batch dimension are written with the template
+            result = result.drop_vars([k for k, v in result.variables.items() if dim not in v.dims])
+            # one dask chunk per zarr chunk
+            for name, var in result.variables.items():
+                if var.chunks is not None:
+                    chunks = template.variables[name].data.chunksize
+                    result[name] = var.chunk(dict(zip(var.dims, chunks)))
+            result.to_zarr(store, region={dim: batch})
+
+        first_result = select(batches[0])
+        template = _zarr_template(
+            first_result, dim, first.sizes[dim], batches[0].stop - batches[0].start
+        )
+        template.to_zarr(store, compute=False)
+
+        write(batches[0], first_result)
+        del first_result
+
+        if max_workers is not None and max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # consume the results to propagate errors
+                list(executor.map(write, batches[1:]))
+        else:
+            for batch in batches[1:]:
+                write(batch)
+
+    def _query_knn(self, X: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the distances and (flattened) indices of the k nearest index
+        points, as two arrays of shape (n_points, k).
+
+        """
+        self._check_not_grouped('k-nearest neighbors query')
+
+        if not supports_knn_query(self._index_type):
+            raise ValueError(
+                f'Index {self._index_type!r} does not support k-nearest neighbors queries'
+            )
+
+        if isinstance(self._index, XoakIndexWrapper):
+            return self._index.query_knn(X, k)
+
+        import dask
+
+        results = dask.compute(*[dask.delayed(idx.query_knn)(X, k) for idx in self._index])
+
+        return _merge_knn(results, k)
+
+    def interp_idw(
+        self,
+        indexers: Mapping[Hashable, Any] = None,
+        k: int = 4,
+        power: float = 2.0,
+        **indexers_kwargs: Any,
+    ) -> Union[xr.Dataset, xr.DataArray]:
+        """Inverse-distance-weighted (IDW) interpolation based on the index.
+
+        The k nearest neighbors of the target points are searched once in the
+        index and are used to build a sparse weight matrix (targets x index
+        points). Interpolation is then a sparse matrix product over the
+        flattened index dimensions, applied to every variable that has
+        those dimensions (variables with only some of the index dimensions are
+        dropped). It remains lazy and is applied chunk-wise along the other
+        dimensions (e.g., time) if the data is chunked.
+
+        The index must have been already built using `xoak.set_index()` with an
+        index adapter that supports k-nearest neighbors queries.
+
+        Parameters
+        ----------
+        indexers : dict, optional
+            A dict with keys matching index coordinates and values given as
+            xarray objects (target points). One of ``indexers`` or
+            ``indexers_kwargs`` must be provided.
+        k : int
+            Number of nearest neighbors used to interpolate each target point
+            (default: 4).
+        power : float
+            Power parameter of the inverse distance weights (default: 2).
+        **indexers_kwargs : optional
+            The keyword arguments form of ``indexers``.
+
+        Returns
+        -------
+        interpolated : :class:`xarray.Dataset` or :class:`xarray.DataArray`
+            A new object with the index dimensions replaced by the dimensions of
+            the indexers.
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.interp_idw')
+
+        accessor = self._for_query('knn', indexers)
+        if accessor is not self:
+            return accessor.interp_idw(indexers, k=k, power=power)
+
+        missing = set(self._index_coords) - set(indexers)
+        if missing:
+            raise ValueError(f'Missing indexers for index coordinate(s) {sorted(missing)}')
+
+        indexer_dims = [idx.dims for idx in indexers.values()]
+        indexer_shapes = [idx.shape for idx in indexers.values()]
+
+        if len(set(indexer_dims)) > 1:
+            raise ValueError('All indexers must have the same dimensions.')
+
+        X = coords_to_point_array([indexers[c] for c in self._index_coords])
+        if not isinstance(X, np.ndarray):
+            X = X.compute()
+
+        distances, indices = self._query_knn(X, k)
+        nsource = int(np.prod(self._index_coords_shape, dtype=int))
+        weights = idw_weights(distances, indices, nsource, power=power)
+
+        return apply_weights(
+            self._xarray_obj,
+            weights,
+            self._index_coords_dims,
+            indexer_dims[0],
+            indexer_shapes[0],
+            coords={c: indexers[c] for c in self._index_coords},
+        )
+
+    def _mesh_arrays(
+        self, face_node_connectivity: Any, node_coords: Iterable[Any]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (normalized) face-node connectivity and the node coordinates
+        given as names of variables or array-like objects.
+
+        """
+        if len(self._index_coords) != 2 or len(self._index_coords_dims) != 1:
+            raise ValueError(
+                'Cell lookup requires an index built on two 1-dimensional (face center) '
+                'coordinates'
+            )
+
+        if face_node_connectivity is None or node_coords is None:
+            raise ValueError('Cell lookup requires face_node_connectivity and node_coords')
+
+        if isinstance(face_node_connectivity, str):
+            face_node_connectivity = self._xarray_obj[face_node_connectivity]
+
+        start_index = 0
+        if isinstance(face_node_connectivity, xr.DataArray):
+            start_index = face_node_connectivity.attrs.get('start_index', 0)
+            face_dim = self._index_coords_dims[0]
+            if face_dim in face_node_connectivity.dims:
+                face_node_connectivity = face_node_connectivity.transpose(face_dim, ...)
+
+        face_nodes = face_node_array(face_node_connectivity, start_index=start_index)
+
+        if face_nodes.shape[0] != self._index_coords_shape[0]:
+            raise ValueError(
+                'The number of faces in the connectivity differs from the number of '
+                'indexed face centers'
+            )
+
+        node_coords = [self._xarray_obj[c] if isinstance(c, str) else c for c in node_coords]
+        if len(node_coords) != 2:
+            raise ValueError('node_coords must have two coordinates (same order than the index)')
+
+        node_points = np.stack([np.ravel(c) for c in node_coords], axis=1)
+
+        return face_nodes, node_points
+
+    def locate_cell(
+        self,
+        indexers: Mapping[Hashable, Any] = None,
+        face_node_connectivity: Any = None,
+        node_coords: Iterable[Any] = None,
+        k: int = 8,
+        **indexers_kwargs: Any,
+    ) -> xr.DataArray:
+        """Find the cells (faces) of an unstructured mesh that contain the given
+        points.
+
+        The index must have been already built using `xoak.set_index()` on the
+        coordinates of the face centers (e.g., UGRID ``face_x`` and ``face_y``),
+        with an index adapter that supports k-nearest neighbors queries. The k
+        faces with the nearest centers are the candidate faces of each point, which
+        are all tested at once with a vectorized (crossing number) point-in-polygon
+        test. This costs about the same than a nearest neighbor query.
+
+        Containment is tested in the plane of the coordinates (faces crossing the
+        antimeridian are not supported for geographic coordinates).
+
+        Parameters
+        ----------
+        indexers : dict, optional
+            A dict with keys matching index coordinates and values given as
+            xarray objects (query points). One of ``indexers`` or
+            ``indexers_kwargs`` must be provided.
+        face_node_connectivity : str or array-like
+            Name of the face-node connectivity variable or the variable itself, of
+            shape (n_faces, max_nodes_per_face). Missing nodes are given by fill
+            values (NaN or negative values) and the ``start_index`` attribute is
+            taken into account, following the UGRID conventions.
+        node_coords : sequence
+            The coordinates of the nodes, as names of variables or array-like
+            objects, in the same order than the index coordinates.
+        k : int
+            Number of candidate faces per point (default: 8). Larger values may be
+            needed for meshes with very elongated faces.
+        **indexers_kwargs : optional
+            The keyword arguments form of ``indexers``.
+
+        Returns
+        -------
+        faces : :class:`xarray.DataArray`
+            The position of the face that contains each point along the face
+            dimension, or -1 if the point is not found in any candidate face
+            (e.g., outside of the mesh). Lazy if the indexers are chunked.
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.locate_cell')
+
+        accessor = self._for_query('knn', indexers)
+        if accessor is not self:
+            return accessor.locate_cell(indexers, face_node_connectivity, node_coords, k=k)
+
+        missing = set(self._index_coords) - set(indexers)
+        if missing:
+            raise ValueError(f'Missing indexers for index coordinate(s) {sorted(missing)}')
+
+        indexer_dims = [idx.dims for idx in indexers.values()]
+        indexer_shapes = [idx.shape for idx in indexers.values()]
+
+        if len(set(indexer_dims)) > 1:
+            raise ValueError('All indexers must have the same dimensions.')
+
+        face_nodes, node_points = self._mesh_arrays(face_node_connectivity, node_coords)
+        k = min(k, face_nodes.shape[0])
+
+        def locate(points, *indexes):
+            if indexes:
+                _, candidates = _merge_knn([idx.query_knn(points, k) for idx in indexes], k)
+            else:
+                _, candidates = self._query_knn(points, k)
+            return locate_cells(points, candidates, face_nodes, node_points)
+
+        X = coords_to_point_array([indexers[c] for c in self._index_coords])
+
+        if isinstance(X, np.ndarray):
+            faces = locate(X)
+        elif isinstance(self._index, XoakIndexWrapper):
+            faces = X.map_blocks(locate, drop_axis=1, dtype=np.intp)
+        else:
+            import dask
+            import dask.array as da
+
+            # the (persisted) trees of the forest are dependencies of each task,
+            # they are not computed inside the tasks
+            faces = da.concatenate(
+                [
+                    da.from_delayed(
+                        dask.delayed(locate)(chunk, *self._index), (npoints,), dtype=np.intp
+                    )
+                    for chunk, npoints in zip(X.to_delayed().ravel(), X.chunks[0])
+                ]
+            )
+
+        return xr.DataArray(faces.reshape(indexer_shapes[0]), dims=indexer_dims[0])
+
+    def sel_cell(
+        self,
+        indexers: Mapping[Hashable, Any] = None,
+        face_node_connectivity: Any = None,
+        node_coords: Iterable[Any] = None,
+        k: int = 8,
+        **indexers_kwargs: Any,
+    ) -> Union[xr.Dataset, xr.DataArray]:
+        """Selection of the cells (faces) of an unstructured mesh that contain the
+        given points.
+
+        See :meth:`~xarray.Dataset.xoak.locate_cell` for a description of the
+        parameters. The values of the data variables are NaN for points that are
+        not found in any face.
+
+        This triggers :func:`dask.compute` if the given indexers are chunked.
+
+        """
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.sel_cell')
+
+        accessor = self._for_query('knn', indexers)
+        if accessor is not self:
+            return accessor.sel_cell(indexers, face_node_connectivity, node_coords, k=k)
+
+        faces = self.locate_cell(
+            indexers, face_node_connectivity=face_node_connectivity, node_coords=node_coords, k=k
+        ).compute()
+
+        found = faces >= 0
+        result = self._xarray_obj.isel({self._index_coords_dims[0]: faces.where(found, 0)})
+
+        if not found.all():
+            result = result.where(found)
+
+        return result
+
+    def bin_reduce(
+        self, source: Union[xr.Dataset, xr.DataArray], func: str = 'mean'
+    ) -> Union[xr.Dataset, xr.DataArray]:
+        """Aggregate the values of source points onto the index points (e.g., grid
+        cells), i.e., nearest-neighbor binning.
+
+        Each source point is assigned to its nearest index point (one query of the
+        index), then the values of each data variable are reduced per index point
+        with a vectorized scatter-reduction. If the source is chunked, this is done
+        lazily for each chunk and partial results are combined with a tree
+        reduction (the assignment of all source points is never loaded in memory).
+
+        The index must have been already built using `xoak.set_index()`.
+
+        Parameters
+        ----------
+        source : :class:`xarray.Dataset` or :class:`xarray.DataArray`
+            The source points, which must have the index coordinates (same names).
+            All data variables with the same dimensions than these coordinates are
+            aggregated (other variables are ignored).
+        func : {'count', 'sum', 'mean', 'min', 'max'}
+            Reduction function (default: 'mean'). NaN values are ignored.
+
+        Returns
+        -------
+        binned : :class:`xarray.Dataset` or :class:`xarray.DataArray`
+            The aggregated values, with the dimensions and coordinates of the index
+            coordinates. Index points without any source point have NaN values
+            (or zero for 'count' and 'sum').
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        accessor = self._for_query('nearest', source.coords)
+        if accessor is not self:
+            return accessor.bin_reduce(source, func=func)
+
+        missing = set(self._index_coords) - set(source.coords)
+        if missing:
+            raise ValueError(f'Missing index coordinate(s) {sorted(missing)} in source')
+
+        point_dims = source[self._index_coords[0]].dims
+        indices = self._query_points(coords_to_point_array([source[c] for c in self._index_coords]))
+
+        ncells = int(np.prod(self._index_coords_shape, dtype=int))
+        coords = {c: self._xarray_obj.coords[c] for c in self._index_coords}
+
+        def reduce_variable(var):
+            data = var.transpose(*point_dims).data
+            values = np.ravel(data) if isinstance(data, np.ndarray) else data.ravel()
+            binned = bin_reduce_array(indices, values, ncells, func=func)
+            return xr.DataArray(
+                binned.reshape(self._index_coords_shape),
+                dims=self._index_coords_dims,
+                coords=coords,
+                name=var.name,
+                attrs=var.attrs,
+            )
+
+        if isinstance(source, xr.DataArray):
+            return reduce_variable(source)
+
+        data_vars = {
+            name: reduce_variable(var)
+            for name, var in source.data_vars.items()
+            if set(var.dims) == set(point_dims)
+        }
+
+        return xr.Dataset(data_vars, coords=coords, attrs=source.attrs)
+
+    def _get_batcher(
+        self, batch_window: float = 0.005, max_batch_size: Optional[int] = None
+    ) -> QueryBatcher:
+        loop = asyncio.get_running_loop()
+        batchers = self._get_index_entry().batchers.setdefault(loop, {})
+        key = (batch_window, max_batch_size)
+
+        if key not in batchers:
+            # bound to the index only: the index entry must not reference the
+            # indexed object (and its coordinate data)
+            accessor = XoakAccessor(xr.Dataset())
+            accessor._index_entry = self._get_index_entry()
+
+            def query_func(X):
+                indices = accessor._query_points(X)
+                if not isinstance(indices, np.ndarray):
+                    indices = accessor._compute_indices(indices)
+                return indices
+
+            batchers[key] = QueryBatcher(
+                query_func, window=batch_window, max_batch_size=max_batch_size
+            )
+
+        return batchers[key]
+
+    async def asel(
+        self,
+        indexers: Mapping[Hashable, Any] = None,
+        batch_window: float = 0.005,
+        max_batch_size: Optional[int] = None,
+        **indexers_kwargs: Any,
+    ) -> Union[xr.Dataset, xr.DataArray]:
+        """Asynchronous selection based on the index (coroutine).
+
+        Same as :meth:`~xarray.Dataset.xoak.sel`, but for use in asyncio
+        applications (e.g., a web service handling many concurrent requests).
+
+        Point-wise queries issued concurrently are gathered during a short time window
+        and are run as one batched query in the event loop's default executor,
+        so that the event loop is not blocked and the overhead of querying the index
+        is shared by all requests. The results are then split back for each request.
+
+        Parameters
+        ----------
+        indexers : dict, optional
+            Same as for :meth:`~xarray.Dataset.xoak.sel`.
+        batch_window : float
+            Duration in seconds of the time window during which the queries are
+            gathered (default: 5 ms).
+        max_batch_size : int, optional
+            Run the batched query immediately when the number of gathered points
+            reaches this value.
+        **indexers_kwargs : optional
+            The keyword arguments form of ``indexers``.
+
+        """
+        if self._index is None:
+            raise ValueError(
+                'The index(es) has/have not been built yet. Call `.xoak.set_index()` first'
+            )
+
+        indexers = either_dict_or_kwargs(indexers, indexers_kwargs, 'xoak.asel')
+        loop = asyncio.get_running_loop()
+
+        if not any(isinstance(idx, slice) for idx in indexers.values()):
+            accessor = self._for_query('nearest', indexers)
+            if accessor is not self:
+                return await accessor.asel(
+                    indexers, batch_window=batch_window, max_batch_size=max_batch_size
+                )
+
+        if self._index_groupby_dim is not None or any(
+            isinstance(idx, slice) for idx in indexers.values()
+        ):
+            # no batching for range selection and for indexes grouped by slice
+            return await loop.run_in_executor(None, self.sel, indexers)
+
+        X = coords_to_point_array([indexers[c] for c in self._index_coords])
+        if not isinstance(X, np.ndarray):
+            X = await loop.run_in_executor(None, X.compute)
+
+        batcher = self._get_batcher(batch_window, max_batch_size)
+
+        indices = await batcher.query(X)
+        pos_indexers = self._get_pos_indexers(indices, indexers)
+
+        return self._xarray_obj.isel(indexers=pos_indexers)
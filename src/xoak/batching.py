@@ -0,0 +1,96 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class QueryBatcher:
+    """Gathers concurrent (small) queries issued from an asyncio event loop
+    during a short time window and runs them as one batched query in an
+    executor, without blocking the event loop.
+
+    Parameters
+    ----------
+    query_func : callable
+        Function that queries an array of points of shape (n_points, n_coordinates)
+        and returns an array of results of shape (n_points,). It must be
+        thread-safe if used with a thread pool executor.
+    window : float
+        Duration (in seconds) of the time window during which queries are
+        gathered, starting from the first query of a batch.
+    max_batch_size : int, optional
+        If the number of gathered points reaches this value, the batch is run
+        immediately.
+    executor : :class:`concurrent.futures.Executor`, optional
+        Executor used to run the batched queries (default: the event loop's
+        default executor).
+
+    """
+
+    def __init__(
+        self,
+        query_func: Callable[[np.ndarray], np.ndarray],
+        window: float = 0.005,
+        max_batch_size: Optional[int] = None,
+        executor: Optional[Executor] = None,
+    ):
+        self.query_func = query_func
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.executor = executor
+
+        self.n_batches = 0
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._pending_size = 0
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    async def query(self, points: np.ndarray) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self._pending.append((points, future))
+        self._pending_size += points.shape[0]
+
+        if self.max_batch_size is not None and self._pending_size >= self.max_batch_size:
+            self._flush(loop)
+        elif self._handle is None:
+            self._handle = loop.call_later(self.window, self._flush, loop)
+
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        pending = self._pending
+        self._pending = []
+        self._pending_size = 0
+
+        if not pending:
+            return
+
+        self.n_batches += 1
+
+        points = np.concatenate([p for p, _ in pending])
+        split_indices = np.cumsum([p.shape[0] for p, _ in pending])[:-1]
+        task = loop.run_in_executor(self.executor, self.query_func, points)
+
+        def set_results(task):
+            exc = task.exception()
+
+            if exc is None:
+                results = np.split(task.result(), split_indices)
+            else:
+                results = [None] * len(pending)
+
+            for (_, future), res in zip(pending, results):
+                if future.cancelled():
+                    continue
+                if exc is None:
+                    future.set_result(res)
+                else:
+                    future.set_exception(exc)
+
+        task.add_done_callback(set_results)
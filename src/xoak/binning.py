@@ -0,0 +1,118 @@
+"""Aggregation of point values onto the cells (points) of an index."""
+from typing import Any, Tuple
+
+import numpy as np
+
+BIN_FUNCS = ('count', 'sum', 'mean', 'min', 'max')
+
+
+def _bin_partial(indices: np.ndarray, values: np.ndarray, ncells: int, func: str) -> np.ndarray:
+    """Scatter-reduce values into cells (partial result for one chunk).
+
+    Returns an array of shape (n_stats, ncells), where the statistics depend
+    on the reduction function (e.g., sum and count for the mean). Negative
+    indices and NaN values are ignored.
+
+    """
+    indices = np.ravel(indices)
+    values = np.ravel(values).astype(np.double)
+
+    valid = (indices >= 0) & ~np.isnan(values)
+    indices = indices[valid]
+    values = values[valid]
+
+    if func == 'count':
+        return np.bincount(indices, minlength=ncells)[None, :].astype(np.double)
+    elif func == 'sum':
+        return np.bincount(indices, weights=values, minlength=ncells)[None, :]
+    elif func == 'mean':
+        return np.stack(
+            [
+                np.bincount(indices, weights=values, minlength=ncells),
+                np.bincount(indices, minlength=ncells).astype(np.double),
+            ]
+        )
+    elif func == 'min':
+        out = np.full(ncells, np.inf)
+        np.minimum.at(out, indices, values)
+        return out[None, :]
+    else:
+        out = np.full(ncells, -np.inf)
+        np.maximum.at(out, indices, values)
+        return out[None, :]
+
+
+def _combine(partials: Any, func: str) -> Any:
+    """Combine the partial results of all chunks (stacked along the 1st axis)."""
+    if func == 'min':
+        return partials.min(axis=0)
+    elif func == 'max':
+        return partials.max(axis=0)
+    else:
+        return partials.sum(axis=0)
+
+
+def _divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return a / b
+
+
+def _finalize(stats: Any, func: str) -> Any:
+    if func == 'count':
+        return stats[0].astype(np.int64)
+    elif func == 'mean':
+        if isinstance(stats, np.ndarray):
+            return _divide(stats[0], stats[1])
+        return stats[0].map_blocks(_divide, stats[1], dtype=np.double)
+    elif func in ('min', 'max'):
+        # empty cells
+        return np.where(np.isinf(stats[0]), np.nan, stats[0])
+    return stats[0]
+
+
+def _nstats(func: str) -> int:
+    return 2 if func == 'mean' else 1
+
+
+def bin_reduce_array(indices: Any, values: Any, ncells: int, func: str = 'mean') -> Any:
+    """Reduce values by cell, given the (flat) index of the cell of each value.
+
+    Parameters
+    ----------
+    indices : ndarray or dask array of shape (n_values,)
+        Flat index of the cell of each value (negative indices are ignored).
+    values : ndarray or dask array of shape (n_values,)
+        Values to aggregate (NaN values are ignored).
+    ncells : int
+        Total number of cells.
+    func : {'count', 'sum', 'mean', 'min', 'max'}
+        Reduction function.
+
+    Returns
+    -------
+    reduced : ndarray or dask array of shape (ncells,)
+        The reduced values (NaN for empty cells, except for 'count' and 'sum').
+        If the inputs are chunked, each chunk is scatter-reduced independently
+        and the partial results are combined with a tree reduction, so that the
+        whole assignment table is never loaded in memory.
+
+    """
+    if func not in BIN_FUNCS:
+        raise ValueError(f'Invalid reduction function {func!r}, must be one of {BIN_FUNCS}')
+
+    if isinstance(indices, np.ndarray) and isinstance(values, np.ndarray):
+        return _finalize(_bin_partial(indices, values, ncells, func), func)
+
+    import dask
+    import dask.array as da
+
+    indices = da.asarray(indices)
+    values = da.asarray(values).rechunk(indices.chunks)
+
+    shape: Tuple[int, int] = (_nstats(func), ncells)
+    partials = [
+        da.from_delayed(dask.delayed(_bin_partial)(i, v, ncells, func), shape, dtype=np.double)
+        for i, v in zip(indices.to_delayed().ravel(), values.to_delayed().ravel())
+    ]
+
+    return _finalize(_combine(da.stack(partials), func), func)
@@ -1,18 +1,22 @@
-import importlib
+import importlib.util
 
 from .base import IndexAdapter, IndexRegistry  # noqa: F401
 
+# xoak's built-in index adapters (name, class, required package), which are
+# registered without being imported (they are imported on first use)
 adapters = [
-    'scipy_adapters',
-    'sklearn_adapters',
-    's2_adapters',
+    ('scipy_kdtree', 'scipy_adapters:ScipyKDTreeAdapter', 'scipy'),
+    ('sklearn_kdtree', 'sklearn_adapters:SklearnKDTreeAdapter', 'sklearn'),
+    ('sklearn_balltree', 'sklearn_adapters:SklearnBallTreeAdapter', 'sklearn'),
+    ('sklearn_geo_balltree', 'sklearn_adapters:SklearnGeoBallTreeAdapter', 'sklearn'),
+    ('s2point', 's2_adapters:S2PointIndexAdapter', 'pys2index'),
+    ('brute_force', 'numpy_adapters:BruteForceAdapter', 'numpy'),
+    ('morton', 'numpy_adapters:MortonIndexAdapter', 'numpy'),
+    ('numba_brute_force', 'numba_adapters:NumbaBruteForceAdapter', 'numba'),
 ]
 
-for mod in adapters:
-    try:
-        # importing the module registers the adapters
-        importlib.import_module('.' + mod, package='xoak.index')
-    except ImportError:  # pragma: no cover
-        pass
+for name, target, requires in adapters:
+    if importlib.util.find_spec(requires) is not None:
+        IndexRegistry._default_indexes.setdefault(name, f'xoak.index.{target}')
 
 del adapters
@@ -1,10 +1,16 @@
 import abc
+import importlib
+import pickle
+import time
 import warnings
+import zlib
 from contextlib import suppress
-from typing import Any, Dict, List, Mapping, Tuple, Type, TypeVar, Union
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Type, TypeVar, Union
 
 import numpy as np
 
+from .spherical import spherical_covering
+
 Index = TypeVar('Index')
 
 
@@ -18,8 +24,20 @@ class IndexAdapter(abc.ABC):
     If any options are necessary, they should be implemented as arguments to the
     ``__init__()`` method.
 
+    Subclasses may set the ``euclidean`` attribute to True if the index uses the
+    euclidean distance (given the index options), so that small indexes may be
+    replaced by a brute-force search (see :class:`~xoak.index.base.XoakIndexWrapper`).
+
+    Subclasses may set the ``geographic`` attribute to True if the index
+    points are latitude, longitude values (degrees, in this order) and the
+    index uses the great-circle distance, so that the trees of a forest that
+    can't contain the nearest neighbors of the query points are skipped.
+
     """
 
+    euclidean: bool = False
+    geographic: bool = False
+
     def __init__(self, **kwargs):
         pass
 
@@ -64,18 +82,120 @@ class IndexAdapter(abc.ABC):
         """
         raise NotImplementedError()
 
+    def query_box(self, index: Index, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """Query all points/samples located inside a (hyper-)rectangle.
+
+        This method is optional. It is used for orthogonal range selection
+        (i.e., selection with slices). If it is not implemented, xoak will
+        compare the coordinate labels against the box boundaries.
+
+        Parameters
+        ----------
+        index: object
+            The index object returned by ``build()``.
+        lower: ndarray of shape (n_coordinates)
+            Lower boundaries (inclusive) of the box.
+        upper: ndarray of shape (n_coordinates)
+            Upper boundaries (inclusive) of the box.
+
+        Returns
+        -------
+        indices : ndarray of shape (n_found)
+            Indices of the points found inside the box in the array of the
+            indexed points.
+
+        """
+        raise NotImplementedError()
+
+    def query_knn(self, index: Index, points: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Query the k nearest neighbors of points/samples.
+
+        This method is optional. It is used for interpolation (e.g.,
+        :meth:`xarray.Dataset.xoak.interp_idw`). ``k`` is never greater than the
+        number of indexed points.
+
+        Parameters
+        ----------
+        index: object
+            The index object returned by ``build()``.
+        points: ndarray of shape (n_points, n_coordinates)
+            Two-dimensional array of points/samples (rows) and their
+            corresponding coordinate labels (columns) to query.
+        k : int
+            Number of nearest neighbors to return.
+
+        Returns
+        -------
+        distances : ndarray of shape (n_points, k)
+            Distances to the k nearest neighbors, sorted in ascending order.
+        indices : ndarray of shape (n_points, k)
+            Indices of the k nearest neighbors in the array of the indexed
+            points.
+
+        """
+        raise NotImplementedError()
+
 
 class IndexRegistrationWarning(Warning):
     """Warning for conflicts in index registration."""
 
 
+# entry point group for index adapters provided by third-party packages
+ENTRY_POINT_GROUP = 'xoak.indexes'
+
+
+def import_from_string(name: str) -> Any:
+    """Import an object given as a 'module:qualified_name' string."""
+    mod_name, qualname = name.split(':')
+    obj = importlib.import_module(mod_name)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _iter_entry_points(group: str) -> List[Any]:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # pragma: no cover
+        try:
+            from importlib_metadata import entry_points
+        except ImportError:
+            return []
+
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=group))
+    return list(eps.get(group, []))  # pragma: no cover
+
+
+def _load_adapter(target: Any) -> Type[IndexAdapter]:
+    """Returns an index adapter class from a class, a 'module:class' string
+    or an entry point (the two latter are imported).
+
+    """
+    if isinstance(target, type):
+        cls = target
+    elif isinstance(target, str):
+        cls = import_from_string(target)
+    else:
+        cls = target.load()
+
+    if not isinstance(cls, type) or not issubclass(cls, IndexAdapter):
+        raise TypeError(f"'{target}' is not a subclass of IndexAdapter")
+
+    return cls
+
+
 class IndexRegistry(Mapping[str, Type[IndexAdapter]]):
     """A registry of all indexes adapters that can be used to select data
     with xoak.
 
     """
 
-    _default_indexes: Dict[str, Type[IndexAdapter]] = {}
+    # values may be index adapter classes or references to classes not imported
+    # yet ('module:class' strings or entry points), which are imported on first use
+    _default_indexes: Dict[str, Any] = {}
+    _plugins_discovered: bool = False
 
     def __init__(self, use_default=True):
         """Creates a new index registry.
@@ -87,14 +207,45 @@ class IndexRegistry(Mapping[str, Type[IndexAdapter]]):
         ----------
         use_default : bool, optional
             If True (default), pre-populates the registry with xoak's built-in
-            index adapters.
+            index adapters and with the index adapters provided by other packages
+            via the ``xoak.indexes`` entry point group.
+
+        Notes
+        -----
+        Index adapters are imported only when they are accessed for the first time.
 
         """
         self._indexes = {}
 
         if use_default:
+            self._discover_plugins()
             self._indexes.update(self._default_indexes)
 
+    @classmethod
+    def _discover_plugins(cls):
+        if cls._plugins_discovered:
+            return
+
+        cls._plugins_discovered = True
+
+        for ep in _iter_entry_points(ENTRY_POINT_GROUP):
+            if ep.name in cls._default_indexes:
+                warnings.warn(
+                    f"ignoring index '{ep.name}' provided by an entry point "
+                    "(conflicts with an already registered index).",
+                    IndexRegistrationWarning,
+                    stacklevel=2,
+                )
+            else:
+                cls._default_indexes[ep.name] = ep
+
+    @classmethod
+    def _get_default(cls, name: str) -> Type[IndexAdapter]:
+        cls._discover_plugins()
+        adapter = _load_adapter(cls._default_indexes[name])
+        cls._default_indexes[name] = adapter
+        return adapter
+
     def register(self, name: str):
         """Register custom index in xoak.
 
@@ -129,7 +280,7 @@ class IndexRegistry(Mapping[str, Type[IndexAdapter]]):
             # this avoids an infinite loop when pickle looks for the
             # __setstate__ attribute before the xarray object is initialized
             with suppress(KeyError):
-                return self._indexes[name]
+                return self[name]
         raise AttributeError(f'IndexRegistry object has no attribute {name!r}')
 
     def __setattr__(self, name, value):
@@ -149,7 +300,19 @@ class IndexRegistry(Mapping[str, Type[IndexAdapter]]):
         return list(self._indexes)
 
     def __getitem__(self, key):
-        return self._indexes[key]
+        adapter = self._indexes[key]
+
+        if not isinstance(adapter, type):
+            adapter = _load_adapter(adapter)
+            self._indexes[key] = adapter
+            if key in self._default_indexes:
+                self._default_indexes[key] = adapter
+
+        return adapter
+
+    def __contains__(self, key):
+        # don't import the adapter
+        return key in self._indexes
 
     def __iter__(self):
         return iter(self._indexes)
@@ -193,7 +356,7 @@ def register_default(name: str):
 def normalize_index(name_or_cls: Union[str, Any]) -> Type[IndexAdapter]:
 
     if isinstance(name_or_cls, str):
-        cls = IndexRegistry._default_indexes[name_or_cls]
+        cls = IndexRegistry._get_default(name_or_cls)
     else:
         cls = name_or_cls
 
@@ -203,10 +366,83 @@ def normalize_index(name_or_cls: Union[str, Any]) -> Type[IndexAdapter]:
     return cls
 
 
+def supports_box_query(name_or_cls: Union[str, Any]) -> bool:
+    """Returns True if the index adapter implements ``query_box()``."""
+    cls = normalize_index(name_or_cls)
+    return cls.query_box is not IndexAdapter.query_box
+
+
+def supports_knn_query(name_or_cls: Union[str, Any]) -> bool:
+    """Returns True if the index adapter implements ``query_knn()``."""
+    cls = normalize_index(name_or_cls)
+    return cls.query_knn is not IndexAdapter.query_knn
+
+
+def _box_overlaps(bounds: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> bool:
+    return not (np.any(bounds[1] < lower) or np.any(bounds[0] > upper))
+
+
+PICKLE_POLICIES = ('tree', 'compressed', 'points', 'auto')
+
+# default maximum number of points of the forest trees replaced by a brute-force
+# search (measured crossover with scipy's cKDTree, for small to medium queries)
+BRUTE_FORCE_THRESHOLD = 32
+
+
+def _pickled_nbytes(obj: Any) -> int:
+    """Returns the size of a pickled object (cheap: large buffers are not copied,
+    except with Python < 3.8, i.e., without pickle protocol 5).
+
+    """
+    if pickle.HIGHEST_PROTOCOL < 5:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+    sizes = []
+    header = pickle.dumps(
+        obj, protocol=5, buffer_callback=lambda buf: sizes.append(buf.raw().nbytes)
+    )
+    return len(header) + sum(sizes)
+
+
+class _CompressedIndex:
+    """Holds a pickled and compressed index object."""
+
+    def __init__(self, index: Any):
+        self.data = zlib.compress(pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    def load(self) -> Any:
+        return pickle.loads(zlib.decompress(self.data))
+
+
 class XoakIndexWrapper:
     """Thin wrapper used internally to build and query (registered)
     indexes, with dask support.
 
+    The ``pickle_policy`` argument controls how the wrapper is serialized (e.g.,
+    when it is sent to dask distributed workers):
+
+    - 'tree' (default): the whole index object is pickled
+    - 'compressed': the index object is pickled and compressed (zlib)
+    - 'points': only the indexed points and adapter options are pickled,
+      the index is lazily rebuilt after unpickling
+    - 'auto': 'points' if rebuilding the index is expected to be faster than
+      transferring the index object (larger than the points), at the rate given by
+      ``transfer_rate`` (bytes/s), otherwise 'tree'
+
+    If a boolean ``mask`` is given, only the points where it is True are
+    indexed. Query results are mapped back to the positions of the points in
+    the whole array (the mapping is stored as a compact integer array).
+
+    If the number of indexed points is lower or equal than
+    ``brute_force_threshold`` and the index uses the euclidean distance, the
+    index is replaced by a brute-force search ('brute_force' adapter), which is
+    faster than building and querying a tree for a few points. This is used for
+    the trees of a forest (see ``BRUTE_FORCE_THRESHOLD``).
+
+    For geographic indexes, a covering of the indexed points (union of spherical
+    caps) may also be computed (see :func:`~xoak.index.spherical.spherical_covering`),
+    which is used to skip the trees of a forest.
+
     """
 
     _query_result_dtype: List[Tuple[str, Any]] = [
@@ -214,28 +450,200 @@ class XoakIndexWrapper:
         ('indices', np.intp),
     ]
 
+    # transfer rate (bytes/s) used to choose a pickling policy ('auto')
+    transfer_rate: float = 100e6
+
     def __init__(
         self,
         index_adapter: Union[str, Type[IndexAdapter]],
         points: np.ndarray,
         offset: int,
+        pickle_policy: str = 'tree',
+        mask: Optional[np.ndarray] = None,
+        brute_force_threshold: int = 0,
+        covering: bool = False,
         **kwargs,
     ):
+        if pickle_policy not in PICKLE_POLICIES:
+            raise ValueError(
+                f'Invalid pickle_policy {pickle_policy!r}, must be one of {PICKLE_POLICIES}'
+            )
+
         index_adapter_cls = normalize_index(index_adapter)
 
         self._index_adapter = index_adapter_cls(**kwargs)
-        self._index = self._index_adapter.build(points)
         self._offset = offset
+        self._npoints = points.shape[0]
+
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool).ravel()
+
+        if mask is None or mask.all():
+            self._positions = None
+        else:
+            # compact mapping from the indexed (valid) points to their
+            # original positions in the array of points
+            dtype = np.int32 if self._npoints <= np.iinfo(np.int32).max else np.intp
+            self._positions = np.flatnonzero(mask).astype(dtype)
+            points = points[mask]
+
+        self._nindexed = points.shape[0]
+
+        if self._nindexed <= brute_force_threshold and self._index_adapter.euclidean:
+            brute_force_cls = normalize_index('brute_force')
+            if not isinstance(self._index_adapter, brute_force_cls):
+                self._index_adapter = brute_force_cls()
+
+        if self._nindexed:
+            # points with NaN coordinates may be indexed (bounds are NaN if all values
+            # of a coordinate are NaN)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                self._bounds = np.stack([np.nanmin(points, axis=0), np.nanmax(points, axis=0)])
+        else:
+            # empty bounding box
+            self._bounds = np.stack(
+                [np.full(points.shape[1], np.inf), np.full(points.shape[1], -np.inf)]
+            )
+
+        if covering and self._index_adapter.geographic:
+            self._covering = spherical_covering(points)
+        else:
+            self._covering = None
+
+        self._pickle_policy = pickle_policy
+
+        # keep a reference to the points only if they may be pickled
+        # (most indexes also keep them, so this is usually not a copy)
+        self._points = points if pickle_policy in ('points', 'auto') else None
+
+        self._build(points)
+
+    def _build(self, points: np.ndarray):
+        t0 = time.perf_counter()
+        self._index = self._index_adapter.build(points) if self._nindexed else None
+        self._build_time = time.perf_counter() - t0
 
     @property
     def index(self):
+        if self._index is None and self._nindexed:
+            # lazily rebuild the index (unpickled with the 'points' policy)
+            self._build(self._points)
+        elif isinstance(self._index, _CompressedIndex):
+            self._index = self._index.load()
         return self._index
 
-    def query(self, points: np.ndarray) -> np.ndarray:
-        distances, positions = self._index_adapter.query(self._index, points)
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        policy = self._pickle_policy
+
+        if policy in ('points', 'auto') and self._points is None:
+            # points unknown (e.g., wrapper unpickled with another policy)
+            policy = 'tree'
+        elif policy == 'auto':
+            tree_nbytes = _pickled_nbytes(self.index)
+            transfer_time = (tree_nbytes - self._points.nbytes) / self.transfer_rate
+            policy = 'points' if self._build_time < transfer_time else 'tree'
+
+        if policy == 'points':
+            state['_index'] = None
+        else:
+            state['_points'] = None
+            if policy == 'compressed' and not isinstance(self._index, _CompressedIndex):
+                state['_index'] = _CompressedIndex(self.index)
+
+        return state
+
+    def __sizeof__(self) -> int:
+        # rough estimate (indexes hold at least a copy of the indexed points), used by
+        # the dask scheduler to prefer moving the query points rather than the index
+        nbytes = self._nindexed * self._bounds.shape[1] * np.dtype(np.double).itemsize
+        if self._positions is not None:
+            nbytes += self._positions.nbytes
+        return object.__sizeof__(self) + nbytes
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """Bounding box of the indexed points, as an array of shape (2, n_coordinates)."""
+        return self._bounds
 
+    @property
+    def covering(self) -> Optional[np.ndarray]:
+        """Spherical caps covering the indexed points (geographic indexes only,
+        otherwise None), as an array of shape (n_caps, 4).
+
+        """
+        return self._covering
+
+    def _to_indices(self, positions: np.ndarray) -> np.ndarray:
+        """Convert positions in the indexed points to (global) indices."""
+        positions = np.asarray(positions, dtype=np.intp)
+        if self._positions is not None:
+            positions = self._positions[positions]
+        return positions.astype(np.intp) + self._offset
+
+    def query(self, points: np.ndarray) -> np.ndarray:
         result = np.empty(shape=points.shape[0], dtype=self._query_result_dtype)
+
+        if not self._nindexed:
+            result['distances'] = np.inf
+            result['indices'] = -1
+            return result[:, None]
+
+        distances, positions = self._index_adapter.query(self.index, points)
+
         result['distances'] = distances.ravel().astype(np.double)
-        result['indices'] = positions.ravel().astype(np.intp) + self._offset
+        result['indices'] = self._to_indices(positions.ravel())
 
         return result[:, None]
+
+    def query_box(
+        self, lower: np.ndarray, upper: np.ndarray, points: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Returns the (sorted) indices of the indexed points located inside a box.
+
+        If the index adapter doesn't support box queries, the indexed ``points``
+        must be given.
+
+        """
+        if not _box_overlaps(self._bounds, lower, upper):
+            return np.empty(0, dtype=np.intp)
+
+        # clip unbounded / large boxes to the bounding box of the indexed points
+        # (not for NaN bounds)
+        lower = np.fmax(lower, self._bounds[0])
+        upper = np.fmin(upper, self._bounds[1])
+
+        try:
+            positions = self._index_adapter.query_box(self.index, lower, upper)
+        except NotImplementedError:
+            if points is None:
+                raise
+            if self._positions is not None:
+                points = points[self._positions]
+            positions = np.flatnonzero(np.all((points >= lower) & (points <= upper), axis=1))
+
+        return np.sort(self._to_indices(positions))
+
+    def query_knn(self, points: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the distances and indices of the k nearest neighbors, as two
+        arrays of shape (n_points, k).
+
+        If ``k`` is greater than the number of indexed points, missing neighbors
+        have infinite distance and index -1.
+
+        """
+        npoints = points.shape[0]
+        res_distances = np.full((npoints, k), np.inf)
+        res_indices = np.full((npoints, k), -1, dtype=np.intp)
+
+        kq = min(k, self._nindexed)
+        if not kq:
+            return res_distances, res_indices
+
+        distances, positions = self._index_adapter.query_knn(self.index, points, kq)
+
+        res_distances[:, :kq] = np.reshape(distances, (npoints, kq))
+        res_indices[:, :kq] = self._to_indices(np.reshape(positions, (npoints, kq)))
+
+        return res_distances, res_indices
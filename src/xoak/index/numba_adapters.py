@@ -0,0 +1,169 @@
+import math
+from typing import Any, Callable, Dict
+
+import numba
+import numpy as np
+
+from .base import IndexAdapter, register_default
+
+# Numba's default threading layer priority
+_DEFAULT_THREADING_LAYER_PRIORITY = ['tbb', 'omp', 'workqueue']
+
+
+def _prefer_omp_threading_layer():
+    # the query functions are called from other threads (e.g., dask workers), which
+    # may hang the interpreter at exit with the TBB threading layer. Numba's
+    # threading layer is process-wide: only change its priority if it has not been
+    # configured and if no parallel function has been run yet.
+    from numba.np.ufunc import parallel
+
+    if (
+        numba.config.THREADING_LAYER == 'default'
+        and list(numba.config.THREADING_LAYER_PRIORITY) == _DEFAULT_THREADING_LAYER_PRIORITY
+        and not getattr(parallel, '_is_initialized', True)
+    ):
+        numba.config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+
+@numba.njit(inline='always')
+def euclidean(a, b):
+    d = 0.0
+    for k in range(a.shape[0]):
+        diff = a[k] - b[k]
+        d += diff * diff
+    return math.sqrt(d)
+
+
+@numba.njit(inline='always')
+def haversine(a, b):
+    # latitude, longitude in degrees, returns the great-circle distance in radians
+    lat1 = math.radians(a[0])
+    lat2 = math.radians(b[0])
+    dlat = lat2 - lat1
+    dlon = math.radians(b[1] - a[1])
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * math.asin(min(1.0, math.sqrt(h)))
+
+
+def scaled_euclidean(scales):
+    """Returns an (anisotropic) euclidean metric with a scale factor for each
+    coordinate, e.g., for lat/lon/depth or space/time coordinates.
+
+    """
+    scales = np.asarray(scales, dtype=np.double)
+
+    @numba.njit(inline='always')
+    def metric(a, b):
+        d = 0.0
+        for k in range(a.shape[0]):
+            diff = (a[k] - b[k]) * scales[k]
+            d += diff * diff
+        return math.sqrt(d)
+
+    return metric
+
+
+METRICS = {'euclidean': euclidean, 'haversine': haversine}
+
+# compiled query functions (one per metric)
+_query_funcs: Dict[Any, Callable] = {}
+
+
+def _get_query_func(metric):
+    if metric in _query_funcs:
+        return _query_funcs[metric]
+
+    _prefer_omp_threading_layer()
+
+    @numba.njit(parallel=True)
+    def query(points, query_points, block_size):
+        nquery = query_points.shape[0]
+        npoints = points.shape[0]
+        nblocks = (nquery + block_size - 1) // block_size
+
+        distances = np.full(nquery, np.inf)
+        indices = np.zeros(nquery, dtype=np.intp)
+
+        # one block of query points per task, loop over blocks of index points
+        # (keeps both blocks in cache)
+        for qb in numba.prange(nblocks):
+            qstart = qb * block_size
+            qstop = min(qstart + block_size, nquery)
+
+            for pstart in range(0, npoints, block_size):
+                pstop = min(pstart + block_size, npoints)
+
+                for i in range(qstart, qstop):
+                    best = distances[i]
+                    ibest = indices[i]
+                    for j in range(pstart, pstop):
+                        d = metric(query_points[i], points[j])
+                        if d < best:
+                            best = d
+                            ibest = j
+                    distances[i] = best
+                    indices[i] = ibest
+
+        return distances, indices
+
+    _query_funcs[metric] = query
+    return query
+
+
+@register_default('numba_brute_force')
+class NumbaBruteForceAdapter(IndexAdapter):
+    """Xoak index adapter for nearest neighbor lookup with any distance
+    metric compiled with Numba.
+
+    The search is a brute-force search (exact), compiled and run in parallel
+    over blocks of query points, each compared block by block with the indexed
+    points. It is well suited for custom metrics, for which it is much faster than
+    tree-based indexes calling a Python function. Build is instantaneous.
+
+    Parameters
+    ----------
+    metric : str or callable
+        Either 'euclidean' (default), 'haversine' (latitude, longitude in
+        degrees) or a function compiled with :func:`numba.njit` that takes two
+        1-dimensional arrays (two points) and returns their distance. See also
+        :func:`~xoak.index.numba_adapters.scaled_euclidean`.
+    block_size : int
+        Number of points per block (default: 256).
+
+    Notes
+    -----
+    Unless Numba's threading layer (or its priority) has already been configured,
+    the first query sets Numba's threading layer priority to OpenMP first, for the
+    whole process (including other code using Numba), as queries run from other
+    threads than the main thread (e.g., dask workers) may hang the interpreter at
+    exit with the TBB threading layer. To keep another threading layer, set the
+    ``NUMBA_THREADING_LAYER`` environment variable or
+    ``numba.config.THREADING_LAYER`` before the first query.
+
+    """
+
+    def __init__(self, metric='euclidean', block_size=256):
+        if isinstance(metric, str):
+            if metric not in METRICS:
+                raise ValueError(f'Unknown metric {metric!r}, must be one of {list(METRICS)}')
+            metric = METRICS[metric]
+
+        self.metric = metric
+        self.block_size = block_size
+
+    @property
+    def euclidean(self):
+        return self.metric is euclidean
+
+    @property
+    def geographic(self):
+        return self.metric is haversine
+
+    def build(self, points):
+        return np.ascontiguousarray(points, dtype=np.double)
+
+    def query(self, points, query_points):
+        query_func = _get_query_func(self.metric)
+        return query_func(
+            points, np.ascontiguousarray(query_points, dtype=np.double), self.block_size
+        )
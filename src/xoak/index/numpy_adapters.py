@@ -0,0 +1,344 @@
+import numpy as np
+
+from .base import IndexAdapter, register_default
+
+
+class BruteForceIndex:
+    """Exact nearest neighbor search that compares the query points with all
+    indexed points (euclidean distance), using vectorized NumPy operations.
+
+    Distances are computed by blocks of query points and indexed points, which
+    fit in the CPU cache (``block_nbytes``). Only the running minimum (or the k
+    running smallest distances) is kept for each query point, i.e., the full
+    distance matrix is never created.
+
+    """
+
+    def __init__(self, points, block_nbytes=256 * 1024):
+        self.points = np.asarray(points, dtype=np.double)
+        self.block_nbytes = block_nbytes
+
+    def _blocks(self, npoints):
+        # (n_query, n_indexed) sizes of the distance blocks
+        nindexed = self.points.shape[0]
+        size = max(self.block_nbytes // 8, 1)
+        isize = min(nindexed, max(int(np.sqrt(size)), 1))
+        qsize = max(size // isize, 1)
+
+        for qstart in range(0, npoints, qsize):
+            qslice = slice(qstart, min(qstart + qsize, npoints))
+            yield qslice, [slice(i, min(i + isize, nindexed)) for i in range(0, nindexed, isize)]
+
+    def _dist2(self, points, islice):
+        ipoints = self.points[islice]
+        dist2 = np.zeros((points.shape[0], ipoints.shape[0]))
+        for k in range(points.shape[1]):
+            diff = points[:, k, None] - ipoints[None, :, k]
+            dist2 += diff * diff
+        return dist2
+
+    def query(self, points):
+        points = np.asarray(points, dtype=np.double)
+        npoints = points.shape[0]
+
+        distances = np.full(npoints, np.inf)
+        indices = np.zeros(npoints, dtype=np.intp)
+
+        for qslice, islices in self._blocks(npoints):
+            qpoints = points[qslice]
+            best = distances[qslice]
+            ibest = indices[qslice]
+            rows = np.arange(qpoints.shape[0])
+
+            for islice in islices:
+                dist2 = self._dist2(qpoints, islice)
+                icol = dist2.argmin(axis=1)
+                dmin = dist2[rows, icol]
+                closer = dmin < best
+                best[closer] = dmin[closer]
+                ibest[closer] = icol[closer] + islice.start
+
+        return np.sqrt(distances), indices
+
+    def query_knn(self, points, k):
+        points = np.asarray(points, dtype=np.double)
+        npoints = points.shape[0]
+
+        distances = np.empty((npoints, k))
+        indices = np.empty((npoints, k), dtype=np.intp)
+
+        for qslice, islices in self._blocks(npoints):
+            qpoints = points[qslice]
+            best = np.full((qpoints.shape[0], k), np.inf)
+            ibest = np.full((qpoints.shape[0], k), -1, dtype=np.intp)
+
+            for islice in islices:
+                dist2 = self._dist2(qpoints, islice)
+                iblock = np.broadcast_to(np.arange(islice.start, islice.stop), dist2.shape)
+
+                cdist2 = np.concatenate([best, dist2], axis=1)
+                cindices = np.concatenate([ibest, iblock], axis=1)
+                keep = np.argpartition(cdist2, k - 1, axis=1)[:, :k]
+                best = np.take_along_axis(cdist2, keep, axis=1)
+                ibest = np.take_along_axis(cindices, keep, axis=1)
+
+            order = np.argsort(best, axis=1)
+            distances[qslice] = np.sqrt(np.take_along_axis(best, order, axis=1))
+            indices[qslice] = np.take_along_axis(ibest, order, axis=1)
+
+        return distances, indices
+
+    def query_box(self, lower, upper):
+        return np.flatnonzero(np.all((self.points >= lower) & (self.points <= upper), axis=1))
+
+
+@register_default('brute_force')
+class BruteForceAdapter(IndexAdapter):
+    """Xoak index adapter for exact nearest neighbor lookup using a brute-force
+    search (euclidean distance).
+
+    There is no index structure to build: the points are compared block by block
+    using vectorized NumPy operations. This is faster than building and querying
+    a tree for small sets of points (e.g., small trees of a forest, which are
+    automatically replaced by this adapter, see
+    :class:`~xoak.index.base.XoakIndexWrapper`) and for small queries.
+
+    Parameters
+    ----------
+    block_nbytes : int
+        Size in bytes of the blocks of distances computed at once (default:
+        256 kiB, i.e., small enough to fit in the CPU cache).
+
+    """
+
+    euclidean = True
+
+    def __init__(self, block_nbytes=256 * 1024):
+        self.block_nbytes = block_nbytes
+
+    def build(self, points):
+        return BruteForceIndex(points, block_nbytes=self.block_nbytes)
+
+    def query(self, index, points):
+        return index.query(points)
+
+    def query_knn(self, index, points, k):
+        return index.query_knn(points, k)
+
+    def query_box(self, index, lower, upper):
+        return index.query_box(lower, upper)
+
+
+class MortonIndex:
+    """A compact index of points sorted along a Z-order (Morton) space-filling curve.
+
+    Point coordinates are quantized to integers (within the bounding box of the
+    points) and interleaved bit by bit into 64-bit Morton keys. Besides a reference
+    to the points (not copied), the index only stores the sorted keys and the
+    permutation that sorts the points.
+
+    A nearest neighbor query first looks for the best candidate among the
+    ``window`` points on both sides of the query point along the curve
+    (``searchsorted``). This candidate defines a search box around the query
+    point, which is then refined: all points inside this box are located in a
+    range of the sorted keys (a property of the Z-order curve), which is
+    narrowed by recursively splitting the box in two at the most significant bit
+    that differs between the keys of its corners (at most ``max_splits`` times).
+    All points in the resulting ranges are checked if there are no more than
+    ``max_candidates`` of them. The search is exact for those queries and
+    approximate otherwise.
+
+    """
+
+    def __init__(self, points, window=8, max_candidates=256, max_splits=None):
+        self.points = np.asarray(points, dtype=np.double)
+        self.window = window
+        self.max_candidates = max_candidates
+
+        npoints, ncoords = self.points.shape
+        if ncoords > 32:
+            raise ValueError('MortonIndex supports up to 32 coordinates')
+
+        # (no more bits than the precision of double floats)
+        self.nbits = min(64 // ncoords, 52)
+        self.max_splits = 2 * ncoords if max_splits is None else max_splits
+        self.lower = self.points.min(axis=0)
+        extent = self.points.max(axis=0) - self.lower
+        self.scale = np.where(
+            extent > 0, (2.0**self.nbits - 1) / np.where(extent > 0, extent, 1), 0
+        )
+
+        keys = self._keys(self.points)
+        perm_dtype = np.int32 if npoints <= np.iinfo(np.int32).max else np.intp
+        self.perm = np.argsort(keys, kind='stable').astype(perm_dtype)
+        self.keys = keys[self.perm]
+
+    def _quantize(self, points):
+        q = np.floor((points - self.lower) * self.scale)
+        return np.clip(q, 0, 2.0**self.nbits - 1).astype(np.uint64)
+
+    def _interleave(self, q):
+        ncoords = q.shape[1]
+        keys = np.zeros(q.shape[0], dtype=np.uint64)
+
+        for bit in range(self.nbits):
+            for dim in range(ncoords):
+                b = (q[:, dim] >> np.uint64(bit)) & np.uint64(1)
+                keys |= b << np.uint64(bit * ncoords + dim)
+
+        return keys
+
+    def _keys(self, points):
+        return self._interleave(self._quantize(points))
+
+    def _box_ranges(self, lower, upper):
+        """Returns ranges of sorted keys (start, stop) that contain all the
+        indexed points located inside boxes, as well as the box of each range.
+
+        Boxes are recursively split in two at the most significant bit that
+        differs between the keys of their corners, so that the ranges are tight.
+
+        """
+        qlo = self._quantize(lower)
+        qhi = self._quantize(upper)
+        boxes = np.arange(qlo.shape[0])
+        ncoords = qlo.shape[1]
+
+        for level in range(self.max_splits + 1):
+            klo = self._interleave(qlo)
+            khi = self._interleave(qhi)
+            start = np.searchsorted(self.keys, klo, side='left')
+            stop = np.searchsorted(self.keys, khi, side='right')
+
+            split = (stop - start > self.window) & (klo != khi)
+            if level == self.max_splits or not np.any(split):
+                break
+
+            # most significant differing bit (float log2 may round up)
+            x = klo[split] ^ khi[split]
+            msb = np.floor(np.log2(x.astype(np.double))).astype(np.uint64)
+            msb -= (x >> msb) == 0
+            dim = (msb % np.uint64(ncoords)).astype(np.intp)
+            bitpos = msb // np.uint64(ncoords)
+
+            slo = qlo[split]
+            shi = qhi[split]
+            irow = np.arange(slo.shape[0])
+            mid = (shi[irow, dim] >> bitpos) << bitpos
+
+            lo_half_hi = shi.copy()
+            lo_half_hi[irow, dim] = mid - np.uint64(1)
+            hi_half_lo = slo.copy()
+            hi_half_lo[irow, dim] = mid
+
+            keep = ~split
+            qlo = np.concatenate([qlo[keep], slo, hi_half_lo])
+            qhi = np.concatenate([qhi[keep], lo_half_hi, shi])
+            boxes = np.concatenate([boxes[keep], boxes[split], boxes[split]])
+
+        return boxes, start, stop
+
+    def _gather(self, boxes, start, stop):
+        """Returns the (box, candidate point) pairs for ragged ranges of sorted keys."""
+        sizes = stop - start
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        return np.repeat(boxes, sizes), self.perm[np.repeat(start, sizes) + offsets].astype(np.intp)
+
+    def _nearest(self, points, rows, candidates, distances, indices):
+        diff = self.points[candidates] - points[rows]
+        dist = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+        # lexicographic sort by row then by distance; keep the first of each row
+        order = np.lexsort((dist, rows))
+        rows = rows[order]
+        first = np.ones(rows.size, dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+
+        distances[rows[first]] = dist[order][first]
+        indices[rows[first]] = candidates[order][first]
+
+    def query(self, points, batch_size=4096):
+        points = np.asarray(points, dtype=np.double)
+        npoints = points.shape[0]
+        nkeys = self.keys.size
+
+        distances = np.empty(npoints, dtype=np.double)
+        indices = np.empty(npoints, dtype=np.intp)
+
+        for start in range(0, npoints, batch_size):
+            batch = points[start : start + batch_size]
+            nbatch = batch.shape[0]
+            bdist = np.empty(nbatch, dtype=np.double)
+            bidx = np.empty(nbatch, dtype=np.intp)
+
+            # 1. candidates on both sides along the curve
+            pos = np.searchsorted(self.keys, self._keys(batch))
+            hi = np.clip(pos + self.window, 0, nkeys)
+            lo = np.clip(np.minimum(pos - self.window, hi - 2 * self.window), 0, nkeys)
+            self._nearest(batch, *self._gather(np.arange(nbatch), lo, hi), bdist, bidx)
+
+            # 2. refinement: all points in the box enclosing the current best distance
+            radius = bdist[:, None] * (1 + 1e-12)
+            boxes, lo, hi = self._box_ranges(batch - radius, batch + radius)
+            ncandidates = np.bincount(boxes, weights=hi - lo, minlength=nbatch)
+            refine = (ncandidates <= self.max_candidates)[boxes]
+
+            if np.any(refine):
+                rows, candidates = self._gather(boxes[refine], lo[refine], hi[refine])
+                rdist = np.full(nbatch, np.inf)
+                rind = np.empty(nbatch, dtype=np.intp)
+                self._nearest(batch, rows, candidates, rdist, rind)
+                better = rdist < bdist
+                bdist[better] = rdist[better]
+                bidx[better] = rind[better]
+
+            distances[start : start + batch_size] = bdist
+            indices[start : start + batch_size] = bidx
+
+        return distances, indices
+
+    def query_box(self, lower, upper):
+        _, candidates = self._gather(*self._box_ranges(lower[None, :], upper[None, :]))
+
+        cpoints = self.points[candidates]
+        inside = np.all((cpoints >= lower) & (cpoints <= upper), axis=1)
+
+        return candidates[inside]
+
+
+@register_default('morton')
+class MortonIndexAdapter(IndexAdapter):
+    """Xoak index adapter for nearest neighbor lookup using points sorted along
+    a Z-order (Morton) space-filling curve (euclidean distance).
+
+    This index has a small memory footprint (64-bit keys and a permutation of the
+    points), is fast to build (sorting) and is trivially serialized. Queries
+    are exact in most cases, but might be approximate in sparse regions or near
+    large discontinuities of the curve.
+
+    Parameters
+    ----------
+    window : int
+        Number of neighbors along the curve (on each side) examined to find the
+        initial candidate (default: 8).
+    max_candidates : int
+        Maximum number of points examined during refinement (default: 256).
+        Higher values yield exact results more often, at the expense of slower
+        queries.
+
+    """
+
+    euclidean = True
+
+    def __init__(self, window=8, max_candidates=256):
+        self.window = window
+        self.max_candidates = max_candidates
+
+    def build(self, points):
+        return MortonIndex(points, window=self.window, max_candidates=self.max_candidates)
+
+    def query(self, index, points):
+        return index.query(points)
+
+    def query_box(self, index, lower, upper):
+        return index.query_box(lower, upper)
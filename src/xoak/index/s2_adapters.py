@@ -19,6 +19,8 @@ class S2PointIndexAdapter(IndexAdapter):
 
     """
 
+    geographic = True
+
     def build(self, points):
         self._points_nbytes = points.nbytes
         return S2PointIndex(points)
@@ -1,3 +1,4 @@
+import numpy as np
 from scipy.spatial import cKDTree
 
 from .base import IndexAdapter, register_default
@@ -10,8 +11,28 @@ class ScipyKDTreeAdapter(IndexAdapter):
     def __init__(self, **kwargs):
         self.index_options = kwargs
 
+    @property
+    def euclidean(self):
+        # periodic (toroidal) distance with boxsize
+        return self.index_options.get('boxsize') is None
+
     def build(self, points):
         return cKDTree(points, **self.index_options)
 
     def query(self, kdtree, points):
         return kdtree.query(points)
+
+    def query_knn(self, kdtree, points, k):
+        return kdtree.query(points, k=k)
+
+    def query_box(self, kdtree, lower, upper):
+        # search candidates in the smallest cube enclosing the box
+        center = (lower + upper) / 2
+        # (slightly enlarged to account for round-off errors)
+        radius = np.max(upper - lower) / 2 * (1 + 1e-12) + 1e-12 * np.max(np.abs(center))
+        candidates = np.asarray(kdtree.query_ball_point(center, radius, p=np.inf), dtype=np.intp)
+
+        cpoints = kdtree.data[candidates]
+        inside = np.all((cpoints >= lower) & (cpoints <= upper), axis=1)
+
+        return candidates[inside]
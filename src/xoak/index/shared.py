@@ -0,0 +1,159 @@
+"""Sharing indexes across processes without copying them.
+
+The index wrapper is pickled (protocol 5) with all its array buffers (indexed
+points and tree arrays) stored out-of-band in a memory-mapped file, by default
+located in shared memory (``/dev/shm``, if available). The resulting
+:class:`SharedXoakIndexWrapper` is a lightweight handle: pickling it only sends
+the small pickle header and the location of the buffers, and unpickling it in
+another process maps those buffers without copying them.
+
+"""
+import os
+import pickle
+import tempfile
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .base import XoakIndexWrapper
+
+# align buffers on cache lines
+_ALIGNMENT = 64
+
+
+def _shared_memory_dir() -> str:
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()  # pragma: no cover
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:  # pragma: no cover
+        pass
+
+
+class SharedXoakIndexWrapper(XoakIndexWrapper):
+    """Index wrapper whose (array) data lives in a memory-mapped file.
+
+    Don't create it directly, use :func:`share_index`.
+
+    """
+
+    def __init__(self, wrapper: XoakIndexWrapper, path: str, owner: bool = False):
+        # always share the index object (not the points only)
+        tree_wrapper = object.__new__(XoakIndexWrapper)
+        tree_wrapper.__dict__.update(wrapper.__dict__)
+        tree_wrapper._index = wrapper.index
+        tree_wrapper._points = None
+        tree_wrapper._pickle_policy = 'tree'
+
+        buffers: List[pickle.PickleBuffer] = []
+        header = pickle.dumps(tree_wrapper, protocol=5, buffer_callback=buffers.append)
+        raw_buffers = [buf.raw() for buf in buffers]
+
+        layout: List[Tuple[int, int]] = []
+        size = 0
+        for raw in raw_buffers:
+            layout.append((size, raw.nbytes))
+            size += -(-raw.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        segment = np.memmap(path, dtype=np.uint8, mode='w+', shape=(max(size, 1),))
+        for raw, (start, nbytes) in zip(raw_buffers, layout):
+            segment[start : start + nbytes] = np.frombuffer(raw, dtype=np.uint8)
+        segment.flush()
+        del segment
+
+        if owner:
+            # the file is deleted when this wrapper is garbage collected
+            # (processes that have already mapped it are not affected)
+            weakref.finalize(self, _remove_file, path)
+
+        self._state = {'header': header, 'layout': layout, 'path': path}
+        self._attach()
+
+    def _attach(self):
+        state = self._state
+
+        # copy-on-write: pages are shared until they are modified
+        segment = np.memmap(state['path'], dtype=np.uint8, mode='c')
+        buffers = [segment[start : start + nbytes] for start, nbytes in state['layout']]
+        wrapper = pickle.loads(state['header'], buffers=buffers)
+
+        self.__dict__.update(wrapper.__dict__)
+
+    @property
+    def path(self) -> str:
+        """Path of the memory-mapped file."""
+        return self._state['path']
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return self._state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self._state = state
+        self._attach()
+
+
+def check_shareable():
+    """Raise an error if indexes can't be shared (pickle protocol 5 is required)."""
+    if pickle.HIGHEST_PROTOCOL < 5:
+        raise RuntimeError('Sharing indexes requires Python >= 3.8 (pickle protocol 5)')
+
+
+def share_index(wrapper: XoakIndexWrapper, path: Optional[str] = None) -> SharedXoakIndexWrapper:
+    """Move the data of an index wrapper in a memory-mapped file that can be shared
+    by many processes.
+
+    Parameters
+    ----------
+    wrapper : :class:`~xoak.index.base.XoakIndexWrapper`
+        The index wrapper to share.
+    path : str, optional
+        If None (default), the data is stored in shared memory (``/dev/shm`` or a
+        temporary directory if not available) and the file is deleted when the
+        returned wrapper is garbage collected in the process that has created it.
+        If a path to a directory is given, the data is stored in a new file in this
+        directory, which is not deleted.
+
+    Returns
+    -------
+    shared : :class:`SharedXoakIndexWrapper`
+        A wrapper that can be cheaply sent to other processes on the same
+        machine and that doesn't copy the index data when it is unpickled.
+
+    Notes
+    -----
+    Requires Python >= 3.8 (pickle protocol 5).
+
+    """
+    if isinstance(wrapper, SharedXoakIndexWrapper):
+        return wrapper
+
+    check_shareable()
+
+    owner = path is None
+    fd, fpath = tempfile.mkstemp(
+        suffix='.bin', prefix='xoak_index_', dir=_shared_memory_dir() if owner else path
+    )
+    os.close(fd)
+
+    return SharedXoakIndexWrapper(wrapper, fpath, owner=owner)
+
+
+def unshare_index(wrapper: XoakIndexWrapper) -> XoakIndexWrapper:
+    """Returns a plain index wrapper holding the data of a shared index wrapper,
+    e.g., to save it to disk (the memory-mapped file of a shared index may be
+    deleted before the saved index is loaded).
+
+    Other wrappers are returned unchanged.
+
+    """
+    if not isinstance(wrapper, SharedXoakIndexWrapper):
+        return wrapper
+
+    plain = object.__new__(XoakIndexWrapper)
+    plain.__dict__.update({k: v for k, v in wrapper.__dict__.items() if k != '_state'})
+    return plain
@@ -3,6 +3,46 @@ from sklearn.neighbors import BallTree, KDTree
 
 from .base import IndexAdapter, register_default
 
+# metric name -> minkowski p parameter
+_MINKOWSKI_METRICS = {
+    'euclidean': 2,
+    'l2': 2,
+    'manhattan': 1,
+    'cityblock': 1,
+    'l1': 1,
+    'chebyshev': np.inf,
+    'infinity': np.inf,
+}
+
+
+def _minkowski_p(index_options):
+    metric = index_options.get('metric', 'minkowski')
+
+    if metric == 'minkowski':
+        return index_options.get('p', 2)
+    else:
+        return _MINKOWSKI_METRICS.get(metric)
+
+
+def _query_box(tree, lower, upper, p=None):
+    data = np.asarray(tree.data)
+
+    if p is None:
+        # unknown metric: brute-force search
+        candidates = np.arange(data.shape[0])
+    else:
+        # search candidates in the smallest ball enclosing the box
+        # (slightly enlarged to account for round-off errors)
+        center = (lower + upper) / 2
+        radius = np.linalg.norm((upper - lower) / 2, ord=p)
+        radius = radius * (1 + 1e-12) + 1e-12 * np.max(np.abs(center))
+        candidates = tree.query_radius(center[None, :], radius)[0]
+
+    cpoints = data[candidates]
+    inside = np.all((cpoints >= lower) & (cpoints <= upper), axis=1)
+
+    return candidates[inside]
+
 
 @register_default('sklearn_kdtree')
 class SklearnKDTreeAdapter(IndexAdapter):
@@ -11,12 +51,22 @@ class SklearnKDTreeAdapter(IndexAdapter):
     def __init__(self, **kwargs):
         self._index_options = kwargs
 
+    @property
+    def euclidean(self):
+        return _minkowski_p(self._index_options) == 2
+
     def build(self, points):
         return KDTree(points, **self._index_options)
 
     def query(self, kdtree, points):
         return kdtree.query(points)
 
+    def query_knn(self, kdtree, points, k):
+        return kdtree.query(points, k=k)
+
+    def query_box(self, kdtree, lower, upper):
+        return _query_box(kdtree, lower, upper, p=_minkowski_p(self._index_options))
+
 
 @register_default('sklearn_balltree')
 class SklearnBallTreeAdapter(IndexAdapter):
@@ -25,12 +75,22 @@ class SklearnBallTreeAdapter(IndexAdapter):
     def __init__(self, **kwargs):
         self._index_options = kwargs
 
+    @property
+    def euclidean(self):
+        return _minkowski_p(self._index_options) == 2
+
     def build(self, points):
         return BallTree(points, **self._index_options)
 
     def query(self, btree, points):
         return btree.query(points)
 
+    def query_knn(self, btree, points, k):
+        return btree.query(points, k=k)
+
+    def query_box(self, btree, lower, upper):
+        return _query_box(btree, lower, upper, p=_minkowski_p(self._index_options))
+
 
 @register_default('sklearn_geo_balltree')
 class SklearnGeoBallTreeAdapter(IndexAdapter):
@@ -47,6 +107,8 @@ class SklearnGeoBallTreeAdapter(IndexAdapter):
 
     """
 
+    geographic = True
+
     def __init__(self, **kwargs):
         kwargs.update({'metric': 'haversine'})
         self._index_options = kwargs
@@ -56,3 +118,9 @@ class SklearnGeoBallTreeAdapter(IndexAdapter):
 
     def query(self, btree, points):
         return btree.query(np.deg2rad(points))
+
+    def query_knn(self, btree, points, k):
+        return btree.query(np.deg2rad(points), k=k)
+
+    def query_box(self, btree, lower, upper):
+        return _query_box(btree, np.deg2rad(lower), np.deg2rad(upper))
@@ -0,0 +1,147 @@
+"""Spherical coverings used to skip the trees of a geographic forest that
+can't contain the nearest neighbors of query points.
+
+The points of each tree are covered by a small union of spherical caps, each
+centered on one of the points. Unlike bounding boxes in latitude / longitude,
+those coverings are compact for sets of points crossing the antimeridian or
+close to the poles. They give both a lower bound (distance to the caps) and an
+upper bound (distance to the cap centers) of the great-circle distance from any
+query point to its nearest neighbor in the tree.
+
+"""
+from typing import List
+
+import numpy as np
+
+# tolerance (radians) for round-off errors in angles
+_ANGLE_TOLERANCE = 1e-6
+
+
+def latlon_to_xyz(points: np.ndarray) -> np.ndarray:
+    """Convert latitude, longitude (degrees) to unit vectors, as an array of
+    shape (n_points, 3).
+
+    """
+    points = np.asarray(points, dtype=np.double)
+    lat = np.deg2rad(points[:, 0])
+    lon = np.deg2rad(points[:, 1])
+    coslat = np.cos(lat)
+
+    return np.stack([coslat * np.cos(lon), coslat * np.sin(lon), np.sin(lat)], axis=1)
+
+
+def _angles(xyz: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    return np.arccos(np.clip(xyz @ centers.T, -1.0, 1.0))
+
+
+def spherical_covering(points: np.ndarray, n_caps: int = 16) -> np.ndarray:
+    """Returns a union of spherical caps that covers all points given as
+    latitude, longitude (degrees).
+
+    The cap centers are chosen among the points by farthest point sampling and
+    each point is assigned to the cap of its closest center.
+
+    Parameters
+    ----------
+    points : ndarray of shape (n_points, 2)
+        Latitude, longitude of the points (points with NaN values are ignored).
+    n_caps : int
+        Maximum number of caps (default: 16).
+
+    Returns
+    -------
+    caps : ndarray of shape (n_caps, 4)
+        Unit vector of the center and angular radius (radians) of each cap
+        (no cap if there is no valid point).
+
+    """
+    xyz = latlon_to_xyz(points)
+    xyz = xyz[np.isfinite(xyz).all(axis=1)]
+
+    if not xyz.shape[0]:
+        return np.empty((0, 4))
+
+    # farthest point sampling
+    icenters = [0]
+    min_angles = _angles(xyz, xyz[:1])[:, 0]
+    assignment = np.zeros(xyz.shape[0], dtype=np.intp)
+
+    for k in range(1, min(n_caps, xyz.shape[0])):
+        ifar = np.argmax(min_angles)
+        if min_angles[ifar] == 0:
+            break
+        angles = _angles(xyz, xyz[ifar : ifar + 1])[:, 0]
+        closer = angles < min_angles
+        min_angles[closer] = angles[closer]
+        assignment[closer] = k
+        icenters.append(ifar)
+
+    radius = np.zeros(len(icenters))
+    np.maximum.at(radius, assignment, min_angles)
+
+    return np.column_stack([xyz[icenters], radius])
+
+
+def select_coverings(
+    query_caps: np.ndarray, coverings: List[np.ndarray], block_size: int = 2**20
+) -> np.ndarray:
+    """Select the coverings (e.g., trees of a forest) that may contain the
+    nearest neighbor of any point located inside the query caps.
+
+    The nearest neighbor of a query point can't be located in a covering whose
+    minimum distance to this point is greater than the distance to the closest
+    cap center (i.e., an indexed point) of another covering.
+
+    Parameters
+    ----------
+    query_caps : ndarray of shape (n_query, 4)
+        Caps of the query points, e.g., of radius zero for single points (see
+        :func:`point_caps`) or covering a chunk of query points (see
+        :func:`spherical_covering`).
+    coverings : list
+        Spherical coverings of the index points, as returned by
+        :func:`spherical_covering`. Empty coverings are never selected.
+    block_size : int
+        Maximum size of the arrays of (query caps, caps) angles.
+
+    Returns
+    -------
+    selected : ndarray of shape (n_coverings,)
+        Boolean mask of the selected coverings. All coverings are selected if
+        there is no valid query point or if all coverings are empty.
+
+    """
+    query_caps = np.asarray(query_caps, dtype=np.double)
+    query_caps = query_caps[np.isfinite(query_caps).all(axis=1)]
+
+    sizes = np.array([len(cov) for cov in coverings])
+    nonempty = sizes > 0
+
+    if not query_caps.shape[0] or not nonempty.any():
+        return np.ones(len(coverings), dtype=bool)
+
+    caps = np.concatenate([cov for cov in coverings if len(cov)])
+    starts = np.concatenate([[0], np.cumsum(sizes[nonempty])[:-1]])
+
+    vselected = np.zeros(starts.size, dtype=bool)
+    nrows = max(block_size // caps.shape[0], 1)
+
+    for start in range(0, query_caps.shape[0], nrows):
+        qcaps = query_caps[start : start + nrows]
+        angles = _angles(qcaps[:, :3], caps[:, :3])
+
+        lower = np.minimum.reduceat(angles - caps[:, 3], starts, axis=1) - qcaps[:, 3:]
+        upper = np.minimum.reduceat(angles, starts, axis=1) + qcaps[:, 3:]
+
+        vselected |= np.any(lower <= upper.min(axis=1, keepdims=True) + _ANGLE_TOLERANCE, axis=0)
+
+    selected = np.zeros(len(coverings), dtype=bool)
+    selected[nonempty] = vselected
+
+    return selected
+
+
+def point_caps(points: np.ndarray) -> np.ndarray:
+    """Returns caps of radius zero for each point (latitude, longitude)."""
+    xyz = latlon_to_xyz(points)
+    return np.column_stack([xyz, np.zeros(xyz.shape[0])])
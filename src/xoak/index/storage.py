@@ -0,0 +1,97 @@
+"""Saving / loading indexes to / from disk.
+
+An index is saved in a directory, with one file per tree (pickled
+:class:`~xoak.index.base.XoakIndexWrapper` object) and a JSON file for the
+metadata (index type, coordinates, dimensions, shape, trees offsets, bounding boxes
+and spherical coverings).
+
+"""
+import json
+import os
+import pickle
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .base import IndexAdapter, XoakIndexWrapper, import_from_string
+from .shared import unshare_index
+
+METADATA_FILE = 'xoak_index.json'
+FORMAT_VERSION = 1
+
+
+def tree_filename(i: int) -> str:
+    return f'tree_{i:06d}.pkl'
+
+
+def index_type_to_str(index_type: Any) -> str:
+    if isinstance(index_type, str):
+        return index_type
+    return f'{index_type.__module__}:{index_type.__qualname__}'
+
+
+def index_type_from_str(name: str) -> Any:
+    if ':' not in name:
+        return name
+
+    cls = import_from_string(name)
+
+    if not issubclass(cls, IndexAdapter):
+        raise TypeError(f"'{name}' is not a subclass of IndexAdapter")
+
+    return cls
+
+
+def dump_tree(wrapper: XoakIndexWrapper, path: str) -> Dict[str, Any]:
+    """Pickle an index wrapper to a file and returns its metadata.
+
+    Shared index wrappers are saved with their data (not as handles).
+
+    """
+    with open(path, 'wb') as f:
+        pickle.dump(unshare_index(wrapper), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return {
+        'file': os.path.basename(path),
+        'offset': int(wrapper._offset),
+        'npoints': int(wrapper._npoints),
+        'bounds': wrapper.bounds.tolist(),
+        'covering': None if wrapper.covering is None else wrapper.covering.tolist(),
+    }
+
+
+def load_tree(path: str) -> XoakIndexWrapper:
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def build_and_dump_tree(
+    index_type: Any, points: np.ndarray, offset: int, path: str, **kwargs
+) -> Dict[str, Any]:
+    """Build an index wrapper, write it to disk and only return its metadata
+    (the index is released from memory when this function returns).
+
+    """
+    wrapper = XoakIndexWrapper(index_type, points, offset, **kwargs)
+    return dump_tree(wrapper, path)
+
+
+def write_metadata(path: str, metadata: Dict[str, Any], trees: List[Dict[str, Any]]):
+    metadata = dict(metadata, format_version=FORMAT_VERSION, trees=trees)
+
+    with open(os.path.join(path, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, METADATA_FILE)) as f:
+        metadata = json.load(f)
+
+    if metadata.get('format_version') != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported index format version {metadata.get('format_version')!r} in {path!r}"
+        )
+
+    metadata['index_type'] = index_type_from_str(metadata['index_type'])
+
+    return metadata
@@ -0,0 +1,208 @@
+import pickle
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .base import IndexRegistry, XoakIndexWrapper
+
+# Candidate index adapters (and options) for automatic selection, per metric.
+# Only exact nearest-neighbor indexes are considered here.
+AUTO_CANDIDATES: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {
+    'euclidean': [
+        ('scipy_kdtree', {'leafsize': 8}),
+        ('scipy_kdtree', {'leafsize': 16}),
+        ('scipy_kdtree', {'leafsize': 32}),
+        ('sklearn_kdtree', {'leaf_size': 20}),
+        ('sklearn_kdtree', {'leaf_size': 40}),
+        ('sklearn_balltree', {'leaf_size': 20}),
+        ('sklearn_balltree', {'leaf_size': 40}),
+    ],
+    'haversine': [
+        ('sklearn_geo_balltree', {'leaf_size': 20}),
+        ('sklearn_geo_balltree', {'leaf_size': 40}),
+        ('s2point', {}),
+    ],
+}
+
+
+def _estimate_nbytes(wrapper: XoakIndexWrapper, points: np.ndarray) -> int:
+    try:
+        return len(pickle.dumps(wrapper.index, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        # index not serializable: rely on the adapter's (crude) estimate, if any
+        return max(sys.getsizeof(wrapper._index_adapter), 2 * points.nbytes)
+
+
+def select_index(
+    points: np.ndarray,
+    metric: str = 'euclidean',
+    candidates: Optional[Sequence[Tuple[str, Dict[str, Any]]]] = None,
+    sample_size: int = 50_000,
+    n_queries: int = 10_000,
+    query_volume: Optional[int] = None,
+    memory_budget: Optional[float] = None,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Select the fastest index adapter (and options) for a given set of points,
+    based on a micro-benchmark run on a subsample of the points.
+
+    For each candidate, an index is built from the subsample and a
+    representative batch of query points (subsample points with small random
+    perturbations) is queried. Build and query times as well as index memory
+    footprint are then extrapolated to the full set of points. The candidate
+    with the lowest total time (build + query volume) that fits in the memory
+    budget is selected.
+
+    Parameters
+    ----------
+    points : ndarray of shape (n_points, n_coordinates)
+        The points to index.
+    metric : {'euclidean', 'haversine'}
+        Distance metric. Defines the default candidates (see ``AUTO_CANDIDATES``).
+    candidates : list, optional
+        Candidates as a list of (registered adapter name, options) tuples.
+    sample_size : int
+        Maximum number of points used to build each candidate index.
+    n_queries : int
+        Number of points in the query batch used for timing.
+    query_volume : int, optional
+        Expected number of points that will be queried in total (default: the
+        number of indexed points).
+    memory_budget : float, optional
+        Maximum (estimated) memory footprint of the index, in bytes.
+    seed : int
+        Random seed used to draw the subsample and query points.
+
+    Returns
+    -------
+    selection : dict
+        The name (``index_type``) and options (``kwargs``) of the selected index
+        adapter, as well as the timings and memory estimates of all candidates
+        (``timings``).
+
+    """
+    if candidates is None:
+        if metric not in AUTO_CANDIDATES:
+            raise ValueError(f'Unknown metric {metric!r}, must be one of {list(AUTO_CANDIDATES)}')
+        registry = IndexRegistry()
+        candidates = [(name, opts) for name, opts in AUTO_CANDIDATES[metric] if name in registry]
+
+    if not len(candidates):
+        raise ValueError(f'No index adapter available for automatic selection ({metric!r})')
+
+    npoints = points.shape[0]
+    if query_volume is None:
+        query_volume = npoints
+
+    rng = np.random.default_rng(seed)
+
+    if npoints > sample_size:
+        sample = points[np.sort(rng.choice(npoints, sample_size, replace=False))]
+    else:
+        sample = points
+
+    qidx = rng.choice(sample.shape[0], min(n_queries, sample.shape[0]), replace=False)
+    noise = rng.normal(scale=1e-3, size=(qidx.size, points.shape[1]))
+    query_points = sample[qidx] + noise * np.std(sample, axis=0)
+
+    # extrapolation factors (n log n build, log n query)
+    nsample = sample.shape[0]
+    log_ratio = np.log2(max(npoints, 2)) / np.log2(max(nsample, 2))
+    build_factor = npoints / nsample * log_ratio
+    size_factor = npoints / nsample
+
+    timings = []
+
+    for name, opts in candidates:
+        t0 = time.perf_counter()
+        wrapper = XoakIndexWrapper(name, sample, 0, **opts)
+        t1 = time.perf_counter()
+        wrapper.query(query_points)
+        t2 = time.perf_counter()
+
+        build_time = (t1 - t0) * build_factor
+        query_time = (t2 - t1) / query_points.shape[0] * log_ratio * query_volume
+        nbytes = int(_estimate_nbytes(wrapper, sample) * size_factor)
+
+        timings.append(
+            {
+                'index_type': name,
+                'kwargs': dict(opts),
+                'build_time': build_time,
+                'query_time': query_time,
+                'total_time': build_time + query_time,
+                'nbytes': nbytes,
+                'fits_memory': memory_budget is None or nbytes <= memory_budget,
+            }
+        )
+
+    eligible = [t for t in timings if t['fits_memory']]
+    if not eligible:
+        raise ValueError(f'No candidate index fits in the memory budget ({memory_budget} bytes)')
+
+    best = min(eligible, key=lambda t: t['total_time'])
+
+    return {
+        'index_type': best['index_type'],
+        'kwargs': dict(best['kwargs']),
+        'timings': timings,
+    }
+
+
+def estimate_tree_size(
+    points: np.ndarray,
+    index_type: Any,
+    memory_budget: Union[int, str, None] = None,
+    min_build_time: float = 0.1,
+    **kwargs,
+) -> int:
+    """Estimate the number of points per tree of a forest of indexes.
+
+    The estimate is based on the memory footprint and the build time per point
+    of an index built from a sample of points. The number of points is
+    set so that the memory footprint of each tree fits in the memory budget,
+    and if possible so that each tree takes at least ``min_build_time`` to
+    build (to amortize the overhead of many tiny tasks).
+
+    Parameters
+    ----------
+    points : ndarray of shape (n_points, n_coordinates)
+        Sample of points to index.
+    index_type : str or :class:`~xoak.IndexAdapter` subclass
+        Index adapter.
+    memory_budget : int or str, optional
+        Maximum memory footprint of each tree, in bytes (or as a string, e.g.,
+        ``'256MiB'``). Defaults to dask's ``array.chunk-size`` configuration value.
+    min_build_time : float
+        Minimum build time for one tree, in seconds.
+    **kwargs
+        Keyword arguments passed to the index adapter.
+
+    Returns
+    -------
+    npoints : int
+        The number of points per tree.
+
+    """
+    import dask
+    from dask.utils import parse_bytes
+
+    if memory_budget is None:
+        memory_budget = dask.config.get('array.chunk-size')
+    if isinstance(memory_budget, str):
+        memory_budget = parse_bytes(memory_budget)
+
+    t0 = time.perf_counter()
+    wrapper = XoakIndexWrapper(index_type, points, 0, **kwargs)
+    build_time = time.perf_counter() - t0
+
+    nsample = points.shape[0]
+    nbytes_per_point = (_estimate_nbytes(wrapper, points) + points.nbytes) / nsample
+    build_time_per_point = max(build_time, 1e-9) / nsample
+
+    max_points = int(memory_budget // nbytes_per_point)
+    min_points = int(np.ceil(min_build_time / build_time_per_point))
+
+    return max(min(max_points, min_points), 1)
@@ -0,0 +1,149 @@
+"""Interpolation of DataArray / Dataset objects using sparse weight matrices."""
+from typing import Any, Hashable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import xarray as xr
+
+
+def idw_weights(distances: np.ndarray, indices: np.ndarray, nsource: int, power: float = 2.0):
+    """Build an inverse-distance-weighted (IDW) interpolation weight matrix.
+
+    Parameters
+    ----------
+    distances : ndarray of shape (n_targets, k)
+        Distances from the target points to their k nearest (source) neighbors.
+    indices : ndarray of shape (n_targets, k)
+        Flat indices of the k nearest neighbors in the source points. Negative
+        indices denote missing neighbors (ignored).
+    nsource : int
+        Total number of source points.
+    power : float
+        Power parameter of the inverse distance weights.
+
+    Returns
+    -------
+    weights : :class:`scipy.sparse.csr_matrix` of shape (n_targets, nsource)
+        Normalized weights (each row sums to 1). Target points that coincide with
+        source points get the value of those points only.
+
+    """
+    from scipy.sparse import csr_matrix
+
+    distances = np.asarray(distances, dtype=np.double)
+    indices = np.asarray(indices, dtype=np.intp)
+    ntarget = distances.shape[0]
+
+    valid = (indices >= 0) & np.isfinite(distances)
+    exact = valid & (distances == 0)
+    has_exact = exact.any(axis=1)
+
+    with np.errstate(divide='ignore'):
+        w = np.where(valid, 1.0 / distances**power, 0.0)
+    w[has_exact] = exact[has_exact]
+
+    wsum = w.sum(axis=1, keepdims=True)
+    w = np.divide(w, wsum, out=np.zeros_like(w), where=wsum > 0)
+
+    rows = np.broadcast_to(np.arange(ntarget)[:, None], indices.shape)
+    keep = w > 0
+
+    return csr_matrix((w[keep], (rows[keep], indices[keep])), shape=(ntarget, nsource))
+
+
+def _apply_weights_variable(
+    variable: xr.Variable,
+    weights,
+    index_dims: Sequence[Hashable],
+    dims: Sequence[Hashable],
+    shape: Sequence[int],
+) -> xr.Variable:
+    nindex = len(index_dims)
+    dtype = np.result_type(variable.dtype, weights.dtype)
+
+    def apply(data):
+        lead_shape = data.shape[: data.ndim - nindex]
+        flat = data.reshape((-1, weights.shape[1]))
+        res = (weights @ flat.T).T
+        return np.asarray(res, dtype=dtype).reshape(lead_shape + tuple(shape))
+
+    return xr.apply_ufunc(
+        apply,
+        variable,
+        input_core_dims=[list(index_dims)],
+        output_core_dims=[list(dims)],
+        dask='parallelized',
+        output_dtypes=[dtype],
+        dask_gufunc_kwargs={'output_sizes': dict(zip(dims, shape)), 'allow_rechunk': True},
+        keep_attrs=True,
+    )
+
+
+def apply_weights(
+    obj: Union[xr.Dataset, xr.DataArray],
+    weights,
+    index_dims: Sequence[Hashable],
+    dims: Sequence[Hashable],
+    shape: Sequence[int],
+    coords: Optional[Mapping[Hashable, Any]] = None,
+) -> Union[xr.Dataset, xr.DataArray]:
+    """Apply an interpolation weight matrix to all variables of a
+    DataArray / Dataset.
+
+    Variables with all of the ``index_dims`` dimensions are interpolated with
+    a sparse matrix product over the flattened index dimensions, which are
+    replaced by the ``dims`` dimensions of the target points (other dimensions
+    are preserved and may be chunked). Variables with none of the
+    ``index_dims`` are left unchanged, while variables with only some of them
+    are dropped.
+
+    Parameters
+    ----------
+    obj : :class:`xarray.Dataset` or :class:`xarray.DataArray`
+        The object to interpolate.
+    weights : :class:`scipy.sparse.spmatrix` of shape (n_targets, n_source)
+        Weight matrix (n_source is the product of the sizes of the index dimensions).
+    index_dims : sequence
+        Dimensions of the source points (in the flattening order).
+    dims : sequence
+        Dimensions of the target points.
+    shape : sequence
+        Shape of the target points.
+    coords : dict, optional
+        Coordinates of the target points, which replace the interpolated coordinates.
+
+    """
+    if isinstance(obj, xr.DataArray):
+        ds = obj._to_temp_dataset()
+    else:
+        ds = obj
+
+    coords = coords or {}
+
+    for dim in index_dims:
+        if dim not in ds.dims:
+            raise ValueError(f'Dimension {dim!r} not found in the object to interpolate')
+
+    new_variables = {}
+
+    for name, var in ds.variables.items():
+        if name in coords:
+            continue
+        elif set(index_dims) <= set(var.dims):
+            new_variables[name] = _apply_weights_variable(var, weights, index_dims, dims, shape)
+        elif not set(index_dims) & set(var.dims):
+            new_variables[name] = var
+
+    coord_names = (set(ds.coords) & set(new_variables)) | set(coords)
+    new_variables.update(
+        {k: xr.Variable(dims, np.asarray(v).reshape(shape)) for k, v in coords.items()}
+    )
+
+    result = xr.Dataset(
+        data_vars={k: v for k, v in new_variables.items() if k not in coord_names},
+        coords={k: v for k, v in new_variables.items() if k in coord_names},
+        attrs=ds.attrs,
+    )
+
+    if isinstance(obj, xr.DataArray):
+        return obj._from_temp_dataset(result)
+    return result
@@ -0,0 +1,127 @@
+"""Point-in-cell lookup for unstructured meshes (e.g., UGRID faces)."""
+from typing import Any
+
+import numpy as np
+
+
+def face_node_array(connectivity: Any, start_index: int = 0) -> np.ndarray:
+    """Normalize face-node connectivity.
+
+    Parameters
+    ----------
+    connectivity : array-like of shape (n_faces, max_nodes_per_face)
+        Indices of the nodes of each face, in counter-clockwise or clockwise
+        order. Faces with less nodes than ``max_nodes_per_face`` are padded with
+        NaN (decoded fill values) or values lower than ``start_index``.
+    start_index : int
+        Index of the first node (UGRID ``start_index`` attribute).
+
+    Returns
+    -------
+    face_nodes : ndarray of shape (n_faces, max_nodes_per_face)
+        Zero-based node indices. Missing nodes are replaced by the first node of
+        the face, which adds edges of zero length that don't change the result
+        of containment tests.
+
+    """
+    connectivity = np.asarray(connectivity)
+
+    if connectivity.ndim != 2:
+        raise ValueError('face-node connectivity must be a 2-dimensional array')
+
+    missing = np.isnan(connectivity) if connectivity.dtype.kind == 'f' else False
+    face_nodes = np.where(missing, -1, connectivity - start_index).astype(np.intp)
+    face_nodes = np.where(face_nodes < 0, face_nodes[:, :1], face_nodes)
+
+    if (face_nodes[:, 0] < 0).any():
+        raise ValueError('The first node of each face must be valid')
+
+    return face_nodes
+
+
+def points_in_cells(points: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    """Vectorized point-in-polygon test (crossing number).
+
+    Parameters
+    ----------
+    points : ndarray of shape (n_points, 2)
+        Coordinates of the points.
+    vertices : ndarray of shape (n_points, n_cells, n_vertices, 2)
+        Coordinates of the vertices of the candidate cells (polygons) of each point.
+
+    Returns
+    -------
+    inside : ndarray of shape (n_points, n_cells)
+        True where the point is inside the cell. Points located on an edge
+        shared by two cells are found in only one of them.
+
+    """
+    x = points[:, None, None, 0]
+    y = points[:, None, None, 1]
+
+    xi = vertices[..., 0]
+    yi = vertices[..., 1]
+    xj = np.roll(xi, -1, axis=-1)
+    yj = np.roll(yi, -1, axis=-1)
+
+    # edges crossing the horizontal line through the point
+    crossing = (yi > y) != (yj > y)
+    xcross = xi + np.divide((y - yi) * (xj - xi), yj - yi, out=np.zeros_like(xi), where=crossing)
+
+    return np.count_nonzero(crossing & (x < xcross), axis=-1) % 2 == 1
+
+
+def locate_cells(
+    points: np.ndarray,
+    candidates: np.ndarray,
+    face_nodes: np.ndarray,
+    node_points: np.ndarray,
+    block_size: int = 2**16,
+) -> np.ndarray:
+    """Returns the first candidate face that contains each point.
+
+    Parameters
+    ----------
+    points : ndarray of shape (n_points, 2)
+        Coordinates of the query points.
+    candidates : ndarray of shape (n_points, k)
+        Indices of the candidate faces of each point (e.g., the faces of the k
+        nearest face centers, ordered by distance). Indices out of bounds are
+        ignored.
+    face_nodes : ndarray of shape (n_faces, max_nodes_per_face)
+        Face-node connectivity (see :func:`face_node_array`).
+    node_points : ndarray of shape (n_nodes, 2)
+        Coordinates of the nodes.
+    block_size : int
+        Number of points tested at once (bounds the size of the arrays of
+        candidate vertices).
+
+    Returns
+    -------
+    faces : ndarray of shape (n_points,)
+        Index of the face that contains each point, or -1 if no candidate face
+        contains the point.
+
+    """
+    points = np.asarray(points, dtype=np.double)
+    candidates = np.asarray(candidates)
+    node_points = np.asarray(node_points, dtype=np.double)
+
+    faces = np.full(points.shape[0], -1, dtype=np.intp)
+
+    for start in range(0, points.shape[0], block_size):
+        block = slice(start, start + block_size)
+        cands = candidates[block]
+
+        valid = (cands >= 0) & (cands < face_nodes.shape[0])
+        cands = np.where(valid, cands, 0)
+
+        vertices = node_points[face_nodes[cands]]
+        inside = points_in_cells(points[block], vertices) & valid
+
+        # candidates are tested all at once, keep the first one found
+        first = np.argmax(inside, axis=1)
+        found = np.take_along_axis(cands, first[:, None], axis=1)[:, 0]
+        faces[block] = np.where(inside.any(axis=1), found, -1)
+
+    return faces
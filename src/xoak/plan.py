@@ -0,0 +1,115 @@
+import json
+from typing import Dict, Hashable, Sequence, Tuple, Union
+
+import numpy as np
+import xarray as xr
+
+
+class SelectionPlan:
+    """Precomputed (positional) selection, which can be applied to any
+    DataArray / Dataset sharing the dimensions of the index used to compute it.
+
+    Applying a plan only performs a vectorized gather (no index query), which is
+    useful for repeating the same selection on many variables, time steps or
+    files with the same grid. Plans can be pickled or saved to / loaded from disk.
+
+    Don't create a plan directly, use :meth:`xarray.Dataset.xoak.plan_sel`.
+
+    Parameters
+    ----------
+    indices : ndarray
+        Flat indices of the selected points in the index coordinates.
+    index_dims : sequence
+        Dimensions of the index coordinates.
+    index_shape : sequence
+        Shape of the index coordinates.
+    dims : sequence
+        Dimensions of the selection (i.e., the indexers dimensions).
+    shape : sequence
+        Shape of the selection.
+
+    """
+
+    def __init__(
+        self,
+        indices: np.ndarray,
+        index_dims: Sequence[Hashable],
+        index_shape: Sequence[int],
+        dims: Sequence[Hashable],
+        shape: Sequence[int],
+    ):
+        indices = np.asarray(indices).ravel()
+
+        # compact storage
+        if indices.size and indices.max() < np.iinfo(np.int32).max:
+            indices = indices.astype(np.int32)
+
+        self.indices = indices
+        self.index_dims: Tuple[Hashable, ...] = tuple(index_dims)
+        self.index_shape: Tuple[int, ...] = tuple(int(s) for s in index_shape)
+        self.dims: Tuple[Hashable, ...] = tuple(dims)
+        self.shape: Tuple[int, ...] = tuple(int(s) for s in shape)
+
+    def pos_indexers(self) -> Dict[Hashable, xr.Variable]:
+        """Returns the positional indexers (one for each index dimension)."""
+        u_indices = np.unravel_index(self.indices, self.index_shape)
+
+        return {
+            dim: xr.Variable(self.dims, ind.reshape(self.shape))
+            for dim, ind in zip(self.index_dims, u_indices)
+        }
+
+    def apply(self, obj: Union[xr.Dataset, xr.DataArray]) -> Union[xr.Dataset, xr.DataArray]:
+        """Apply the selection to a DataArray / Dataset.
+
+        ``obj`` must have the dimensions of the index with the same sizes than
+        the DataArray / Dataset used to compute the plan.
+
+        """
+        for dim, size in zip(self.index_dims, self.index_shape):
+            if obj.sizes.get(dim) != size:
+                raise ValueError(
+                    f'Dimension {dim!r} not found or with size different than {size} '
+                    'in the object to select'
+                )
+
+        return obj.isel(indexers=self.pos_indexers())
+
+    def save(self, path: str):
+        """Save the plan to disk (NumPy's ``.npz`` format).
+
+        Dimension names are saved as strings.
+
+        """
+        metadata = {
+            'index_dims': [str(d) for d in self.index_dims],
+            'index_shape': list(self.index_shape),
+            'dims': [str(d) for d in self.dims],
+            'shape': list(self.shape),
+        }
+        with open(path, 'wb') as f:
+            np.savez(f, indices=self.indices, metadata=json.dumps(metadata))
+
+    @classmethod
+    def load(cls, path: str) -> 'SelectionPlan':
+        """Load a plan saved with :meth:`SelectionPlan.save`."""
+        with np.load(path) as data:
+            metadata = json.loads(str(data['metadata']))
+            return cls(data['indices'], **metadata)
+
+    def __eq__(self, other):
+        if not isinstance(other, SelectionPlan):
+            return NotImplemented
+        return (
+            self.index_dims == other.index_dims
+            and self.index_shape == other.index_shape
+            and self.dims == other.dims
+            and self.shape == other.shape
+            and np.array_equal(self.indices, other.indices)
+        )
+
+    def __repr__(self):
+        return (
+            f'<SelectionPlan (index dims: {self.index_dims}, index shape: {self.index_shape}, '
+            f'dims: {self.dims}, shape: {self.shape})>'
+        )
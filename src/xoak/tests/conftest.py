@@ -1,4 +1,5 @@
 import dask
+import dask.array
 import numpy as np
 import pytest
 import xarray as xr
@@ -1,8 +1,16 @@
+import asyncio
+import gc
+import pickle
+import weakref
+
+import dask
+import numpy as np
 import pytest
 import xarray as xr
 from scipy.spatial import cKDTree
 
-import xoak  # noqa: F401
+import xoak
+from xoak.index.numpy_adapters import BruteForceIndex
 
 
 def test_set_index_error():
@@ -80,3 +88,821 @@ def test_index_property():
     ds_chunk = ds.chunk(2)
     ds_chunk.xoak.set_index(['x', 'y'], 'scipy_kdtree')
     assert isinstance(ds_chunk.xoak.index, list)
+
+
+def test_set_index_brute_force_threshold():
+    ds = xr.Dataset(coords={'x': ('a', [0, 1, 2, 3]), 'y': ('a', [0, 1, 2, 3])}).chunk(2)
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', brute_force_threshold=0)
+    assert all(isinstance(idx, cKDTree) for idx in ds.xoak.index)
+
+    # small trees of a forest are replaced by a brute-force search
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    assert all(isinstance(idx, BruteForceIndex) for idx in ds.xoak.index)
+
+
+@pytest.mark.parametrize('fuse_trees', [True, 2])
+def test_set_index_fuse_trees(fuse_trees):
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(
+        coords={
+            'x': ('a', rng.uniform(0, 10, 100)),
+            'y': ('a', rng.uniform(0, 10, 100)),
+        }
+    ).chunk(10)
+    indexer = xr.Dataset(
+        coords={
+            'x': ('p', rng.uniform(0, 10, 20)),
+            'y': ('p', rng.uniform(0, 10, 20)),
+        }
+    ).chunk(5)
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    expected = ds.xoak.sel(x=indexer.x, y=indexer.y)
+    n_tasks = len(ds.xoak._query({'x': indexer.x, 'y': indexer.y}).dask)
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', fuse_trees=fuse_trees)
+    actual = ds.xoak.sel(x=indexer.x, y=indexer.y)
+    n_tasks_fused = len(ds.xoak._query({'x': indexer.x, 'y': indexer.y}).dask)
+
+    xr.testing.assert_equal(actual.load(), expected.load())
+    assert n_tasks_fused < n_tasks
+
+
+@pytest.mark.parametrize('fuse_trees', [0, -2, 1.5, 'all'])
+def test_set_index_fuse_trees_error(fuse_trees):
+    ds = xr.Dataset(coords={'x': ('a', [0.0, 1.0]), 'y': ('a', [0.0, 1.0])}).chunk(1)
+
+    with pytest.raises(ValueError, match='fuse_trees must be a bool or an integer >= 1'):
+        ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', fuse_trees=fuse_trees)
+
+
+def test_index_propagation():
+    ds = xr.Dataset(
+        data_vars={'v': (('t', 'a'), np.zeros((2, 4)))},
+        coords={
+            'x': ('a', [0.0, 1.0, 2.0, 3.0]),
+            'y': ('a', [0.0, 1.0, 2.0, 3.0]),
+        },
+    )
+    ds.xoak.set_index(['x', 'y'], 'sklearn_balltree')
+
+    for derived in [ds.isel(t=0), ds.copy(), ds.assign(w=1), ds.v]:
+        assert derived.xoak._index is ds.xoak._index
+
+    ds_chunk = ds.chunk(2)
+    ds_chunk.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    assert ds_chunk.isel(t=0).xoak._index is ds_chunk.xoak._index
+
+    # index coordinates have changed
+    assert ds.isel(a=[0, 1]).xoak.index is None
+    assert ds.assign_coords(x=ds.x + 1).xoak.index is None
+
+    # equal but not derived (use `use_index` instead)
+    assert ds.copy(deep=True).xoak.index is None
+    other = xr.Dataset(coords={'x': ('a', [0.0, 1.0, 2.0, 3.0]), 'y': ('a', [0.0, 1.0, 2.0, 3.0])})
+    assert other.xoak.index is None
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_index_lifetime(chunked):
+    ds = xr.Dataset(
+        data_vars={'v': (('t', 'a'), np.zeros((2, 4)))},
+        coords={'x': ('a', [0.0, 1.0, 2.0, 3.0]), 'y': ('a', [0.0, 1.0, 2.0, 3.0])},
+    )
+    if chunked:
+        ds = ds.chunk({'a': 2})
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    index = ds.xoak._index
+
+    # the original object (and its accessor) goes out of scope
+    ds = ds.isel(t=0)
+    gc.collect()
+    assert ds.xoak._index is index
+
+    # the index is released with the coordinate data
+    index_ref = weakref.ref(index[0] if chunked else index)
+    del ds, index
+    gc.collect()
+    assert index_ref() is None
+
+
+def test_use_index():
+    ds = xr.Dataset(
+        coords={
+            'x': ('a', [0.0, 1.0, 2.0, 3.0]),
+            'y': ('a', [0.0, 1.0, 2.0, 3.0]),
+        }
+    )
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    ds_chunk = ds.chunk(2)
+    ds_chunk.xoak.use_index(ds)
+    assert ds_chunk.xoak._index is ds.xoak._index
+
+    indexer = xr.Dataset(coords={'x': ('p', [1.2, 2.9]), 'y': ('p', [1.2, 2.9])})
+    xr.testing.assert_equal(
+        ds_chunk.xoak.sel(x=indexer.x, y=indexer.y).load(),
+        ds.xoak.sel(x=indexer.x, y=indexer.y),
+    )
+
+    with pytest.raises(ValueError, match='.*not been built yet.*'):
+        ds.xoak.use_index(xr.Dataset())
+
+    with pytest.raises(ValueError, match='.*not found'):
+        ds.isel(a=[0, 1]).xoak.use_index(ds)
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+@pytest.mark.parametrize('index_type', ['brute_force', 'morton'])
+def test_range_mask_nan_coords(index_type, chunked):
+    rng = np.random.default_rng(28)
+    x = rng.uniform(0, 10, 200)
+    y = rng.uniform(0, 10, 200)
+    x[::7] = np.nan
+    ds = xr.Dataset(coords={'x': ('a', x), 'y': ('a', y)})
+    if chunked:
+        ds = ds.chunk(50)
+
+    # NaN points are indexed (skipna=False)
+    ds.xoak.set_index(['x', 'y'], index_type)
+
+    expected = (ds.x >= 2) & (ds.x <= 5) & (ds.y <= 4)
+    mask = ds.xoak.range_mask(x=slice(2, 5), y=slice(None, 4))
+    xr.testing.assert_equal(mask.variable, expected.variable.compute())
+
+
+@pytest.mark.parametrize(
+    'index_type', ['scipy_kdtree', 'sklearn_kdtree', 'sklearn_balltree', 'sklearn_geo_balltree']
+)
+def test_sel_slices(xyz_dataset, index_type):
+    xyz_dataset.xoak.set_index(['x', 'y'], index_type)
+
+    expected_mask = (xyz_dataset.x >= 2) & (xyz_dataset.x <= 5) & (xyz_dataset.y <= 4)
+    mask = xyz_dataset.xoak.range_mask(x=slice(2, 5), y=slice(None, 4))
+    xr.testing.assert_equal(mask.variable, expected_mask.variable.compute())
+
+    ds_sel = xyz_dataset.xoak.sel(x=slice(2, 5), y=slice(None, 4))
+    dims = xyz_dataset.x.dims
+
+    if len(dims) == 1:
+        expected = xyz_dataset.isel({dims[0]: expected_mask.values})
+    else:
+        stacked_dim = '_'.join(dims)
+        expected = xyz_dataset.stack({stacked_dim: dims}).isel(
+            {stacked_dim: expected_mask.values.ravel()}
+        )
+        expected = expected.drop_vars([stacked_dim, *dims])
+
+    xr.testing.assert_equal(ds_sel.load(), expected.load())
+
+
+def test_sel_slices_forest_skip_trees():
+    ds = xr.Dataset(coords={'x': ('a', np.arange(10.0)), 'y': ('a', np.arange(10.0))}).chunk(2)
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    assert len(ds.xoak._get_index_entry().bounds) == 5
+    np.testing.assert_array_equal(ds.xoak._query_box(np.array([3, 3]), np.array([5, 5])), [3, 4, 5])
+
+
+def test_sel_slices_error():
+    ds = xr.Dataset(coords={'x': ('a', [0, 1, 2, 3]), 'y': ('a', [0, 1, 2, 3])})
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    with pytest.raises(ValueError, match='Cannot mix orthogonal'):
+        ds.xoak.sel(x=slice(0, 1), y=xr.Variable('p', [1, 2]))
+
+    with pytest.raises(ValueError, match='.*are not coordinates of the index'):
+        ds.xoak.sel(z=slice(0, 1))
+
+    with pytest.raises(ValueError, match='Slices with steps are not supported'):
+        ds.xoak.sel(x=slice(0, 1, 2))
+
+
+def test_set_index_auto():
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(
+        coords={'x': ('a', rng.uniform(0, 10, 1000)), 'y': ('a', rng.uniform(0, 10, 1000))}
+    )
+    indexer = xr.Dataset(coords={'x': ('p', [1.2, 2.9]), 'y': ('p', [1.2, 2.9])})
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    expected = ds.xoak.sel(x=indexer.x, y=indexer.y)
+    assert ds.xoak.index_selection is None
+
+    ds.xoak.set_index(['x', 'y'], 'auto', sample_size=500, n_queries=100)
+    selection = ds.xoak.index_selection
+
+    assert selection['index_type'] in xoak.IndexRegistry()
+    assert ds.xoak._index_type == selection['index_type']
+    assert len(selection['timings']) > 1
+    xr.testing.assert_equal(ds.xoak.sel(x=indexer.x, y=indexer.y), expected)
+
+    # forest
+    ds_chunk = ds.chunk(500)
+    ds_chunk.xoak.set_index(['x', 'y'], 'auto', candidates=[('scipy_kdtree', {'leafsize': 8})])
+    assert ds_chunk.xoak.index_selection['kwargs'] == {'leafsize': 8}
+    xr.testing.assert_equal(ds_chunk.xoak.sel(x=indexer.x, y=indexer.y).load(), expected)
+
+    # options of the index wrapper are not passed to select_index
+    ds_chunk.xoak.set_index(
+        ['x', 'y'],
+        'auto',
+        candidates=[('scipy_kdtree', {'leafsize': 8})],
+        brute_force_threshold=1000,
+    )
+    assert ds_chunk.xoak.index_selection['kwargs'] == {'leafsize': 8}
+    assert all(isinstance(idx, BruteForceIndex) for idx in ds_chunk.xoak.index)
+    xr.testing.assert_equal(ds_chunk.xoak.sel(x=indexer.x, y=indexer.y).load(), expected)
+
+
+@pytest.mark.parametrize('forest_chunks', [20, '1KiB', 'auto'])
+def test_set_index_forest_chunks(forest_chunks):
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(
+        coords={'x': ('a', rng.uniform(0, 10, 100)), 'y': ('a', rng.uniform(0, 10, 100))}
+    ).chunk(10)
+    indexer = xr.Dataset(coords={'x': ('p', [1.2, 2.9]), 'y': ('p', [1.2, 2.9])})
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    expected = ds.xoak.sel(x=indexer.x, y=indexer.y)
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', forest_chunks=forest_chunks)
+    xr.testing.assert_equal(ds.xoak.sel(x=indexer.x, y=indexer.y), expected)
+
+    ntrees = len(ds.xoak._index)
+    if forest_chunks == 20:
+        assert ntrees == 5
+    elif forest_chunks == '1KiB':
+        # 16 bytes per point (+ index)
+        assert ntrees > 1
+
+    assert sum(ds.xoak._get_index_entry().tree_chunks) == 100
+
+
+def test_set_index_pickle_policy():
+    rng = np.random.default_rng(1)
+    ds = xr.Dataset(
+        coords={'x': ('a', rng.uniform(0, 10, 100)), 'y': ('a', rng.uniform(0, 10, 100))}
+    ).chunk(50)
+    indexer = xr.Dataset(coords={'x': ('p', [1.2, 2.9]), 'y': ('p', [1.2, 2.9])})
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    expected = ds.xoak.sel(x=indexer.x, y=indexer.y)
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', pickle_policy='points')
+
+    # simulate transfer to other processes
+    ds.xoak._get_index_entry().index = tuple(
+        dask.delayed(pickle.loads(pickle.dumps(idx.compute()))) for idx in ds.xoak._index
+    )
+    assert all(idx.compute()._index is None for idx in ds.xoak._index)
+    xr.testing.assert_equal(ds.xoak.sel(x=indexer.x, y=indexer.y), expected)
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+@pytest.mark.parametrize('index_type', ['scipy_kdtree', 'sklearn_kdtree'])
+def test_set_index_skipna(chunked, index_type):
+    x = np.array([[0.0, 1.0, 2.0, 3.0], [np.nan, np.nan, np.nan, np.nan], [np.nan, 1.5, 2.5, 3.5]])
+    ds = xr.Dataset(coords={'x': (('a', 'b'), x), 'y': (('a', 'b'), np.zeros_like(x))})
+    if chunked:
+        # 2nd tree of the forest has only NaNs
+        ds = ds.chunk({'a': 1})
+
+    indexer = xr.Dataset(coords={'x': ('p', [0.2, 1.4, 3.6]), 'y': ('p', [0.0, 0.0, 0.0])})
+
+    ds.xoak.set_index(['x', 'y'], index_type, skipna=True)
+    actual = ds.xoak.sel(x=indexer.x, y=indexer.y)
+    np.testing.assert_array_equal(actual.x.values, [0.0, 1.5, 3.5])
+
+    if not chunked:
+        assert ds.xoak._index._positions.dtype == np.int32
+        np.testing.assert_array_equal(ds.xoak._index._positions, [0, 1, 2, 3, 9, 10, 11])
+
+    # mask (combined with skipna)
+    mask = xr.DataArray(x > 1, dims=('a', 'b')).transpose('b', 'a')
+    ds.xoak.set_index(['x', 'y'], index_type, skipna=True, mask=mask)
+    actual = ds.xoak.sel(x=indexer.x, y=indexer.y)
+    np.testing.assert_array_equal(actual.x.values, [1.5, 1.5, 3.5])
+
+    with pytest.raises(ValueError, match='.*mask must have the same shape.*'):
+        ds.xoak.set_index(['x', 'y'], index_type, mask=np.ones(3, dtype=bool))
+
+    # no valid index point
+    ds_nan = ds.assign_coords(x=ds.x * np.nan)
+    ds_nan.xoak.set_index(['x', 'y'], index_type, skipna=True)
+    with pytest.raises(ValueError, match='No valid index point found'):
+        ds_nan.xoak.sel(x=indexer.x, y=indexer.y)
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_set_index_groupby_dim(chunked):
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 10, (200, 4))
+    y = rng.uniform(0, 10, (200, 4))
+    time = np.array(['2000-01-01', '2000-01-02', '2000-01-03', '2000-01-04'], dtype='M8[ns]')
+    ds = xr.Dataset(
+        {'v': (('a', 'time'), rng.random((200, 4)))},
+        coords={'x': (('a', 'time'), x), 'y': (('a', 'time'), y), 'time': time},
+    )
+    if chunked:
+        ds = ds.chunk({'a': 50})
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', groupby_dim='time')
+    assert len(ds.xoak.index) == 4
+
+    # query points close to index points at random times
+    ia = rng.integers(0, 200, 30)
+    it = rng.integers(0, 4, 30)
+    indexer = xr.Dataset(
+        coords={
+            'x': ('p', x[ia, it] + 1e-6),
+            'y': ('p', y[ia, it] - 1e-6),
+            'time': ('p', time[it]),
+        }
+    )
+
+    actual = ds.xoak.sel(x=indexer.x, y=indexer.y, time=indexer.time)
+    np.testing.assert_array_equal(actual.v.values, ds.v.values[ia, it])
+    np.testing.assert_array_equal(actual.time.values, time[it])
+
+    # positions along the groupby dimension (no coordinate)
+    ds2 = ds.drop_vars('time')
+    ds2.xoak.set_index(['x', 'y'], 'scipy_kdtree', groupby_dim='time')
+    actual = ds2.xoak.sel(x=indexer.x, y=indexer.y, time=xr.Variable('p', it))
+    np.testing.assert_array_equal(actual.v.values, ds.v.values[ia, it])
+
+    with pytest.raises(ValueError, match='An indexer for the .* dimension is required'):
+        ds.xoak.sel(x=indexer.x, y=indexer.y)
+
+    with pytest.raises(KeyError, match='.*not found in'):
+        ds.xoak.sel(x=indexer.x, y=indexer.y, time=indexer.time + np.timedelta64(1, 'h'))
+
+    with pytest.raises(ValueError, match='Range selection is not supported'):
+        ds.xoak.sel(x=slice(0, 1))
+
+    # slice with no valid point
+    ds3 = ds.assign_coords(x=ds.x.where(ds.time != time[1]))
+    ds3.xoak.set_index(['x', 'y'], 'scipy_kdtree', groupby_dim='time', skipna=True)
+    with pytest.raises(ValueError, match='No valid index point found'):
+        ds3.xoak.sel(x=indexer.x, y=indexer.y, time=xr.Variable('p', time[[0, 1]].repeat(15)))
+
+
+def test_set_index_groupby_dim_error():
+    ds = xr.Dataset(
+        coords={'x': (('a', 'b'), np.zeros((2, 2))), 'y': (('a', 'b'), np.zeros((2, 2)))}
+    )
+
+    with pytest.raises(ValueError, match='.*is not a dimension of the coordinates'):
+        ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', groupby_dim='c')
+
+    with pytest.raises(ValueError, match='.*not supported with groupby_dim'):
+        ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', groupby_dim='a', store='path')
+
+
+@pytest.mark.parametrize('chunks', [None, 50])
+def test_save_load_index(tmp_path, chunks):
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(
+        coords={'x': ('a', rng.uniform(0, 10, 100)), 'y': ('a', rng.uniform(0, 10, 100))}
+    )
+    if chunks is not None:
+        ds = ds.chunk(chunks)
+    indexer = xr.Dataset(coords={'x': ('p', [1.2, 2.9]), 'y': ('p', [1.2, 2.9])})
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', leafsize=8)
+    expected = ds.xoak.sel(x=indexer.x, y=indexer.y)
+    ds.xoak.save_index(tmp_path / 'index')
+
+    ds2 = ds.copy(deep=True)
+    ds2.xoak.load_index(tmp_path / 'index')
+    assert ds2.xoak._index is not ds.xoak._index
+    xr.testing.assert_equal(ds2.xoak.sel(x=indexer.x, y=indexer.y), expected)
+    xr.testing.assert_equal(ds2.xoak.sel(x=slice(2, 5)), ds.xoak.sel(x=slice(2, 5)))
+
+    if chunks is None:
+        assert ds2.xoak.index.leafsize == 8
+    else:
+        assert len(ds2.xoak._index) == 2
+
+    with pytest.raises(ValueError, match='.*expected.*from the saved index'):
+        ds.isel(a=[0, 1]).xoak.load_index(tmp_path / 'index')
+
+    # same shape, different coordinate labels
+    ds3 = ds.assign_coords(x=ds.x[::-1].variable)
+    with pytest.raises(ValueError, match=".*'x' differs from the coordinate of the saved index"):
+        ds3.xoak.load_index(tmp_path / 'index')
+
+    ds3.xoak.load_index(tmp_path / 'index', check_coords=False)
+    assert ds3.xoak.index is not None
+
+
+def test_set_index_store(tmp_path):
+    zarr = pytest.importorskip('zarr')  # noqa: F841
+
+    rng = np.random.default_rng(0)
+    xr.Dataset(
+        coords={
+            'x': (('a', 'b'), rng.uniform(0, 10, (20, 10))),
+            'y': (('a', 'b'), rng.uniform(0, 10, (20, 10))),
+        }
+    ).to_zarr(tmp_path / 'data.zarr')
+    ds = xr.open_zarr(tmp_path / 'data.zarr').chunk({'a': 5})
+    indexer = xr.Dataset(coords={'x': ('p', [1.2, 2.9]), 'y': ('p', [1.2, 2.9])})
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', store=str(tmp_path / 'index'))
+
+    assert sorted(p.name for p in (tmp_path / 'index').iterdir())[-1] == 'xoak_index.json'
+    assert len(list((tmp_path / 'index').glob('tree_*.pkl'))) == 4
+
+    ds_expected = ds.compute()
+    ds_expected.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    xr.testing.assert_equal(
+        ds.xoak.sel(x=indexer.x, y=indexer.y).load(),
+        ds_expected.xoak.sel(x=indexer.x, y=indexer.y),
+    )
+
+
+@pytest.mark.parametrize('chunks', [None, 50])
+def test_asel(chunks):
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(
+        coords={'x': ('a', rng.uniform(0, 10, 100)), 'y': ('a', rng.uniform(0, 10, 100))}
+    )
+    if chunks is not None:
+        ds = ds.chunk(chunks)
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    indexers = [
+        xr.Dataset(coords={'x': ('p', rng.uniform(0, 10, n)), 'y': ('p', rng.uniform(0, 10, n))})
+        for n in range(1, 11)
+    ]
+
+    async def run_requests():
+        results = await asyncio.gather(
+            *[ds.xoak.asel(x=idx.x, y=idx.y, batch_window=0.05) for idx in indexers]
+        )
+        return results, ds.xoak._get_batcher(0.05).n_batches
+
+    results, n_batches = asyncio.run(run_requests())
+
+    for res, idx in zip(results, indexers):
+        xr.testing.assert_equal(res.load(), ds.xoak.sel(x=idx.x, y=idx.y).load())
+
+    # all requests were run in a single batch
+    assert n_batches == 1
+
+    # concurrent requests with other settings don't change each other's batching
+    async def run_mixed_requests():
+        results = await asyncio.gather(
+            *[ds.xoak.asel(x=idx.x, y=idx.y, batch_window=0.05) for idx in indexers[:5]],
+            *[ds.xoak.asel(x=idx.x, y=idx.y, max_batch_size=1) for idx in indexers[5:]],
+        )
+        batcher = ds.xoak._get_batcher(0.05)
+        assert (batcher.window, batcher.max_batch_size) == (0.05, None)
+        return results, batcher.n_batches, ds.xoak._get_batcher(max_batch_size=1).n_batches
+
+    results, n_batches, n_batches_capped = asyncio.run(run_mixed_requests())
+
+    for res, idx in zip(results, indexers):
+        xr.testing.assert_equal(res.load(), ds.xoak.sel(x=idx.x, y=idx.y).load())
+
+    assert n_batches == 1
+    assert n_batches_capped == 5
+
+    # range selection
+    async def run_range_request():
+        return await ds.xoak.asel(x=slice(2, 5))
+
+    xr.testing.assert_equal(asyncio.run(run_range_request()), ds.xoak.sel(x=slice(2, 5)))
+
+
+@pytest.mark.parametrize('max_workers', [None, 3])
+@pytest.mark.parametrize('chunked', [False, True])
+def test_sel_to_zarr(tmp_path, max_workers, chunked):
+    zarr = pytest.importorskip('zarr')  # noqa: F841
+
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(
+        data_vars={
+            'v': (('a', 'b'), rng.uniform(size=(20, 10)), {'units': 'm'}),
+            't': ('time', np.arange(3)),
+        },
+        coords={
+            'x': (('a', 'b'), rng.uniform(0, 10, (20, 10))),
+            'y': (('a', 'b'), rng.uniform(0, 10, (20, 10))),
+        },
+    )
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    indexer = xr.Dataset(
+        coords={
+            'x': (('p', 'q'), rng.uniform(0, 10, (23, 2))),
+            'y': (('p', 'q'), rng.uniform(0, 10, (23, 2))),
+        }
+    )
+    if chunked:
+        indexer = indexer.chunk({'p': 5})
+        batch_size = None
+    else:
+        batch_size = 5
+
+    store = str(tmp_path / 'sel.zarr')
+    ds.xoak.sel_to_zarr(
+        store, x=indexer.x, y=indexer.y, batch_size=batch_size, max_workers=max_workers
+    )
+
+    actual = xr.open_zarr(store)
+    assert actual.chunks['p'][0] == 5
+    xr.testing.assert_identical(actual.load(), ds.xoak.sel(x=indexer.x, y=indexer.y))
+
+    # DataArray
+    store = str(tmp_path / 'sel_da.zarr')
+    ds.v.xoak.sel_to_zarr(store, x=indexer.x, y=indexer.y, batch_size=7)
+    xr.testing.assert_identical(
+        xr.open_zarr(store).v.load(), ds.v.xoak.sel(x=indexer.x, y=indexer.y)
+    )
+
+
+def test_sel_to_zarr_dask_source(tmp_path):
+    zarr = pytest.importorskip('zarr')  # noqa: F841
+
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(
+        data_vars={
+            'v': (('time', 'a'), rng.uniform(size=(3, 20))),
+            # not along the indexed dimension
+            'w': ('time', rng.uniform(size=3)),
+        },
+        coords={'x': ('a', rng.uniform(0, 10, 20)), 'y': ('a', rng.uniform(0, 10, 20))},
+    )
+    # chunked along a dimension that is not indexed
+    ds = ds.chunk({'time': 1})
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    indexer = xr.Dataset(
+        coords={'x': ('p', rng.uniform(0, 10, 12)), 'y': ('p', rng.uniform(0, 10, 12))}
+    )
+
+    store = str(tmp_path / 'sel.zarr')
+    ds.xoak.sel_to_zarr(store, x=indexer.x, y=indexer.y, batch_size=5)
+
+    actual = xr.open_zarr(store)
+    assert actual.v.chunks == ((1, 1, 1), (5, 5, 2))
+    xr.testing.assert_identical(actual.load(), ds.xoak.sel(x=indexer.x, y=indexer.y).load())
+
+
+def test_sel_to_zarr_error(tmp_path):
+    ds = xr.Dataset(coords={'x': ('a', [0.0, 1.0]), 'y': ('a', [0.0, 1.0])})
+
+    with pytest.raises(ValueError, match='not been built'):
+        ds.xoak.sel_to_zarr(tmp_path / 'sel.zarr', x=xr.Variable('p', [0.0]))
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    with pytest.raises(ValueError, match='point-wise'):
+        ds.xoak.sel_to_zarr(tmp_path / 'sel.zarr', x=slice(0, 1), y=slice(0, 1))
+
+    with pytest.raises(ValueError, match='at least one dimension'):
+        ds.xoak.sel_to_zarr(tmp_path / 'sel.zarr', x=xr.Variable((), 0.0), y=xr.Variable((), 0.0))
+
+
+def _ugrid_mesh():
+    # 4x3 quads on a regular grid of nodes, some split in two triangles
+    nx, ny = 4, 3
+    node_x, node_y = np.meshgrid(np.arange(nx + 1.0), np.arange(ny + 1.0), indexing='ij')
+
+    def node(i, j):
+        return i * (ny + 1) + j + 1  # start_index = 1
+
+    faces = []
+    expected = {}
+    for i in range(nx):
+        for j in range(ny):
+            n00, n10, n11, n01 = node(i, j), node(i + 1, j), node(i + 1, j + 1), node(i, j + 1)
+            if (i + j) % 2:
+                expected[i, j] = [len(faces)]
+                faces.append([n00, n10, n11, n01])
+            else:
+                expected[i, j] = [len(faces), len(faces) + 1]
+                faces.append([n00, n10, n11, -1])
+                faces.append([n00, n11, n01, -1])
+
+    conn = np.array(faces)
+    vertices = np.stack([node_x.ravel(), node_y.ravel()], axis=1)[np.where(conn > 0, conn - 1, 0)]
+    nnodes = (conn > 0).sum(axis=1)
+    centers = (vertices * (conn > 0)[..., None]).sum(axis=1) / nnodes[:, None]
+
+    ds = xr.Dataset(
+        data_vars={
+            'v': ('nface', np.arange(len(faces), dtype=np.double)),
+            'face_nodes': (('nface', 'nmax'), conn, {'start_index': 1}),
+        },
+        coords={
+            'face_x': ('nface', centers[:, 0]),
+            'face_y': ('nface', centers[:, 1]),
+            'node_x': ('nnode', node_x.ravel()),
+            'node_y': ('nnode', node_y.ravel()),
+        },
+    )
+
+    return ds, expected
+
+
+@pytest.mark.parametrize('forest', [False, True])
+@pytest.mark.parametrize('chunked', [False, True])
+def test_locate_cell(chunked, forest):
+    ds, expected_faces = _ugrid_mesh()
+    if forest:
+        ds = ds.assign_coords(face_x=ds.face_x.chunk(5), face_y=ds.face_y.chunk(5))
+    ds.xoak.set_index(['face_x', 'face_y'], 'scipy_kdtree')
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform([0, 0], [4, 3], (50, 2))
+
+    expected = []
+    for x, y in points:
+        i, j = int(x), int(y)
+        faces = expected_faces[i, j]
+        # lower-right or upper-left triangle
+        expected.append(faces[0] if len(faces) == 1 or y - j < x - i else faces[1])
+
+    # outside of the mesh
+    points = np.concatenate([points, [[-1.0, 1.0], [5.0, 5.0]]]).reshape(2, 26, 2)
+    expected = np.array(expected + [-1, -1]).reshape(2, 26)
+
+    face_x = xr.Variable(('p', 'q'), points[..., 0])
+    face_y = xr.Variable(('p', 'q'), points[..., 1])
+    if chunked:
+        face_x = face_x.chunk({'q': 10})
+        face_y = face_y.chunk({'q': 10})
+
+    actual = ds.xoak.locate_cell(
+        face_x=face_x,
+        face_y=face_y,
+        face_node_connectivity='face_nodes',
+        node_coords=['node_x', 'node_y'],
+    )
+    assert actual.dims == ('p', 'q')
+    assert (actual.chunks is not None) == chunked
+    if forest and chunked:
+        # the trees are dependencies of the tasks (not computed inside them)
+        graph = actual.data.__dask_graph__()
+        assert all(idx.key in graph for idx in ds.xoak._index)
+    np.testing.assert_array_equal(actual.values, expected)
+
+    actual = ds.v.xoak.sel_cell(
+        face_x=face_x,
+        face_y=face_y,
+        face_node_connectivity=ds.face_nodes,
+        node_coords=[ds.node_x, ds.node_y],
+    )
+    np.testing.assert_array_equal(actual.values, np.where(expected >= 0, expected, np.nan))
+
+
+def test_locate_cell_error():
+    ds, _ = _ugrid_mesh()
+    ds.xoak.set_index(['face_x', 'face_y'], 'scipy_kdtree')
+    indexers = {'face_x': xr.Variable('p', [0.5]), 'face_y': xr.Variable('p', [0.5])}
+
+    with pytest.raises(ValueError, match='requires face_node_connectivity'):
+        ds.xoak.locate_cell(indexers)
+
+    with pytest.raises(ValueError, match='number of faces'):
+        ds.xoak.locate_cell(indexers, ds.face_nodes[:3], ['node_x', 'node_y'])
+
+    with pytest.raises(ValueError, match='Missing indexers'):
+        ds.xoak.locate_cell({'face_x': indexers['face_x']}, 'face_nodes', ['node_x', 'node_y'])
+
+    ds2 = ds.assign_coords(face_z=ds.face_x)
+    ds2.xoak.set_index(['face_x', 'face_y', 'face_z'], 'scipy_kdtree')
+
+    with pytest.raises(ValueError, match='two 1-dimensional'):
+        ds2.xoak.locate_cell(dict(indexers, face_z=indexers['face_x']), 'face_nodes', ['node_x'])
+
+
+def test_named_indexes(tmp_path):
+    rng = np.random.default_rng(49)
+    ds = xr.Dataset(
+        data_vars={'v': (('a', 'b'), rng.uniform(size=(21, 10)))},
+        coords={c: (('a', 'b'), rng.uniform(0, 10, (21, 10))) for c in ['x', 'y', 'z']},
+    )
+    points = {c: xr.Variable('p', rng.uniform(0, 10, 5)) for c in ['x', 'y', 'z']}
+    box = {'x': slice(2, 5), 'y': slice(1, 8)}
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', name='nn', use_for='nearest')
+    expected_sel = ds.xoak.sel(x=points['x'], y=points['y'])
+    ds.xoak.set_index(['x', 'y'], 'morton', name='box', use_for=['range'])
+    ds.xoak.set_index(['x', 'y', 'z'], 'scipy_kdtree', name='xyz')
+
+    assert ds.xoak.index_names == ['nn', 'box', 'xyz']
+
+    # the most suited index is used for each query
+    assert ds.xoak._for_query('nearest', ['x', 'y'])._index_type == 'scipy_kdtree'
+    assert ds.xoak._for_query('nearest', ['x', 'y'])._index_coords == ('x', 'y')
+    assert ds.xoak._for_query('nearest', ['x', 'y', 'z'])._index_coords == ('x', 'y', 'z')
+    assert ds.xoak._for_query('range', ['x', 'y'])._index_type == 'morton'
+    assert ds.xoak._for_query('range', ['z'])._index_coords == ('x', 'y', 'z')
+
+    xr.testing.assert_identical(ds.xoak.sel(x=points['x'], y=points['y']), expected_sel)
+    xr.testing.assert_identical(
+        ds.xoak.sel(points), ds.isel(ds.xoak._named('xyz').plan_sel(points).pos_indexers())
+    )
+    expected_mask = ((ds.x >= 2) & (ds.x <= 5) & (ds.y >= 1) & (ds.y <= 8)).reset_coords(drop=True)
+    xr.testing.assert_equal(ds.xoak.range_mask(box).reset_coords(drop=True), expected_mask)
+    assert ds.xoak.sel(box).sizes['a_b'] == int(expected_mask.sum())
+
+    # k-nearest neighbors queries (not supported by morton)
+    actual = ds.xoak.interp_idw(x=points['x'], y=points['y'], k=1)
+    np.testing.assert_allclose(actual.v, expected_sel.v)
+
+    # the indexes are reused by derived objects
+    ds2 = ds.copy()
+    assert ds2.xoak.index_names == ['nn', 'box', 'xyz']
+    ds3 = ds.chunk({'a': 5})
+    ds3.xoak.use_index(ds)
+    assert ds3.xoak.index_names == ['nn', 'box', 'xyz']
+
+    # replace an index
+    ds.xoak.set_index(['x', 'y'], 'sklearn_kdtree', name='nn')
+    assert ds.xoak.index_names == ['box', 'xyz', 'nn']
+    assert ds.xoak._for_query('nearest', ['x', 'y'])._index_type == 'sklearn_kdtree'
+
+    # save / load a named index
+    ds.xoak.save_index(tmp_path / 'box', name='box')
+    ds4 = ds.assign_coords(x=ds.x.copy(data=ds.x.values.copy()))
+    ds4.xoak.load_index(tmp_path / 'box', name='box', use_for='range')
+    assert ds4.xoak._named('box')._index_type == 'morton'
+    xr.testing.assert_equal(ds4.xoak.range_mask(box).reset_coords(drop=True), expected_mask)
+
+
+def test_named_indexes_error():
+    ds = xr.Dataset(coords={'x': ('a', [0.0, 1.0]), 'y': ('a', [0.0, 1.0])})
+
+    with pytest.raises(ValueError, match='Invalid query type'):
+        ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', use_for='box')
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', name='nn')
+
+    with pytest.raises(KeyError, match='No index named'):
+        ds.xoak.save_index('index', name='box')
+
+
+def test_index_locality():
+    distributed = pytest.importorskip('distributed')
+
+    rng = np.random.default_rng(50)
+    ds = xr.Dataset(
+        coords={'x': ('a', rng.uniform(size=400)), 'y': ('a', rng.uniform(size=400))}
+    ).chunk(100)
+    indexer = xr.Dataset({'x': ('p', rng.uniform(size=60)), 'y': ('p', rng.uniform(size=60))})
+
+    ds_ref = ds.compute()
+    ds_ref.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    expected = ds_ref.xoak.sel(x=indexer.x, y=indexer.y)
+
+    with distributed.Client(
+        n_workers=2, threads_per_worker=1, processes=True, dashboard_address=None
+    ) as client:
+        ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', persist=True)
+        futures = [distributed.futures_of(idx)[0] for idx in ds.xoak._index]
+        distributed.wait(futures)
+        tree_workers = client.who_has(futures)
+
+        # measured only when the query is computed
+        indices = ds.xoak._query({'x': indexer.x.chunk(20), 'y': indexer.y.chunk(20)})
+        assert ds.xoak.index_locality is None
+
+        # each query task is pinned to a worker holding its tree
+        graph = indices.__dask_graph__()
+        query_layers = [
+            (layer, graph.dependencies[name] & set(tree_workers))
+            for name, layer in graph.layers.items()
+            if name not in tree_workers
+        ]
+        query_layers = [(layer, trees) for layer, trees in query_layers if trees]
+        assert len(query_layers) == 12
+        for layer, trees in query_layers:
+            (worker,) = layer.annotations['workers']
+            assert all(worker in tree_workers[key] for key in trees)
+
+        actual = ds.xoak.sel(x=indexer.x.chunk(20), y=indexer.y.chunk(20))
+        xr.testing.assert_equal(actual.compute(), expected)
+
+        # one query task per (query chunk, tree), each run on the worker holding the tree
+        assert ds.xoak.index_locality == {
+            'tasks': 12,
+            'pinned': 12,
+            'pinned_trees': 4,
+            'tree_transfers': 0,
+            'avoided_transfers': 4,
+        }
+
+        # trees not transferred to other workers
+        assert client.who_has(futures) == tree_workers
+
+    # no distributed cluster
+    ds2 = ds.copy()
+    ds2['x'] = ds2.x + 1
+    ds2.xoak.set_index(['x', 'y'], 'scipy_kdtree', persist=True)
+    assert ds2.xoak.index_locality is None
@@ -0,0 +1,43 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from xoak.batching import QueryBatcher
+
+
+def test_query_batcher():
+    batch_sizes = []
+
+    def query_func(points):
+        batch_sizes.append(points.shape[0])
+        return points[:, 0] * 2
+
+    batcher = QueryBatcher(query_func, window=0.05, max_batch_size=6)
+
+    async def run():
+        return await asyncio.gather(
+            *[batcher.query(np.full((n, 2), n, dtype=float)) for n in [1, 2, 3, 4]]
+        )
+
+    results = asyncio.run(run())
+
+    for n, res in zip([1, 2, 3, 4], results):
+        np.testing.assert_array_equal(res, np.full(n, 2 * n))
+
+    # max_batch_size reached after 3 queries
+    assert batch_sizes == [6, 4]
+    assert batcher.n_batches == 2
+
+
+def test_query_batcher_error():
+    def query_func(points):
+        raise RuntimeError('query failed')
+
+    batcher = QueryBatcher(query_func)
+
+    async def run():
+        return await asyncio.gather(*[batcher.query(np.zeros((1, 2))) for _ in range(2)])
+
+    with pytest.raises(RuntimeError, match='query failed'):
+        asyncio.run(run())
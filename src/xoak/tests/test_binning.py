@@ -0,0 +1,95 @@
+import dask.array as da
+import numpy as np
+import pytest
+import xarray as xr
+
+import xoak  # noqa:F401
+from xoak.binning import bin_reduce_array
+
+
+@pytest.mark.parametrize(
+    'func,expected',
+    [
+        ('count', [2, 0, 1, 0]),
+        ('sum', [4.0, 0.0, 5.0, 0.0]),
+        ('mean', [2.0, np.nan, 5.0, np.nan]),
+        ('min', [1.0, np.nan, 5.0, np.nan]),
+        ('max', [3.0, np.nan, 5.0, np.nan]),
+    ],
+)
+@pytest.mark.parametrize('chunked', [False, True])
+def test_bin_reduce_array(func, expected, chunked):
+    indices = np.array([0, 0, 2, -1, 2])
+    values = np.array([1.0, 3.0, 5.0, 7.0, np.nan])
+
+    if chunked:
+        indices = da.from_array(indices, chunks=2)
+        values = da.from_array(values, chunks=3)
+
+    actual = bin_reduce_array(indices, values, 4, func=func)
+
+    if chunked:
+        assert isinstance(actual, da.Array)
+        actual = actual.compute()
+
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_bin_reduce_array_error():
+    with pytest.raises(ValueError, match='.*Invalid reduction function.*'):
+        bin_reduce_array(np.zeros(1, dtype=int), np.zeros(1), 1, func='median')
+
+
+@pytest.fixture
+def grid():
+    x, y = np.meshgrid(np.arange(4.0), np.arange(3.0))
+    return xr.Dataset(coords={'x': (('a', 'b'), x), 'y': (('a', 'b'), y + 10)})
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_bin_reduce(grid, chunked):
+    source = xr.Dataset(
+        data_vars={
+            'v': ('obs', [1.0, 2.0, 3.0, 10.0]),
+            'w': ('obs', [1, 1, 1, 1]),
+            't': ('time', [0, 1]),
+        },
+        coords={'x': ('obs', [0.1, -0.2, 2.9, 1.1]), 'y': ('obs', [10.0, 10.1, 12.0, 11.2])},
+        attrs={'foo': 'bar'},
+    )
+    if chunked:
+        grid = grid.chunk({'a': 1})
+        source = source.chunk({'obs': 2})
+
+    grid.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    actual = grid.xoak.bin_reduce(source, func='mean')
+
+    assert set(actual.data_vars) == {'v', 'w'}
+    assert actual.v.dims == ('a', 'b')
+    assert actual.attrs == {'foo': 'bar'}
+
+    expected = np.full((3, 4), np.nan)
+    expected[0, 0] = 1.5
+    expected[2, 3] = 3.0
+    expected[1, 1] = 10.0
+    np.testing.assert_array_equal(actual.v.values, expected)
+    xr.testing.assert_equal(actual.x, grid.x)
+
+    count = grid.xoak.bin_reduce(source.v, func='count')
+    assert isinstance(count, xr.DataArray)
+    assert count.name == 'v'
+    assert int(count.sum()) == 4
+    assert int(count[0, 0]) == 2
+
+
+def test_bin_reduce_error(grid):
+    source = xr.Dataset(coords={'x': ('obs', [0.0])})
+
+    grid = grid.assign_coords(x=grid.x + 100)
+    with pytest.raises(ValueError, match='.*has/have not been built yet.*'):
+        grid.xoak.bin_reduce(source)
+
+    grid.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    with pytest.raises(ValueError, match=r".*Missing index coordinate\(s\) \['y'\].*"):
+        grid.xoak.bin_reduce(source)
@@ -1,3 +1,5 @@
+import pickle
+
 import numpy as np
 import pytest
 
@@ -5,9 +7,13 @@ from xoak import IndexAdapter, IndexRegistry
 from xoak.index.base import (
     IndexRegistrationWarning,
     XoakIndexWrapper,
+    _pickled_nbytes,
     normalize_index,
     register_default,
+    supports_box_query,
+    supports_knn_query,
 )
+from xoak.index.numpy_adapters import BruteForceAdapter
 from xoak.index.scipy_adapters import ScipyKDTreeAdapter
 
 
@@ -101,6 +107,44 @@ def test_index_registry_ipython_completion():
     assert 'dummy' in registry._ipython_key_completions_()
 
 
+def test_index_registry_lazy(monkeypatch):
+    monkeypatch.setitem(
+        IndexRegistry._default_indexes,
+        'dummy_lazy',
+        'xoak.tests.test_index_base:DummyIndexAdapter',
+    )
+    registry = IndexRegistry()
+
+    assert 'dummy_lazy' in registry
+    assert isinstance(registry._indexes['dummy_lazy'], str)
+    assert registry['dummy_lazy'] is DummyIndexAdapter
+    assert registry._indexes['dummy_lazy'] is DummyIndexAdapter
+    assert normalize_index('dummy_lazy') is DummyIndexAdapter
+
+    monkeypatch.setitem(IndexRegistry._default_indexes, 'invalid_lazy', 'numpy:ndarray')
+    with pytest.raises(TypeError, match='.*is not a subclass of IndexAdapter'):
+        IndexRegistry()['invalid_lazy']
+
+
+def test_index_registry_entry_points(monkeypatch):
+    from importlib.metadata import EntryPoint
+
+    eps = [
+        EntryPoint('dummy_plugin', 'xoak.tests.test_index_base:DummyIndexAdapter', 'xoak.indexes'),
+        EntryPoint('scipy_kdtree', 'xoak.tests.test_index_base:DummyIndexAdapter', 'xoak.indexes'),
+    ]
+    monkeypatch.setattr('xoak.index.base._iter_entry_points', lambda group: eps)
+    monkeypatch.setattr(IndexRegistry, '_plugins_discovered', False)
+    monkeypatch.setattr(IndexRegistry, '_default_indexes', dict(IndexRegistry._default_indexes))
+
+    with pytest.warns(IndexRegistrationWarning, match="ignoring index 'scipy_kdtree'.*"):
+        registry = IndexRegistry()
+
+    assert isinstance(registry._indexes['dummy_plugin'], EntryPoint)
+    assert registry.dummy_plugin is DummyIndexAdapter
+    assert registry.scipy_kdtree is ScipyKDTreeAdapter
+
+
 def test_register_default():
     # check that docstrings are updated
     assert 'This index adapter is registered in xoak' in ScipyKDTreeAdapter.__doc__
@@ -136,3 +180,144 @@ def test_xoak_index_wrapper():
     assert results['indices'].dtype == np.intp
     np.testing.assert_equal(results['distances'], np.zeros(5))
     np.testing.assert_equal(results['indices'], np.ones(5) + offset)
+
+
+def test_xoak_index_wrapper_query_box():
+    idx_points = np.array([[0.0, 0.0], [1.0, 1.0], [2.0, 2.0]])
+    wrapper = XoakIndexWrapper(DummyIndexAdapter, idx_points, 1)
+
+    np.testing.assert_array_equal(wrapper.bounds, [[0.0, 0.0], [2.0, 2.0]])
+
+    lower = np.array([0.5, 0.5])
+    upper = np.array([np.inf, 2.0])
+
+    with pytest.raises(NotImplementedError):
+        wrapper.query_box(lower, upper)
+
+    np.testing.assert_array_equal(wrapper.query_box(lower, upper, points=idx_points), [2, 3])
+
+    # no overlap with the bounding box
+    assert wrapper.query_box(lower + 10, upper + 10).size == 0
+
+
+def test_supports_box_query():
+    assert supports_box_query('scipy_kdtree')
+    assert not supports_box_query(DummyIndexAdapter)
+
+
+def test_xoak_index_wrapper_query_knn():
+    idx_points = np.array([[0.0, 0.0], [1.0, 1.0], [2.0, 2.0]])
+    wrapper = XoakIndexWrapper(ScipyKDTreeAdapter, idx_points, 1)
+
+    distances, indices = wrapper.query_knn(np.array([[0.9, 0.9]]), 2)
+    np.testing.assert_allclose(distances, [[np.sqrt(0.02), np.sqrt(1.62)]])
+    np.testing.assert_array_equal(indices, [[2, 1]])
+
+    # more neighbors than indexed points
+    distances, indices = wrapper.query_knn(np.array([[0.9, 0.9]]), 4)
+    assert np.all(np.isinf(distances[:, 3:]))
+    np.testing.assert_array_equal(indices, [[2, 1, 3, -1]])
+
+
+def test_supports_knn_query():
+    assert supports_knn_query('scipy_kdtree')
+    assert not supports_knn_query(DummyIndexAdapter)
+
+
+@pytest.mark.parametrize('policy', ['tree', 'compressed', 'points', 'auto'])
+def test_xoak_index_wrapper_pickle_policy(policy):
+    idx_points = np.random.default_rng(0).uniform(size=(1000, 2))
+    wrapper = XoakIndexWrapper('scipy_kdtree', idx_points, 0, pickle_policy=policy)
+
+    data = pickle.dumps(wrapper)
+    unpickled = pickle.loads(data)
+
+    if policy == 'points':
+        assert unpickled._index is None
+    elif policy == 'compressed':
+        assert len(data) < len(pickle.dumps(XoakIndexWrapper('scipy_kdtree', idx_points, 0)))
+
+    np.testing.assert_array_equal(unpickled.query(idx_points[:10]), wrapper.query(idx_points[:10]))
+    np.testing.assert_array_equal(unpickled.bounds, wrapper.bounds)
+
+    # pickle again
+    unpickled2 = pickle.loads(pickle.dumps(unpickled))
+    np.testing.assert_array_equal(unpickled2.query(idx_points[:10]), wrapper.query(idx_points[:10]))
+
+
+def test_xoak_index_wrapper_pickle_policy_auto():
+    idx_points = np.random.default_rng(0).uniform(size=(1000, 2))
+    wrapper = XoakIndexWrapper('scipy_kdtree', idx_points, 0, pickle_policy='auto')
+
+    wrapper.transfer_rate = 1.0
+    wrapper._build_time = 0.0
+    assert pickle.loads(pickle.dumps(wrapper))._index is None
+
+    wrapper._build_time = np.inf
+    assert pickle.loads(pickle.dumps(wrapper))._index is not None
+
+
+@pytest.mark.parametrize('protocol', [pickle.HIGHEST_PROTOCOL, 4])
+def test_pickled_nbytes(protocol, monkeypatch):
+    # without protocol 5 (Python < 3.8), the object is pickled in memory
+    monkeypatch.setattr(pickle, 'HIGHEST_PROTOCOL', protocol)
+    obj = {'a': np.arange(10_000), 'b': 'xoak'}
+
+    assert abs(_pickled_nbytes(obj) - len(pickle.dumps(obj, protocol=protocol))) < 100
+
+
+def test_xoak_index_wrapper_pickle_policy_error():
+    with pytest.raises(ValueError, match='.*Invalid pickle_policy.*'):
+        XoakIndexWrapper('scipy_kdtree', np.zeros((2, 2)), 0, pickle_policy='foo')
+
+
+def test_xoak_index_wrapper_mask():
+    idx_points = np.array([[0.0, 0.0], [np.nan, np.nan], [2.0, 2.0], [3.0, 3.0]])
+    mask = np.array([True, False, True, False])
+    wrapper = XoakIndexWrapper(ScipyKDTreeAdapter, idx_points, 10, mask=mask)
+
+    np.testing.assert_array_equal(wrapper.bounds, [[0.0, 0.0], [2.0, 2.0]])
+    np.testing.assert_array_equal(wrapper.query(np.array([[2.9, 2.9]]))['indices'], [[12]])
+    np.testing.assert_array_equal(
+        wrapper.query_box(np.array([1.0, 1.0]), np.array([4.0, 4.0])), [12]
+    )
+
+    distances, indices = wrapper.query_knn(np.array([[0.0, 0.0]]), 3)
+    np.testing.assert_array_equal(indices, [[10, 12, -1]])
+
+    # no valid point
+    wrapper = XoakIndexWrapper(ScipyKDTreeAdapter, idx_points, 0, mask=np.zeros(4, dtype=bool))
+
+    assert wrapper.index is None
+    assert wrapper.query(np.zeros((1, 2)))['indices'][0, 0] == -1
+    assert wrapper.query_box(np.zeros(2), np.ones(2)).size == 0
+
+
+def test_xoak_index_wrapper_sizeof():
+    from dask.sizeof import sizeof
+
+    idx_points = np.random.default_rng(0).uniform(size=(1000, 2))
+    wrapper = XoakIndexWrapper('scipy_kdtree', idx_points, 0)
+
+    # the scheduler sees (at least) the size of the indexed points
+    assert sizeof(wrapper) >= idx_points.nbytes
+
+
+def test_xoak_index_wrapper_brute_force():
+    idx_points = np.array([[0.0, 0.0], [1.0, 1.0], [2.0, 2.0], [3.0, 3.0]])
+
+    wrapper = XoakIndexWrapper(ScipyKDTreeAdapter, idx_points, 0, brute_force_threshold=4)
+    assert isinstance(wrapper._index_adapter, BruteForceAdapter)
+    np.testing.assert_array_equal(wrapper.query(np.array([[2.1, 2.1]]))['indices'], [[2]])
+
+    wrapper = XoakIndexWrapper(ScipyKDTreeAdapter, idx_points, 0, brute_force_threshold=3)
+    assert isinstance(wrapper._index_adapter, ScipyKDTreeAdapter)
+
+    # not euclidean
+    for index_type, kwargs in [
+        ('sklearn_kdtree', {'metric': 'manhattan'}),
+        ('scipy_kdtree', {'boxsize': 4.0}),
+        (DummyIndexAdapter, {}),
+    ]:
+        wrapper = XoakIndexWrapper(index_type, idx_points, 0, brute_force_threshold=4, **kwargs)
+        assert not isinstance(wrapper._index_adapter, BruteForceAdapter)
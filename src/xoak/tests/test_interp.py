@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xoak  # noqa:F401
+from xoak.interp import apply_weights, idw_weights
+
+
+def test_idw_weights():
+    distances = np.array([[1.0, 2.0], [0.0, 1.0], [1.0, np.inf]])
+    indices = np.array([[0, 1], [2, 0], [3, -1]])
+
+    weights = idw_weights(distances, indices, 4, power=1)
+
+    expected = np.array([[2 / 3, 1 / 3, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+    np.testing.assert_allclose(weights.toarray(), expected)
+
+
+def test_apply_weights():
+    weights = idw_weights(np.array([[1.0, 1.0]]), np.array([[0, 3]]), 4)
+
+    ds = xr.Dataset(
+        data_vars={
+            'v': (('t', 'a', 'b'), np.arange(8).reshape(2, 2, 2)),
+            'w': ('t', [1, 2]),
+            'u': ('a', [1, 2]),
+        },
+        attrs={'foo': 'bar'},
+    )
+    actual = apply_weights(ds, weights, ('a', 'b'), ('p',), (1,))
+
+    expected = xr.Dataset(
+        data_vars={'v': (('t', 'p'), [[1.5], [5.5]]), 'w': ('t', [1, 2])}, attrs={'foo': 'bar'}
+    )
+    xr.testing.assert_identical(actual, expected)
+
+    with pytest.raises(ValueError, match=".*Dimension 'c' not found.*"):
+        apply_weights(ds, weights, ('a', 'c'), ('p',), (1,))
+
+
+@pytest.fixture
+def source_dataset():
+    x, y = np.meshgrid(np.arange(10.0), np.arange(8.0))
+    time = np.arange(3)
+
+    return xr.Dataset(
+        data_vars={
+            'linear': (('time', 'a', 'b'), time[:, None, None] + 2 * x + y),
+            'const': (('a', 'b'), np.ones_like(x)),
+        },
+        coords={'time': time, 'x': (('a', 'b'), x), 'y': (('a', 'b'), y)},
+    )
+
+
+@pytest.mark.parametrize('forest', [False, True])
+def test_interp_idw(source_dataset, forest):
+    if forest:
+        source_dataset = source_dataset.chunk({'a': 3, 'time': 1})
+
+    source_dataset.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+
+    # center of grid cells -> 4 neighbors at equal distances
+    indexer = xr.Dataset(coords={'x': ('p', [0.5, 3.5, 6.0]), 'y': ('p', [0.5, 2.5, 4.0])})
+    actual = source_dataset.xoak.interp_idw(x=indexer.x, y=indexer.y, k=4)
+
+    assert actual.linear.dims == ('time', 'p')
+    assert actual.const.dims == ('p',)
+    if forest:
+        assert actual.linear.chunks == ((1, 1, 1), (3,))
+
+    expected = np.arange(3)[:, None] + np.array([1.5, 9.5, 16.0])
+    np.testing.assert_allclose(actual.linear.values, expected)
+    np.testing.assert_allclose(actual.const.values, 1.0)
+    xr.testing.assert_equal(actual.x, indexer.x)
+
+
+def test_interp_idw_dataarray(source_dataset):
+    da = source_dataset.linear
+    da.xoak.set_index(['x', 'y'], 'sklearn_kdtree')
+
+    actual = da.xoak.interp_idw(x=xr.Variable('p', [2.0]), y=xr.Variable('p', [3.0]), k=1)
+
+    assert isinstance(actual, xr.DataArray)
+    assert actual.name == 'linear'
+    assert actual.dims == ('time', 'p')
+    np.testing.assert_allclose(actual.values, [[7.0], [8.0], [9.0]])
+
+
+def test_interp_idw_error(source_dataset):
+    # new coordinates (no index)
+    source_dataset = source_dataset.assign_coords(x=source_dataset.x + 100)
+
+    with pytest.raises(ValueError, match='.*has/have not been built yet.*'):
+        source_dataset.xoak.interp_idw(x=source_dataset.x, y=source_dataset.y)
+
+    source_dataset.xoak.set_index(['x', 'y'], 'morton')
+
+    with pytest.raises(ValueError, match='.*does not support k-nearest neighbors queries.*'):
+        source_dataset.xoak.interp_idw(x=source_dataset.x, y=source_dataset.y)
+
+    with pytest.raises(ValueError, match='.*Missing indexers.*'):
+        source_dataset.xoak.interp_idw(x=source_dataset.x)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from xoak.mesh import face_node_array, locate_cells, points_in_cells
+
+
+def test_face_node_array():
+    conn = np.array([[1, 2, 3, 4], [2, 3, 5, 0]])
+    np.testing.assert_array_equal(
+        face_node_array(conn, start_index=1), [[0, 1, 2, 3], [1, 2, 4, 1]]
+    )
+
+    conn = np.array([[0.0, 1.0, 2.0], [1.0, 2.0, np.nan]])
+    np.testing.assert_array_equal(face_node_array(conn), [[0, 1, 2], [1, 2, 1]])
+
+    with pytest.raises(ValueError, match='2-dimensional'):
+        face_node_array([0, 1, 2])
+
+    with pytest.raises(ValueError, match='first node'):
+        face_node_array([[-1, 0, 1]])
+
+
+def test_points_in_cells():
+    square = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]]
+    # concave (L-shaped) cell with a repeated vertex (padding)
+    concave = [[0.0, 0.0], [2.0, 0.0], [2.0, 1.0], [1.0, 1.0], [1.0, 2.0], [0.0, 2.0], [0.0, 0.0]]
+    square = square + [square[0]] * 3
+
+    points = np.array([[0.5, 0.5], [1.5, 1.5], [1.5, 0.5], [-0.1, 0.5]])
+    vertices = np.broadcast_to(np.array([square, concave]), (4, 2, 7, 2))
+
+    expected = [[True, True], [False, False], [False, True], [False, False]]
+    np.testing.assert_array_equal(points_in_cells(points, vertices), expected)
+
+
+@pytest.mark.parametrize('block_size', [1, 2**16])
+def test_locate_cells(block_size):
+    node_points = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [0.0, 1.0], [1.0, 1.0], [2.0, 1.0]])
+    face_nodes = np.array([[0, 1, 4, 3], [1, 2, 5, 1], [1, 5, 4, 1]])
+
+    points = np.array([[0.5, 0.5], [1.8, 0.2], [1.2, 0.8], [2.5, 0.5]])
+    candidates = np.array([[1, 0], [2, 1], [-1, 2], [1, 2]])
+
+    actual = locate_cells(points, candidates, face_nodes, node_points, block_size=block_size)
+    np.testing.assert_array_equal(actual, [0, 1, 2, -1])
@@ -0,0 +1,79 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import xoak  # noqa:F401
+
+pytest.importorskip('numba')
+
+from xoak.index.numba_adapters import NumbaBruteForceAdapter, scaled_euclidean  # noqa:E402
+
+
+def test_numba_brute_force(xyz_dataset, xyz_indexer, xyz_expected):
+    xyz_dataset.xoak.set_index(['x', 'y', 'z'], 'numba_brute_force')
+    ds_sel = xyz_dataset.xoak.sel(x=xyz_indexer.xx, y=xyz_indexer.yy, z=xyz_indexer.zz)
+
+    xr.testing.assert_equal(ds_sel.load(), xyz_expected.load())
+
+
+def test_numba_brute_force_haversine(geo_dataset, geo_indexer, geo_expected):
+    geo_dataset.xoak.set_index(['lat', 'lon'], 'numba_brute_force', metric='haversine')
+    ds_sel = geo_dataset.xoak.sel(lat=geo_indexer.latitude, lon=geo_indexer.longitude)
+
+    xr.testing.assert_equal(ds_sel.load(), geo_expected.load())
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 256])
+def test_numba_brute_force_scaled(block_size):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 10, size=(1000, 3))
+    query_points = rng.uniform(-1, 11, size=(300, 3))
+    scales = np.array([1.0, 1.0, 20.0])
+
+    adapter = NumbaBruteForceAdapter(metric=scaled_euclidean(scales), block_size=block_size)
+    distances, indices = adapter.query(adapter.build(points), query_points)
+
+    all_distances = np.linalg.norm(
+        (query_points[:, None, :] - points[None, :, :]) * scales, axis=-1
+    )
+    np.testing.assert_array_equal(indices, all_distances.argmin(axis=1))
+    np.testing.assert_allclose(distances, all_distances.min(axis=1))
+
+
+def test_numba_brute_force_error():
+    with pytest.raises(ValueError, match='Unknown metric'):
+        NumbaBruteForceAdapter(metric='manhattan')
+
+
+def test_numba_brute_force_threads():
+    # queries run from other threads than the main thread must not hang at exit
+    code = (
+        'from concurrent.futures import ThreadPoolExecutor\n'
+        'import numpy as np\n'
+        'from xoak.index.numba_adapters import NumbaBruteForceAdapter\n'
+        'adapter = NumbaBruteForceAdapter()\n'
+        'index = adapter.build(np.random.rand(100, 2))\n'
+        'with ThreadPoolExecutor(2) as executor:\n'
+        '    list(executor.map(lambda _: adapter.query(index, np.random.rand(10, 2)), range(4)))\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True, timeout=120)
+
+
+def test_numba_threading_layer_priority():
+    # importing the adapter doesn't change Numba's configuration,
+    # a threading layer set by the user is kept
+    code = (
+        'import numba\n'
+        'import numpy as np\n'
+        'from xoak.index.numba_adapters import NumbaBruteForceAdapter\n'
+        "assert numba.config.THREADING_LAYER_PRIORITY == ['tbb', 'omp', 'workqueue']\n"
+        "numba.config.THREADING_LAYER = 'workqueue'\n"
+        'adapter = NumbaBruteForceAdapter()\n'
+        'adapter.query(adapter.build(np.random.rand(10, 2)), np.random.rand(2, 2))\n'
+        "assert numba.config.THREADING_LAYER_PRIORITY == ['tbb', 'omp', 'workqueue']\n"
+        "assert numba.threading_layer() == 'workqueue'\n"
+    )
+    subprocess.run([sys.executable, '-c', code], check=True, timeout=120)
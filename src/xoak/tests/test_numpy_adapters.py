@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xoak  # noqa: F401
+from xoak.index.numpy_adapters import BruteForceIndex, MortonIndex
+
+
+def test_brute_force(xyz_dataset, xyz_indexer, xyz_expected):
+    xyz_dataset.xoak.set_index(['x', 'y', 'z'], 'brute_force')
+    ds_sel = xyz_dataset.xoak.sel(x=xyz_indexer.xx, y=xyz_indexer.yy, z=xyz_indexer.zz)
+
+    xr.testing.assert_equal(ds_sel.load(), xyz_expected.load())
+
+
+@pytest.mark.parametrize('block_nbytes', [8, 1000, 256 * 1024])
+def test_brute_force_index(block_nbytes):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 10, size=(500, 3))
+    query_points = rng.uniform(-1, 11, size=(200, 3))
+
+    index = BruteForceIndex(points, block_nbytes=block_nbytes)
+    all_distances = np.linalg.norm(query_points[:, None, :] - points[None, :, :], axis=-1)
+
+    distances, indices = index.query(query_points)
+    np.testing.assert_array_equal(indices, all_distances.argmin(axis=1))
+    np.testing.assert_allclose(distances, all_distances.min(axis=1))
+
+    distances, indices = index.query_knn(query_points, 5)
+    np.testing.assert_array_equal(indices, np.argsort(all_distances, axis=1)[:, :5])
+    np.testing.assert_allclose(distances, np.sort(all_distances, axis=1)[:, :5])
+
+    lower = np.full(3, 2.0)
+    upper = np.full(3, 4.5)
+    expected = np.flatnonzero(np.all((points >= lower) & (points <= upper), axis=1))
+    np.testing.assert_array_equal(index.query_box(lower, upper), expected)
+
+
+def test_morton(xyz_dataset, xyz_indexer, xyz_expected):
+    xyz_dataset.xoak.set_index(['x', 'y', 'z'], 'morton')
+    ds_sel = xyz_dataset.xoak.sel(x=xyz_indexer.xx, y=xyz_indexer.yy, z=xyz_indexer.zz)
+
+    xr.testing.assert_equal(ds_sel.load(), xyz_expected.load())
+
+
+@pytest.mark.parametrize('ncoords', [1, 2, 3])
+def test_morton_index(ncoords):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 10, size=(5000, ncoords))
+    query_points = rng.uniform(-1, 11, size=(500, ncoords))
+
+    index = MortonIndex(points)
+    assert index.keys.dtype == np.uint64
+    assert index.perm.dtype == np.int32
+
+    distances, indices = index.query(query_points)
+    expected = np.linalg.norm(query_points[:, None, :] - points[None, :, :], axis=-1).min(axis=1)
+    np.testing.assert_allclose(distances, expected)
+    np.testing.assert_allclose(distances, np.linalg.norm(points[indices] - query_points, axis=1))
+
+    lower = np.full(ncoords, 2.0)
+    upper = np.full(ncoords, 4.5)
+    expected = np.flatnonzero(np.all((points >= lower) & (points <= upper), axis=1))
+    np.testing.assert_array_equal(np.sort(index.query_box(lower, upper)), expected)
+
+
+def test_morton_index_error():
+    with pytest.raises(ValueError, match='.*supports up to 32 coordinates'):
+        MortonIndex(np.zeros((10, 33)))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import xoak
+from xoak import SelectionPlan
+
+
+@pytest.fixture
+def grid_dataset():
+    rng = np.random.default_rng(0)
+    return xr.Dataset(
+        data_vars={'v': (('t', 'a', 'b'), rng.uniform(size=(3, 4, 5)))},
+        coords={
+            'x': (('a', 'b'), rng.uniform(0, 10, (4, 5))),
+            'y': (('a', 'b'), rng.uniform(0, 10, (4, 5))),
+        },
+    )
+
+
+def test_plan_sel(grid_dataset):
+    indexer = xr.Dataset(coords={'x': ('p', [1.2, 2.9, 5.0]), 'y': ('p', [1.2, 2.9, 5.0])})
+
+    grid_dataset.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    plan = grid_dataset.xoak.plan_sel(x=indexer.x, y=indexer.y)
+
+    assert isinstance(plan, xoak.SelectionPlan)
+    assert plan.indices.dtype == np.int32
+    assert plan.dims == ('p',)
+    assert plan.shape == (3,)
+
+    expected = grid_dataset.xoak.sel(x=indexer.x, y=indexer.y)
+    xr.testing.assert_equal(plan.apply(grid_dataset), expected)
+
+    # apply to other objects on the same grid
+    other = grid_dataset.v.isel(t=[0, 1]).drop_vars(['x', 'y']) * 2
+    xr.testing.assert_equal(plan.apply(other), expected.v.isel(t=[0, 1]).drop_vars(['x', 'y']) * 2)
+
+    with pytest.raises(ValueError, match=".*Dimension 'a' not found or with size different.*"):
+        plan.apply(grid_dataset.isel(a=[0, 1]))
+
+
+def test_plan_sel_box(grid_dataset):
+    grid_dataset.xoak.set_index(['x', 'y'], 'scipy_kdtree')
+    plan = grid_dataset.xoak.plan_sel(x=slice(2, 6))
+
+    assert plan.dims == ('a_b',)
+    xr.testing.assert_equal(plan.apply(grid_dataset), grid_dataset.xoak.sel(x=slice(2, 6)))
+
+
+def test_plan_save_load(tmp_path):
+    plan = SelectionPlan(np.array([0, 5, 3, 1]), ('a', 'b'), (2, 3), ('p', 'q'), (2, 2))
+    plan.save(tmp_path / 'plan.npz')
+
+    loaded = SelectionPlan.load(tmp_path / 'plan.npz')
+    assert loaded == plan
+
+    expected_pos = {'a': [[0, 1], [1, 0]], 'b': [[0, 2], [0, 1]]}
+    for dim, var in loaded.pos_indexers().items():
+        assert var.dims == ('p', 'q')
+        np.testing.assert_array_equal(var.values, expected_pos[dim])
+
+    assert repr(plan).startswith('<SelectionPlan')
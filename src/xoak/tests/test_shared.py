@@ -0,0 +1,144 @@
+import gc
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import xoak  # noqa:F401
+from xoak.index.base import XoakIndexWrapper
+from xoak.index.shared import SharedXoakIndexWrapper, share_index, unshare_index
+
+pytestmark = pytest.mark.skipif(
+    pickle.HIGHEST_PROTOCOL < 5, reason='sharing indexes requires pickle protocol 5'
+)
+
+
+def _query_indices(wrapper, points):
+    return wrapper.query(points)['indices'].ravel()
+
+
+def _make_dataset(points, chunked):
+    ds = xr.Dataset(coords={'x': ('p', points[:, 0]), 'y': ('p', points[:, 1])})
+    return ds.chunk({'p': 3000}) if chunked else ds
+
+
+def _load_and_query(path, points, chunked):
+    ds = _make_dataset(points, chunked)
+    ds.xoak.load_index(path)
+    return ds.xoak._query({'x': ds.x[:10], 'y': ds.y[:10]})
+
+
+@pytest.fixture
+def points():
+    return np.random.default_rng(0).uniform(size=(10_000, 2))
+
+
+@pytest.mark.parametrize('index_type', ['scipy_kdtree', 'sklearn_balltree', 'brute_force'])
+def test_share_index(points, index_type):
+    wrapper = XoakIndexWrapper(index_type, points, 10)
+    shared = share_index(wrapper)
+
+    assert isinstance(shared, SharedXoakIndexWrapper)
+    assert share_index(shared) is shared
+    np.testing.assert_array_equal(shared.bounds, wrapper.bounds)
+
+    # lightweight handle
+    data = pickle.dumps(shared)
+    assert len(data) < 10_000 < len(pickle.dumps(wrapper))
+
+    unpickled = pickle.loads(data)
+    np.testing.assert_array_equal(
+        _query_indices(unpickled, points[:100]), _query_indices(wrapper, points[:100])
+    )
+
+    # file is deleted with its owner, unpickled wrappers still work
+    path = shared.path
+    assert os.path.exists(path)
+    del shared
+    gc.collect()
+    assert not os.path.exists(path)
+    np.testing.assert_array_equal(_query_indices(unpickled, points[:5]), np.arange(10, 15))
+
+
+def test_share_index_unsupported(points, monkeypatch):
+    monkeypatch.setattr(pickle, 'HIGHEST_PROTOCOL', 4)
+    ds = _make_dataset(points, False)
+
+    with pytest.raises(RuntimeError, match='requires Python >= 3.8'):
+        share_index(XoakIndexWrapper('scipy_kdtree', points, 0))
+
+    with pytest.raises(RuntimeError, match='requires Python >= 3.8'):
+        ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', shared=True)
+
+
+def test_share_index_path(points, tmp_path):
+    shared = share_index(XoakIndexWrapper('scipy_kdtree', points, 0), str(tmp_path))
+
+    assert os.path.dirname(shared.path) == str(tmp_path)
+
+    del shared
+    gc.collect()
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_share_index_process_pool(points):
+    shared = share_index(XoakIndexWrapper('scipy_kdtree', points, 0))
+
+    # spawn (not fork) new processes, as forking a process with running threads
+    # (e.g., Numba's parallel threading layer) may deadlock
+    ctx = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=ctx) as executor:
+        results = list(executor.map(_query_indices, [shared] * 2, [points[:3], points[3:6]]))
+
+    np.testing.assert_array_equal(np.concatenate(results), np.arange(6))
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_set_index_shared(points, chunked):
+    ds = xr.Dataset(coords={'x': ('p', points[:, 0] + 1), 'y': ('p', points[:, 1] + 1)})
+    if chunked:
+        ds = ds.chunk({'p': 3000})
+
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', shared=True)
+
+    if chunked:
+        assert all(isinstance(idx.compute(), SharedXoakIndexWrapper) for idx in ds.xoak._index)
+    else:
+        assert isinstance(ds.xoak._index, SharedXoakIndexWrapper)
+
+    actual = ds.xoak.sel(x=ds.x[:10], y=ds.y[:10])
+    xr.testing.assert_equal(actual.load(), ds.isel(p=slice(0, 10)).load())
+
+
+def test_unshare_index(points):
+    wrapper = XoakIndexWrapper('scipy_kdtree', points, 0)
+    assert unshare_index(wrapper) is wrapper
+
+    plain = unshare_index(share_index(wrapper))
+    assert type(plain) is XoakIndexWrapper
+    np.testing.assert_array_equal(_query_indices(plain, points[:5]), np.arange(5))
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_save_load_shared_index(points, tmp_path, chunked):
+    ds = _make_dataset(points + 2, chunked)
+    ds.xoak.set_index(['x', 'y'], 'scipy_kdtree', shared=True)
+    ds.xoak.save_index(str(tmp_path / 'index'))
+
+    # the shared memory files are deleted with the index
+    del ds
+    gc.collect()
+
+    # load the saved index in a new process
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+        indices = executor.submit(
+            _load_and_query, str(tmp_path / 'index'), points + 2, chunked
+        ).result()
+
+    np.testing.assert_array_equal(indices, np.arange(10))
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+import xarray as xr
+from sklearn.metrics.pairwise import haversine_distances
+
+import xoak  # noqa: F401
+from xoak.index.spherical import latlon_to_xyz, point_caps, select_coverings, spherical_covering
+
+
+def test_spherical_covering():
+    # points crossing the antimeridian
+    points = np.array([[0.0, 179.0], [10.0, -179.0], [-10.0, 178.0], [np.nan, np.nan]])
+
+    covering = spherical_covering(points, n_caps=2)
+    assert covering.shape == (2, 4)
+    np.testing.assert_allclose(np.linalg.norm(covering[:, :3], axis=1), 1.0)
+    assert np.all(covering[:, 3] < np.deg2rad(21))
+
+    # all points inside at least one cap
+    angles = np.arccos(np.clip(latlon_to_xyz(points[:3]) @ covering[:, :3].T, -1, 1))
+    assert np.all((angles <= covering[:, 3] + 1e-12).any(axis=1))
+
+    # at most one cap per point
+    assert spherical_covering(points).shape == (3, 4)
+    np.testing.assert_allclose(spherical_covering(points)[:, 3], 0.0, atol=1e-6)
+
+    assert spherical_covering(np.full((2, 2), np.nan)).shape == (0, 4)
+
+
+def test_select_coverings():
+    coverings = [
+        spherical_covering(np.array([[0.0, 179.0], [0.0, -179.0]])),
+        spherical_covering(np.array([[0.0, 0.0], [1.0, 1.0]])),
+        spherical_covering(np.array([[89.0, 0.0], [89.0, 180.0]])),
+        np.empty((0, 4)),
+    ]
+
+    selected = select_coverings(point_caps(np.array([[1.0, -178.0]])), coverings)
+    np.testing.assert_array_equal(selected, [True, False, False, False])
+
+    selected = select_coverings(point_caps(np.array([[1.0, -178.0], [88.0, 90.0]])), coverings)
+    np.testing.assert_array_equal(selected, [True, False, True, False])
+
+    # empty query
+    assert select_coverings(np.full((1, 4), np.nan), coverings).all()
+
+
+@pytest.mark.parametrize('query_chunks', [None, 10])
+def test_geographic_forest_pruning(query_chunks):
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-90, 90, 2000)
+    lon = rng.uniform(-180, 180, 2000)
+    # one tree per longitude band
+    order = np.argsort(lon)
+    ds = xr.Dataset(coords={'lat': ('p', lat[order]), 'lon': ('p', lon[order])}).chunk(200)
+
+    qlat = rng.uniform(-30, 30, 20)
+    qlon = rng.uniform(170, 190, 20)
+    qlon = np.where(qlon > 180, qlon - 360, qlon)
+    indexer = xr.Dataset(coords={'lat': ('q', qlat), 'lon': ('q', qlon)})
+    if query_chunks is not None:
+        indexer = indexer.chunk(query_chunks)
+
+    ds.xoak.set_index(['lat', 'lon'], 'sklearn_geo_balltree')
+    assert all(cov is not None for cov in ds.xoak._get_index_entry().coverings)
+
+    actual = ds.xoak.sel(lat=indexer.lat, lon=indexer.lon)
+
+    dist = haversine_distances(
+        np.deg2rad(np.column_stack([qlat, qlon])),
+        np.deg2rad(np.column_stack([ds.lat.values, ds.lon.values])),
+    )
+    np.testing.assert_array_equal(actual.lat.values, ds.lat.values[dist.argmin(axis=1)])
+
+    # only the trees close to the antimeridian are queried
+    n_tasks = len(ds.xoak._query({'lat': indexer.lat, 'lon': indexer.lon}).dask)
+    ds.xoak._get_index_entry().coverings = None
+    n_tasks_all = len(ds.xoak._query({'lat': indexer.lat, 'lon': indexer.lon}).dask)
+    assert n_tasks < n_tasks_all / 2
+
+    # coverings are only computed for the trees of a forest
+    for ds_single in [ds.compute(), ds.chunk(-1)]:
+        ds_single.xoak.set_index(['lat', 'lon'], 'sklearn_geo_balltree')
+        assert ds_single.xoak._get_index_entry().coverings in (None, [None])
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from xoak.index.tuning import estimate_tree_size, select_index
+
+
+def test_select_index():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 10, size=(2000, 3))
+
+    candidates = [('scipy_kdtree', {'leafsize': 8}), ('scipy_kdtree', {'leafsize': 32})]
+    selection = select_index(points, candidates=candidates, sample_size=1000, n_queries=100)
+
+    assert (selection['index_type'], selection['kwargs']) in candidates
+    assert len(selection['timings']) == 2
+
+    for t in selection['timings']:
+        assert t['total_time'] == t['build_time'] + t['query_time']
+        assert t['nbytes'] > 0
+
+    # memory budget
+    selection = select_index(points, sample_size=1000, n_queries=100, memory_budget=1e12)
+    assert all(t['fits_memory'] for t in selection['timings'])
+
+    with pytest.raises(ValueError, match='No candidate index fits in the memory budget'):
+        select_index(points, candidates=candidates, memory_budget=1)
+
+
+def test_select_index_metric():
+    rng = np.random.default_rng(0)
+    points = np.stack([rng.uniform(-80, 80, 500), rng.uniform(-160, 160, 500)]).T
+
+    selection = select_index(points, metric='haversine', n_queries=50)
+    assert selection['index_type'] in ['sklearn_geo_balltree', 's2point']
+
+    with pytest.raises(ValueError, match='Unknown metric'):
+        select_index(points, metric='invalid')
+
+
+def test_estimate_tree_size():
+    points = np.random.default_rng(0).uniform(size=(1000, 2))
+
+    size_small = estimate_tree_size(points, 'scipy_kdtree', memory_budget='1KiB')
+    size_large = estimate_tree_size(points, 'scipy_kdtree', memory_budget=1e9)
+
+    assert 1 <= size_small < 64
+    assert size_large > size_small
+
+    # maximum tree size is set by the memory budget
+    assert estimate_tree_size(points, 'scipy_kdtree', memory_budget=1e9, min_build_time=1e6) > 1e6